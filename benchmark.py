@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+"""
+Banc de mesure du gestionnaire de références
+
+Génère des bibliothèques synthétiques (fichiers locaux Auteur_Année_Titre.pdf,
+listings Drive et GitHub servis par une fausse API locale, fichier .bib) de
+1k à 1M références, puis mesure le scan local, les synchronisations, la
+construction de l'index, ReferenceSearch.search et get_stats: débit et
+percentiles de latence. Les résultats sont écrits en JSON (commit, machine,
+mesures) pour comparer les commits entre eux avec --compare.
+
+    python benchmark.py --sizes 1000,10000 --output bench.json
+    python benchmark.py --sizes 1000,10000 --compare bench.json
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlparse
+
+import click
+
+sys.path.insert(0, str(Path(__file__).parent / 'src'))
+
+BENCH_VERSION = 1
+DRIVE_FOLDER = 'bench-root'
+GITHUB_REPO = 'bench/library'
+FILES_PER_FOLDER = 500
+
+# Répartition des références entre les sources
+SOURCE_SHARES = {'local': 0.4, 'drive': 0.3, 'github': 0.2, 'bibtex': 0.1}
+DUPLICATE_SHARE = 0.05  # Fichiers locaux aussi présents sur Drive et GitHub
+
+SYLLABLES = ['ma', 'ri', 'son', 'ber', 'tin', 'lo', 'ka', 'vel', 'dor', 'nu', 'gar', 'chi', 'el', 'pon', 'ru']
+TITLE_WORDS = [
+    'algebraic', 'geometry', 'symplectic', 'reduction', 'moduli', 'spaces', 'hamiltonian', 'actions',
+    'quiver', 'varieties', 'hyperkahler', 'quotients', 'lie', 'groups', 'representations', 'cohomology',
+    'sheaves', 'stacks', 'derived', 'categories', 'integrable', 'systems', 'poisson', 'manifolds',
+    'toric', 'mirror', 'symmetry', 'gauge', 'theory', 'instantons', 'monopoles', 'higgs', 'bundles',
+    'character', 'equivariant', 'localization', 'deformation', 'quantization', 'invariant', 'flows',
+]
+# Recherches mesurées: (nom, paramètres de search)
+QUERIES = [
+    ('keyword', {'keyword': 'geometry'}),
+    ('keyword_rare', {'keyword': 'monopoles'}),
+    ('author', {'author': 'Mayrand'}),
+    ('year', {'year': '2015'}),
+    ('year_range', {'year': '2015-2020'}),
+    ('combined', {'keyword': 'symplectic', 'year': '2018'}),
+    ('type', {'keyword': 'geometry', 'doc_type': 'article'}),
+    ('facets', {'keyword': 'geometry', 'facets': True}),
+    ('bm25', {'keyword': 'hamiltonian reduction', 'ranking': 'bm25'}),
+    ('bm25_typo', {'keyword': 'symplectik', 'ranking': 'bm25'}),
+]
+
+
+# ----------------------------------------------------------------------
+# Bibliothèque synthétique
+# ----------------------------------------------------------------------
+
+def generate_library(root, size, seed=0):
+    """Créer une bibliothèque de `size` références sous `root`
+
+    Retourne le listing Drive et les arbres GitHub à servir par FakeAPI.
+    Les noms suivent les styles attendus par l'analyse des noms de fichiers.
+    """
+    rng = random.Random(seed)
+    root = Path(root)
+    authors = [''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize() for _ in range(400)]
+    authors.append('Mayrand')
+
+    def name(i):
+        author = rng.choice(authors)
+        year = rng.randint(1970, 2024)
+        title = '_'.join(rng.sample(TITLE_WORDS, rng.randint(2, 5))).capitalize()
+        # Principalement Auteur_Année_Titre, quelques variantes séparées par des espaces
+        if i % 4 == 0:
+            return f"{author} {year} {title.replace('_', ' ')}.pdf", author, year, title
+        return f"{author}_{year}_{title}_{i}.pdf", author, year, title
+
+    counts = {source: int(size * share) for source, share in SOURCE_SHARES.items()}
+    counts['local'] += size - sum(counts.values())
+
+    # Fichiers locaux (contenu unique, de tailles variées)
+    local_root = root / 'local'
+    duplicates = []
+    for i in range(counts['local']):
+        filename = name(i)[0]
+        folder = local_root / f"dossier_{i // FILES_PER_FOLDER:04d}"
+        if i % FILES_PER_FOLDER == 0:
+            folder.mkdir(parents=True, exist_ok=True)
+        data = f"%PDF-1.4\n% {filename} {i}\n".encode('utf-8') + b'0' * rng.randint(0, 4096)
+        (folder / filename).write_bytes(data)
+        if rng.random() < DUPLICATE_SHARE:
+            duplicates.append((filename, data))
+
+    def copy_hashes(data):
+        return hashlib.md5(data).hexdigest(), hashlib.sha1(f"blob {len(data)}\0".encode('ascii') + data).hexdigest()
+
+    # Listing Drive: un dossier par tranche de FILES_PER_FOLDER fichiers
+    drive = {DRIVE_FOLDER: []}
+    drive_items = [(name(i)[0], rng.randint(1000, 5000000), f"{rng.getrandbits(128):032x}")
+                   for i in range(counts['drive'])]
+    drive_items += [(filename, len(data), copy_hashes(data)[0]) for filename, data in duplicates]
+    for i, (filename, file_size, md5) in enumerate(drive_items):
+        folder_id = f"folder-{i // FILES_PER_FOLDER}"
+        if folder_id not in drive:
+            drive[folder_id] = []
+            drive[DRIVE_FOLDER].append({'id': folder_id, 'name': folder_id, 'mimeType': 'application/vnd.google-apps.folder',
+                                        'parents': [DRIVE_FOLDER]})
+        drive[folder_id].append({
+            'id': f"file-{i}", 'name': filename, 'mimeType': 'application/pdf', 'parents': [folder_id],
+            'size': str(file_size), 'md5Checksum': md5, 'modifiedTime': '2024-01-01T00:00:00.000Z',
+            'webViewLink': f"https://drive.google.com/file/d/file-{i}/view",
+        })
+
+    # Arbres GitHub: même découpage, identifiés par un SHA synthétique
+    github_items = [(name(i)[0], rng.randint(1000, 5000000), f"{rng.getrandbits(160):040x}")
+                    for i in range(counts['github'])]
+    github_items += [(filename, len(data), copy_hashes(data)[1]) for filename, data in duplicates]
+    trees = {}
+    root_entries = []
+    for start in range(0, len(github_items), FILES_PER_FOLDER):
+        entries = [{'path': filename, 'type': 'blob', 'sha': sha, 'size': file_size}
+                   for filename, file_size, sha in github_items[start:start + FILES_PER_FOLDER]]
+        tree_sha = hashlib.sha1(json.dumps(entries).encode('utf-8')).hexdigest()
+        trees[tree_sha] = entries
+        root_entries.append({'path': f"dossier_{start // FILES_PER_FOLDER:04d}", 'type': 'tree', 'sha': tree_sha})
+    root_sha = hashlib.sha1(json.dumps(root_entries).encode('utf-8')).hexdigest()
+    trees[root_sha] = root_entries
+
+    # Fichier .bib
+    with open(root / 'library.bib', 'w', encoding='utf-8') as f:
+        for i in range(counts['bibtex']):
+            _, author, year, title = name(i)
+            f.write(f"@article{{{author}{year}_{i},\n"
+                    f"  author = {{{author}, A. and {rng.choice(authors)}, B.}},\n"
+                    f"  title = {{{title.replace('_', ' ')}}},\n"
+                    f"  journal = {{Journal of Synthetic Mathematics}},\n"
+                    f"  year = {{{year}}},\n"
+                    f"  doi = {{10.5555/bench.{i}}}\n}}\n\n")
+
+    return {'drive': drive, 'github': {'root': root_sha, 'trees': trees}, 'counts': counts,
+            'duplicates': len(duplicates)}
+
+
+class _FakeAPIHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        library = self.server.library
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.server.requests.append(self.path)
+
+        # Flux de changements: le jeton est la position dans library['drive_changes']
+        changes = library.get('drive_changes', [])
+        if url.path == '/drive/v3/changes/startPageToken':
+            self._json({'startPageToken': str(len(changes))})
+        elif url.path == '/drive/v3/changes':
+            start = int(params['pageToken'])
+            end = start + int(params.get('pageSize', 100))
+            body = {'changes': changes[start:end]}
+            if end < len(changes):
+                body['nextPageToken'] = str(end)
+            else:
+                body['newStartPageToken'] = str(len(changes))
+            self._json(body)
+        elif url.path == '/drive/v3/files':
+            folder_id = re.match(r"'([^']+)' in parents", params.get('q', '')).group(1)
+            items = library['drive'].get(folder_id, [])
+            start = int(params.get('pageToken', 0))
+            end = start + int(params.get('pageSize', 100))
+            body = {'files': items[start:end]}
+            if end < len(items):
+                body['nextPageToken'] = str(end)
+            self._json(body)
+        elif url.path == f"/repos/{GITHUB_REPO}/branches/main":
+            etag = f'"{library["github"]["root"]}"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self._json({'commit': {'commit': {'tree': {'sha': library['github']['root']}}}}, {'ETag': etag})
+        elif url.path.startswith(f"/repos/{GITHUB_REPO}/git/trees/"):
+            sha = url.path.rsplit('/', 1)[1]
+            if params.get('recursive'):
+                # Liste complète; tronquée comme sur un très gros dépôt si `truncated` est demandé
+                items = _flatten_tree(library['github']['trees'], sha)
+                truncated = library['github'].get('truncated', False)
+                self._json({'tree': items[:len(items) // 2] if truncated else items, 'truncated': truncated})
+            else:
+                self._json({'tree': library['github']['trees'][sha]})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        """Requête batch Drive: une réponse multipart par fichier demandé"""
+        self.server.requests.append(self.path)
+        if self.path != '/batch/drive/v3':
+            self.send_error(404)
+            return
+        body = self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8')
+        items = {item['id']: item for folder in self.server.library['drive'].values() for item in folder}
+
+        boundary = 'batch_fake'
+        parts = []
+        for file_id in re.findall(r'GET /drive/v3/files/([^?\s]+)\?', body):
+            item = items.get(unquote(file_id))
+            status, content = ('200 OK', json.dumps(item)) if item else ('404 Not Found', '{}')
+            parts.append(f"--{boundary}\r\nContent-Type: application/http\r\n\r\n"
+                         f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n\r\n{content}\r\n")
+        data = (''.join(parts) + f"--{boundary}--\r\n").encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', f"multipart/mixed; boundary={boundary}")
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _flatten_tree(trees, sha, prefix=''):
+    """Entrées d'un arbre et de ses sous-arbres, chemins complets (git/trees?recursive=1)"""
+    items = []
+    for item in trees[sha]:
+        items.append(dict(item, path=f"{prefix}{item['path']}"))
+        if item['type'] == 'tree':
+            items.extend(_flatten_tree(trees, item['sha'], f"{prefix}{item['path']}/"))
+    return items
+
+
+class FakeAPI:
+    """Fausse API Drive et GitHub servant une bibliothèque synthétique
+
+    `requests` garde les chemins demandés, dans l'ordre (utilisé par les tests).
+    """
+
+    def __init__(self, library):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _FakeAPIHandler)
+        self.server.daemon_threads = True
+        self.server.library = library
+        self.server.requests = []
+        self.requests = self.server.requests
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# ----------------------------------------------------------------------
+# Mesures
+# ----------------------------------------------------------------------
+
+def percentiles(samples):
+    """Résumé d'une série de durées (secondes) en millisecondes"""
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    return {
+        'runs': len(ordered),
+        'mean_ms': round(statistics.mean(ordered) * 1000, 3),
+        'p50_ms': round(rank(50), 3),
+        'p95_ms': round(rank(95), 3),
+        'p99_ms': round(rank(99), 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def timed(function):
+    start = time.perf_counter()
+    value = function()
+    return time.perf_counter() - start, value
+
+
+def throughput(function, items):
+    """Durée d'une opération et débit en éléments par seconde"""
+    elapsed, value = timed(function)
+    return {'seconds': round(elapsed, 4), 'items': items,
+            'items_per_s': round(items / elapsed, 1) if elapsed else None}, value
+
+
+def run_size(size, runs, seed, workdir):
+    """Générer une bibliothèque de `size` références et la mesurer"""
+    root = Path(workdir) / f"library_{size}"
+    elapsed, library = timed(lambda: generate_library(root, size, seed))
+    counts = library['counts']
+    print(f"  bibliothèque générée en {elapsed:.1f} s ({counts}, {library['duplicates']} doublons)")
+
+    with FakeAPI(library) as api:
+        os.environ.update({
+            'CACHE_DIR': str(root / 'cache'),
+            'LOCAL_REFS_PATH': str(root / 'local'),
+            'BIBTEX_PATHS': str(root / 'library.bib'),
+            'GOOGLE_DRIVE_FOLDER_ID': DRIVE_FOLDER,
+            'GOOGLE_DRIVE_API_URL': api.url,
+            'GITHUB_REPO': GITHUB_REPO,
+            'GITHUB_BRANCH': 'main',
+            'GITHUB_API_URL': api.url,
+            'QUERY_CACHE_SIZE': '0',  # Recherches mesurées sans le cache de requêtes (voir search_cached)
+        })
+        from bibtex_manager import BibTeXManager
+        from github_manager import GitHubManager
+        from google_drive_manager import GoogleDriveManager
+        from local_files_manager import LocalFilesManager
+        from query_cache import QueryCache
+        from reference_search import ReferenceSearch
+
+        drive_files = counts['drive'] + library['duplicates']
+        github_files = counts['github'] + library['duplicates']
+        result = {'size': size, 'sources': dict(counts), 'duplicates': library['duplicates']}
+
+        # Première synchronisation puis resynchronisation sans changement
+        manager = LocalFilesManager()
+        result['local_scan'], _ = throughput(manager.scan, counts['local'])
+        result['local_rescan'], _ = throughput(manager.scan, counts['local'])
+        manager = GoogleDriveManager()
+        result['drive_sync'], _ = throughput(manager.sync, drive_files)
+        result['drive_resync'], _ = throughput(manager.sync, drive_files)
+        manager = GitHubManager()
+        result['github_sync'], _ = throughput(manager.sync, github_files)
+        result['github_resync'], _ = throughput(manager.sync, github_files)
+        manager = BibTeXManager()
+        result['bibtex_sync'], _ = throughput(manager.sync, counts['bibtex'])
+        result['bibtex_resync'], _ = throughput(manager.sync, counts['bibtex'])
+
+        # Index construit depuis les listes en cache, puis rechargé depuis le disque
+        searcher = ReferenceSearch()
+        result['index_build'], _ = throughput(lambda: (searcher.refresh_all(), searcher.update_duplicates()),
+                                              size + library['duplicates'])
+        result['index_load'], _ = throughput(lambda: ReferenceSearch().search(keyword='geometry', limit=10),
+                                             size + library['duplicates'])
+
+        result['search'] = {}
+        for label, params in QUERIES:
+            samples = []
+            for _ in range(runs):
+                elapsed, page = timed(lambda: searcher.search_page(limit=20, **params))
+                samples.append(elapsed)
+            result['search'][label] = dict(percentiles(samples), total=page['total'])
+
+        # Même recherche resservie par le cache de requêtes
+        searcher.query_cache = QueryCache(size=100)
+        searcher.search_page(limit=20, **dict(QUERIES)['keyword'])
+        result['search_cached'] = percentiles([
+            timed(lambda: searcher.search_page(limit=20, **dict(QUERIES)['keyword']))[0] for _ in range(runs)])
+        searcher.query_cache = QueryCache(size=0)
+
+        result['get_stats'] = percentiles([timed(searcher.get_stats)[0] for _ in range(max(1, runs // 5))])
+
+    shutil.rmtree(root, ignore_errors=True)
+    return result
+
+
+# ----------------------------------------------------------------------
+# Rapport
+# ----------------------------------------------------------------------
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=Path(__file__).parent).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    capture_output=True, text=True, cwd=Path(__file__).parent).stdout.strip())
+        return commit or None, dirty
+    except OSError:
+        return None, False
+
+
+def flatten(result):
+    """Mesures comparables d'un résultat: {nom: millisecondes}"""
+    metrics = {}
+    for key, value in result.items():
+        if isinstance(value, dict) and 'seconds' in value:
+            metrics[key] = value['seconds'] * 1000
+        elif key == 'search':
+            for label, summary in value.items():
+                metrics[f"search.{label}.p50"] = summary['p50_ms']
+                metrics[f"search.{label}.p95"] = summary['p95_ms']
+        elif key in ('get_stats', 'search_cached'):
+            metrics[f"{key}.p50"] = value['p50_ms']
+    return metrics
+
+
+def compare(previous, current, threshold):
+    """Afficher l'évolution de chaque mesure; retourne le nombre de régressions"""
+    regressions = 0
+    before = {r['size']: flatten(r) for r in previous['results']}
+    print(f"\nComparaison avec {(previous.get('commit') or '?')[:10]} (seuil x{threshold}):")
+    for result in current['results']:
+        old = before.get(result['size'])
+        if not old:
+            continue
+        print(f"  {result['size']} références")
+        for name, value in flatten(result).items():
+            if name not in old or not old[name]:
+                continue
+            ratio = value / old[name]
+            # Les mesures sous la milliseconde sont trop bruitées pour conclure
+            regressed = ratio > threshold and value - old[name] > 1
+            regressions += regressed
+            print(f"    {'❌' if regressed else '  '} {name:28} {old[name]:10.2f} -> {value:10.2f} ms  x{ratio:.2f}")
+    return regressions
+
+
+@click.command()
+@click.option('--sizes', default='1000,10000', help='Tailles des bibliothèques (ex: 1000,10000,100000,1000000)')
+@click.option('--runs', default=50, type=int, help='Répétitions de chaque recherche')
+@click.option('--seed', default=0, type=int, help='Graine du générateur')
+@click.option('--workdir', default=None, help='Dossier de travail (temporaire par défaut)')
+@click.option('--output', '-o', default=None, help='Fichier JSON des résultats (sortie standard sinon)')
+@click.option('--compare', 'baseline', default=None, help='Résultats JSON précédents à comparer')
+@click.option('--threshold', default=1.2, type=float, help='Ratio au-delà duquel une mesure est une régression')
+def main(sizes, runs, seed, workdir, output, baseline, threshold):
+    """Mesurer scan, synchronisations, recherche et statistiques sur des bibliothèques synthétiques"""
+    commit, dirty = git_commit()
+    report = {
+        'version': BENCH_VERSION,
+        'commit': commit,
+        'dirty': dirty,
+        'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'runs': runs,
+        'seed': seed,
+        'results': [],
+    }
+
+    temporary = workdir is None
+    workdir = Path(workdir or tempfile.mkdtemp(prefix='refs_bench_'))
+    try:
+        # Les messages des managers ne doivent pas se mêler au JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            for size in [int(s) for s in sizes.split(',') if s.strip()]:
+                print(f"📏 {size} références")
+                result = run_size(size, runs, seed, workdir)
+                report['results'].append(result)
+                print(f"  scan local {result['local_scan']['items_per_s']} fichiers/s, "
+                      f"index {result['index_build']['seconds']} s, "
+                      f"recherche p50 {result['search']['keyword']['p50_ms']} ms, "
+                      f"get_stats p50 {result['get_stats']['p50_ms']} ms")
+    finally:
+        if temporary:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    data = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        Path(output).write_text(data + '\n', encoding='utf-8')
+    else:
+        print(data)
+
+    if baseline:
+        with open(baseline, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+        with contextlib.redirect_stdout(sys.stderr):
+            regressions = compare(previous, report, threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
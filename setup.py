@@ -10,6 +10,7 @@ setup(
         'google-auth-oauthlib==1.0.0',
         'PyGithub==1.58.2',
         'pandas==2.0.3',
+        'numpy==1.24.4',
         'requests==2.31.0',
         'python-dotenv==1.0.0',
         'bibtexparser==1.4.0',
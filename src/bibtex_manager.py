@@ -0,0 +1,528 @@
+"""
+Gestionnaire BibTeX - Source de références à partir de fichiers .bib
+
+Les fichiers sont lus par blocs et découpés entrée par entrée (comptage des
+accolades), sans jamais charger tout le fichier en mémoire. Pour chaque .bib, le
+manifeste garde l'offset de fin de la dernière entrée lue et l'empreinte des
+octets qui précèdent: si le fichier a seulement grandi (entrées ajoutées à la
+fin), seule la partie nouvelle est analysée. Les entrées sont indexées par clé
+de citation, auteur, année et DOI.
+"""
+
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from metrics import timed
+from source_cache import file_stamp, get_source_cache, manifest_lock, published_since
+
+MANIFEST_VERSION = 3
+CHUNK_SIZE = 64 * 1024
+
+ENTRY_HEAD_PATTERN = re.compile(r'@\s*(\w+)\s*[{(]\s*', re.S)
+FIELD_NAME_PATTERN = re.compile(r'\s*,?\s*([\w\-:.]+)\s*=\s*', re.S)
+BARE_VALUE_PATTERN = re.compile(r'[\w\-:.+]+')
+YEAR_PATTERN = re.compile(r'(19|20)\d{2}')
+DOI_PATTERN = re.compile(r'10\.\d{4,9}/\S+')
+
+# Accents LaTeX courants (noms et titres français)
+LATEX_ACCENTS = {"'": '\u0301', '`': '\u0300', '^': '\u0302', '"': '\u0308', '~': '\u0303', 'c': '\u0327'}
+LATEX_ACCENT_PATTERN = re.compile(r"\\([`'^\"~]|c\s)\s*\{?\\?([A-Za-z])\}?")
+
+
+def iter_raw_entries(stream, offset=0, chunk_size=CHUNK_SIZE):
+    """Produire (début, fin, texte) pour chaque entrée '@...' d'un flux binaire
+
+    Le flux est lu par blocs à partir de `offset`; seule l'entrée en cours est
+    gardée en mémoire. Les offsets sont en octets depuis le début du fichier.
+    """
+    stream.seek(offset)
+    buffer = b''
+    buffer_start = offset
+    position = 0
+    eof = False
+
+    while True:
+        start = buffer.find(b'@', position)
+        while start < 0 and not eof:
+            buffer_start += len(buffer)
+            buffer = stream.read(chunk_size)
+            position = 0
+            eof = len(buffer) < chunk_size
+            start = buffer.find(b'@')
+        if start < 0:
+            return
+
+        # Trouver le délimiteur ouvrant puis sa fermeture (accolades équilibrées)
+        depth = 0
+        opener = None
+        index = start + 1
+        while True:
+            if index >= len(buffer):
+                if eof:
+                    return  # Entrée incomplète en fin de fichier
+                chunk = stream.read(chunk_size)
+                eof = len(chunk) < chunk_size
+                buffer = buffer[start:] + chunk
+                buffer_start += start
+                index -= start
+                start = 0
+                continue
+
+            char = buffer[index]
+            if opener is None:
+                if char in b'{(':
+                    opener = char
+                    depth = 1
+                elif char in b'\n@':
+                    break  # '@' hors entrée (texte libre entre les entrées)
+            elif char == 0x7B:  # {
+                depth += 1
+            elif char == 0x7D:  # }
+                depth -= 1
+                if opener == 0x7B and depth == 0:
+                    break
+            elif char == 0x29 and opener == 0x28 and depth == 1:  # ) fermant une entrée '('
+                break
+            index += 1
+
+        if opener is None:
+            position = index
+            continue
+
+        end = index + 1
+        yield buffer_start + start, buffer_start + end, buffer[start:end].decode('utf-8', errors='replace')
+
+        # Ne garder que la suite du tampon
+        buffer = buffer[end:]
+        buffer_start += end
+        position = 0
+
+
+def _read_braced(text, index):
+    """Lire une valeur entre accolades à partir de text[index] == '{'"""
+    depth = 0
+    for end in range(index, len(text)):
+        if text[end] == '{':
+            depth += 1
+        elif text[end] == '}':
+            depth -= 1
+            if depth == 0:
+                return text[index + 1:end], end + 1
+    return text[index + 1:], len(text)
+
+
+def _read_quoted(text, index):
+    """Lire une valeur entre guillemets (les accolades internes sont équilibrées)"""
+    depth = 0
+    for end in range(index + 1, len(text)):
+        char = text[end]
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+        elif char == '"' and depth == 0:
+            return text[index + 1:end], end + 1
+    return text[index + 1:], len(text)
+
+
+def clean_latex(value):
+    """Nettoyer une valeur BibTeX: accents LaTeX, accolades, espaces"""
+    value = LATEX_ACCENT_PATTERN.sub(lambda m: m.group(2) + LATEX_ACCENTS[m.group(1).strip()], value)
+    value = value.replace('{', '').replace('}', '').replace('~', ' ')
+    value = re.sub(r'\s+', ' ', value).strip()
+    return unicodedata.normalize('NFC', value)
+
+
+def parse_entry(text, macros=None):
+    """Analyser le texte d'une entrée en dict (None pour @comment/@preamble)"""
+    head = ENTRY_HEAD_PATTERN.match(text)
+    if not head:
+        return None
+    entry_type = head.group(1).lower()
+    if entry_type in ('comment', 'preamble'):
+        return None
+
+    body = text[head.end():].rstrip()
+    if body.endswith('}') or body.endswith(')'):
+        body = body[:-1]
+
+    key = None
+    if entry_type != 'string':
+        comma = body.find(',')
+        key = (body[:comma] if comma >= 0 else body).strip()
+        body = body[comma + 1:] if comma >= 0 else ''
+
+    fields = {}
+    index = 0
+    while index < len(body):
+        match = FIELD_NAME_PATTERN.match(body, index)
+        if not match:
+            break
+        name = match.group(1).lower()
+        index = match.end()
+
+        # Valeur: morceaux concaténés par '#'
+        parts = []
+        while index < len(body):
+            char = body[index]
+            if char == '{':
+                value, index = _read_braced(body, index)
+                parts.append(value)
+            elif char == '"':
+                value, index = _read_quoted(body, index)
+                parts.append(value)
+            else:
+                bare = BARE_VALUE_PATTERN.match(body, index)
+                if not bare:
+                    break
+                token = bare.group()
+                parts.append((macros or {}).get(token.lower(), token))
+                index = bare.end()
+
+            while index < len(body) and body[index].isspace():
+                index += 1
+            if index < len(body) and body[index] == '#':
+                index += 1
+                while index < len(body) and body[index].isspace():
+                    index += 1
+                continue
+            break
+
+        fields[name] = ''.join(parts)
+
+    if entry_type == 'string':
+        return {'type': 'string', 'macros': fields}
+
+    authors = [clean_latex(a) for a in re.split(r'\s+and\s+', fields.get('author', '')) if a.strip()]
+    year_match = YEAR_PATTERN.search(fields.get('year', '') or fields.get('date', ''))
+    doi_match = DOI_PATTERN.search(fields.get('doi', '')) or DOI_PATTERN.search(fields.get('url', ''))
+
+    return {
+        'key': key,
+        'type': entry_type,
+        'title': clean_latex(fields.get('title', '')),
+        'authors': authors,
+        'year': int(year_match.group()) if year_match else None,
+        'doi': doi_match.group().lower() if doi_match else None,
+        'journal': clean_latex(fields.get('journal', '') or fields.get('booktitle', '')),
+        'abstract': clean_latex(fields.get('abstract', '')),
+        'file': fields.get('file', ''),
+    }
+
+
+def _prefix_sha1(path, length):
+    """Empreinte SHA-1 des `length` premiers octets d'un fichier"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE * 16, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+class BibTeXManager:
+    def __init__(self, bib_paths=None, cache_dir=None):
+        # Sans BIBTEX_PATHS la source est désactivée (pas de parcours implicite du dossier local)
+        paths = bib_paths or os.getenv('BIBTEX_PATHS') or []
+        if isinstance(paths, str):
+            paths = paths.split(os.pathsep)
+        self.bib_paths = [Path(p).expanduser() for p in paths if p]
+        self.cache_dir = Path(cache_dir or os.getenv('CACHE_DIR', 'data/cache'))
+        self.manifest_file = self.cache_dir / 'bibtex_index.json'
+        self._manifest_stamp = None
+        self._manifest = None  # Chargé au premier accès (inutile pour count/last_sync)
+        self.cache = get_source_cache(self.cache_dir)
+        self.origin = os.pathsep.join(str(p) for p in self.bib_paths)
+        self._lookups = None
+
+    def test(self):
+        return "BibTeX fonctionne"
+
+    # ------------------------------------------------------------------
+    # Manifeste
+    # ------------------------------------------------------------------
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            self._manifest = self._load_manifest()
+        return self._manifest
+
+    @manifest.setter
+    def manifest(self, value):
+        self._manifest = value
+
+    def _load_manifest(self):
+        self._manifest_stamp = file_stamp(self.manifest_file)
+        generation = 0
+        if self.manifest_file.exists():
+            try:
+                with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                if manifest.get('version') == MANIFEST_VERSION:
+                    return manifest
+                # Format changé: tout est réanalysé, sous une génération encore jamais publiée
+                generation = manifest.get('generation', 0)
+            except Exception as e:
+                print(f"Erreur lecture de l'index BibTeX: {e}")
+        # files: chemin .bib -> {size, mtime_ns, parsed_until, prefix_sha1, macros, entries}
+        return {'version': MANIFEST_VERSION, 'generation': generation, 'last_sync': None, 'files': {},
+                'last_delta': None}
+
+    def _save_manifest(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.manifest_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        os.replace(tmp_file, self.manifest_file)
+        self._manifest_stamp = file_stamp(self.manifest_file)
+
+    @contextmanager
+    def _locked(self):
+        """Mise à jour du manifeste sous verrou, depuis sa dernière version sur le disque"""
+        with manifest_lock(self.manifest_file):
+            if self._manifest is not None and file_stamp(self.manifest_file) != self._manifest_stamp:
+                self._manifest = None  # Remplacé par un autre processus depuis le chargement
+                self._lookups = None
+            yield
+
+    def _bib_files(self):
+        """Fichiers .bib configurés (fichiers explicites ou dossiers parcourus)"""
+        found = []
+        for path in self.bib_paths:
+            if path.is_file():
+                found.append(path)
+            elif path.is_dir():
+                found.extend(sorted(path.rglob('*.bib')))
+        return [str(p) for p in found]
+
+    # ------------------------------------------------------------------
+    # Synchronisation
+    # ------------------------------------------------------------------
+
+    @timed('sync.bibtex')
+    def sync(self):
+        """Analyser les .bib nouveaux ou modifiés et retourner le nombre d'entrées"""
+        with self._locked():
+            return self._sync()
+
+    def _sync(self):
+        files = self.manifest['files']
+        old_ids = set(self._entries_by_id())
+        changes = []
+
+        current = self._bib_files()
+        for removed in set(files) - set(current):
+            del files[removed]
+            changes.append('removed')
+
+        for bib_path in current:
+            change = self._sync_file(bib_path)
+            if change:
+                changes.append(change)
+
+        new_entries = self._entries_by_id()
+        if changes or not self.manifest['last_sync']:
+            # Le delta n'est exact que si les .bib ont seulement grandi ou disparu
+            exact = old_ids and 'full' not in changes
+            self.manifest['generation'] += 1
+            self.manifest['last_delta'] = {
+                'from': self.manifest['generation'] - 1,
+                'upserts': sorted(set(new_entries) - old_ids) if exact else None,
+                'removed': sorted(old_ids - set(new_entries)),
+            }
+        self.manifest['last_sync'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self._save_manifest()
+        self._publish()
+        self._lookups = None
+        return len(new_entries)
+
+    def _sync_file(self, bib_path):
+        """Mettre à jour un .bib: retourne 'append', 'full' ou None s'il n'a pas changé"""
+        stat = os.stat(bib_path)
+        state = self.manifest['files'].get(bib_path)
+
+        if state and state['size'] == stat.st_size and state['mtime_ns'] == stat.st_mtime_ns:
+            return None
+
+        # Ajout en fin de fichier: les octets déjà analysés sont inchangés
+        if (state and stat.st_size > state['size']
+                and _prefix_sha1(bib_path, state['parsed_until']) == state['prefix_sha1']):
+            entries, macros = state['entries'], state['macros']
+            start = state['parsed_until']
+            change = 'append'
+        else:
+            entries, macros = [], {}
+            start = 0
+            change = 'full'
+
+        parsed_until = start
+        with open(bib_path, 'rb') as f:
+            for entry_start, entry_end, text in iter_raw_entries(f, start):
+                parsed_until = entry_end
+                entry = parse_entry(text, macros)
+                if entry is None:
+                    continue
+                if entry['type'] == 'string':
+                    macros.update({k: clean_latex(v) for k, v in entry['macros'].items()})
+                    continue
+                entry['offset'] = entry_start
+                entries.append(entry)
+
+        self.manifest['files'][bib_path] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'parsed_until': parsed_until,
+            'prefix_sha1': _prefix_sha1(bib_path, parsed_until),
+            'macros': macros,
+            'entries': entries,
+        }
+        return change
+
+    # ------------------------------------------------------------------
+    # Index et cache
+    # ------------------------------------------------------------------
+
+    def _entries_by_id(self):
+        """Entrées par identifiant (fichier .bib, clé de citation)
+
+        Une même clé définie dans deux .bib donne deux entrées distinctes.
+        """
+        entries = {}
+        for bib_path, state in self.manifest['files'].items():
+            for entry in state['entries']:
+                if entry['key']:
+                    entry_id = entry_identifier(bib_path, entry['key'])
+                    entries.setdefault(entry_id, dict(entry, bib=bib_path, id=entry_id))
+        return entries
+
+    def _build_lookups(self):
+        by_id = self._entries_by_id()
+        by_key, by_doi, by_author, by_year = {}, {}, {}, {}
+        for entry_id, entry in by_id.items():
+            by_key.setdefault(entry['key'], []).append(entry_id)
+            if entry['doi']:
+                by_doi.setdefault(entry['doi'], []).append(entry_id)
+            if entry['year']:
+                by_year.setdefault(entry['year'], []).append(entry_id)
+            for author in entry['authors']:
+                # Nom de famille: "Nom, Prénom" ou dernier mot de "Prénom Nom"
+                last_name = author.split(',')[0] if ',' in author else author.split()[-1]
+                by_author.setdefault(last_name.lower(), []).append(entry_id)
+        self._lookups = {'id': by_id, 'key': by_key, 'doi': by_doi, 'author': by_author, 'year': by_year}
+        return self._lookups
+
+    def find(self, key=None, doi=None, author=None, year=None):
+        """Entrées correspondant à une clé, un DOI, un nom d'auteur et/ou une année"""
+        self._snapshot()  # Index relu si un autre processus a publié une nouvelle génération
+        lookups = self._lookups or self._build_lookups()
+        candidates = None
+
+        def narrow(keys):
+            nonlocal candidates
+            keys = set(keys)
+            candidates = keys if candidates is None else candidates & keys
+
+        if key:
+            narrow(lookups['key'].get(key, []))
+        if doi:
+            narrow(lookups['doi'].get(doi.lower(), []))
+        if author:
+            narrow(lookups['author'].get(author.lower(), []))
+        if year:
+            narrow(lookups['year'].get(int(year), []))
+
+        if candidates is None:
+            candidates = lookups['id'].keys()
+        return [lookups['id'][k] for k in sorted(candidates)]
+
+    def _publish(self, synced=True):
+        """Publier la liste des fichiers dans le cache partagé"""
+        self.cache.publish('bibtex', self.origin, self.manifest['generation'], self.manifest['last_sync'],
+                           lambda: list(self._entries_by_id().values()), synced=synced)
+
+    def get_cached_files(self):
+        """Entrées connues depuis la dernière synchronisation (cache partagé, sinon manifeste)"""
+        files = self.cache.get_files('bibtex', self.origin)
+        if files is None:
+            files = list(self._entries_by_id().values())
+            if self.manifest['last_sync']:
+                self._publish(synced=False)
+        return files
+
+    def get_changes(self, since_generation):
+        """Entrées ajoutées et identifiants supprimés depuis une génération (None si inconnu)
+
+        Une entrée modifiée dans un .bib réanalysé en entier n'est pas
+        distinguable d'une entrée inchangée: dans ce cas le delta est inconnu.
+        """
+        if since_generation == self.manifest['generation']:
+            return [], []
+        delta = self.manifest.get('last_delta')
+        if not delta or delta['from'] != since_generation or delta['upserts'] is None:
+            return None
+        entries = self._entries_by_id()
+        return [entries[k] for k in delta['upserts'] if k in entries], list(delta['removed'])
+
+    def generation(self):
+        snapshot = self._snapshot()
+        return snapshot['generation'] if snapshot else self.manifest['generation']
+
+    def count(self):
+        snapshot = self._snapshot()
+        return snapshot['count'] if snapshot else len(self._entries_by_id())
+
+    def last_sync(self):
+        snapshot = self._snapshot()
+        last_sync = snapshot['last_sync'] if snapshot else self.manifest['last_sync']
+        return last_sync or 'Jamais'
+
+    def is_stale(self):
+        """Vrai si la dernière synchronisation dépasse la durée de validité du cache (CACHE_TTL_BIBTEX)"""
+        return self.cache.is_expired('bibtex', self.origin)
+
+    def _snapshot(self):
+        # Le manifeste en mémoire fait foi, sauf si un autre processus a publié depuis
+        snapshot = self.cache.snapshot('bibtex', self.origin)
+        if self._manifest is not None:
+            if not published_since(snapshot, self._manifest['generation'], self._manifest['last_sync']):
+                return None
+            self._manifest = None
+            self._lookups = None
+        return snapshot
+
+
+def entry_identifier(bib_path, key):
+    """Identifiant d'une entrée: la clé de citation n'est unique qu'à l'intérieur d'un .bib"""
+    return f"{bib_path}#{key}"
+
+
+def link_pdf(entry, files_by_stem, files_by_doi):
+    """Chemin du PDF local correspondant à une entrée (champ file, DOI ou clé)"""
+    file_field = entry.get('file') or ''
+    for part in re.split(r';', file_field):
+        # Formats JabRef/Zotero: "description:chemin:type" ou chemin simple
+        pieces = part.split(':')
+        candidate = pieces[1] if len(pieces) >= 3 else part
+        if candidate.lower().endswith('.pdf') and os.path.exists(candidate):
+            return candidate
+
+    if entry.get('doi') and entry['doi'] in files_by_doi:
+        return files_by_doi[entry['doi']]
+    return files_by_stem.get((entry.get('key') or '').lower())
+
+
+# Test simple
+if __name__ == "__main__":
+    manager = BibTeXManager()
+    print(manager.test())
@@ -0,0 +1,456 @@
+"""
+Graphe de citations entre les documents de la bibliothèque
+
+Les arêtes viennent des bibliographies des PDF dont le contenu a été extrait
+(commande extract): chaque DOI ou identifiant arXiv cité est un nœud, relié au
+document qui le cite. Un document est identifié par son propre DOI s'il en a
+un, ce qui relie "qui cite X" aux PDF de la bibliothèque. Les listes de
+références extraites sont mises en cache par empreinte de document: seul le
+texte des nouveaux documents est relu.
+
+L'adjacence est stockée en CSR (tableaux d'offsets et de voisins) dans les deux
+sens, dans des fichiers binaires chargés par mmap: l'ouverture ne lit rien, les
+pages sont chargées à la demande. Une reconstruction écrit une nouvelle version
+puis bascule le pointeur de meta.json, comme le cache des sources.
+"""
+
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import re
+import shutil
+import sys
+from array import array
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+from pdf_extractor import DOI_PATTERN
+
+GRAPH_VERSION = 1
+
+REFERENCES_HEADING = re.compile(r'\b(?:References|REFERENCES|Bibliography|BIBLIOGRAPHY|Bibliographie|'
+                                r'BIBLIOGRAPHIE|Références|RÉFÉRENCES)\b')
+ARXIV_PATTERN = re.compile(r'arXiv\s*:\s*(\d{4}\.\d{4,5}|[a-z\-]+(?:\.[A-Z]{2})?/\d{7})', re.I)
+ARXIV_ID_PATTERN = re.compile(r'^(?:arxiv:)?(\d{4}\.\d{4,5}|[a-z\-]+(?:\.[A-Z]{2})?/\d{7})(?:v\d+)?$', re.I)
+
+# Fichiers d'une version: (nom, type de array)
+ARRAYS = (('out_offsets', 'q'), ('out_targets', 'i'), ('in_offsets', 'q'), ('in_sources', 'i'))
+
+
+def doi_key(doi):
+    return f"doi:{doi.lower().rstrip('.,;')}"
+
+
+def extract_references(text, own_key=None):
+    """Clés (doi:..., arxiv:...) citées dans la bibliographie d'un texte, sans doublon
+
+    Seule la partie qui suit le dernier titre "References"/"Bibliographie" est
+    lue; sans titre reconnu (ou sans identifiant après lui), tout le texte.
+    """
+    headings = list(REFERENCES_HEADING.finditer(text))
+    sections = [text[headings[-1].end():], text] if headings else [text]
+
+    for section in sections:
+        keys = []
+        seen = {own_key}
+        for match in DOI_PATTERN.finditer(section):
+            key = doi_key(match.group(1))
+            if key not in seen:
+                seen.add(key)
+                keys.append(key)
+        for match in ARXIV_PATTERN.finditer(section):
+            key = f"arxiv:{match.group(1).lower()}"
+            if key not in seen:
+                seen.add(key)
+                keys.append(key)
+        if keys:
+            return keys
+    return []
+
+
+def _csr(count, sources, targets):
+    """Tableaux CSR (offsets, voisins) des arêtes sources[i] -> targets[i] (tri par comptage)"""
+    offsets = array('q', bytes(8 * (count + 1)))
+    for source in sources:
+        offsets[source + 1] += 1
+    for node in range(count):
+        offsets[node + 1] += offsets[node]
+
+    position = offsets[:-1]
+    neighbours = array('i', bytes(4 * len(targets)))
+    for source, target in zip(sources, targets):
+        neighbours[position[source]] = target
+        position[source] += 1
+    return offsets, neighbours
+
+
+class CitationGraph:
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir or os.getenv('CACHE_DIR', 'data/cache'))
+        self.graph_dir = self.cache_dir / 'citations'
+        self.meta_file = self.graph_dir / 'meta.json'
+        self.references_file = self.graph_dir / 'references.json'
+
+        self.meta = None
+        self._maps = []
+        self._arrays = {}
+        self._nodes = None   # Clés, titres, auteurs, chemins (lus par load avec les tableaux)
+        self._ids = None
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+
+    def build(self, content_cache, entries=(), force=False):
+        """(Re)construire le graphe depuis le contenu extrait; False s'il est déjà à jour
+
+        `entries` (entrées BibTeX) donne un titre aux DOI cités qui ne sont pas
+        dans la bibliothèque.
+        """
+        documents = content_cache.manifest['documents']
+        paths = {}
+        for path, (_, _, digest) in content_cache.manifest['paths'].items():
+            paths.setdefault(digest, path)
+
+        signature = hashlib.sha1(json.dumps(
+            [sorted(documents), sorted(entry.get('doi') or '' for entry in entries)]).encode('utf-8')).hexdigest()
+        meta = self._read_meta()
+        if meta and meta.get('signature') == signature and not force:
+            return False
+
+        # Références extraites, réutilisées tant que le document est connu
+        references = {} if force else self._load_references()
+        references = {digest: keys for digest, keys in references.items() if digest in documents}
+
+        ids = {}
+        keys, titles, authors, years, local_paths = [], [], [], [], []
+
+        def node(key, title='', author='', year=0, path=''):
+            node_id = ids.get(key)
+            if node_id is None:
+                node_id = ids[key] = len(keys)
+                keys.append(key)
+                titles.append(title)
+                authors.append(author)
+                years.append(year)
+                local_paths.append(path)
+            elif path and not local_paths[node_id]:
+                titles[node_id], authors[node_id], years[node_id], local_paths[node_id] = title, author, year, path
+            return node_id
+
+        sources, targets = array('i'), array('i')
+        for digest in sorted(documents):
+            document = documents[digest]
+            own_key = doi_key(document['doi']) if document.get('doi') else f"sha1:{digest}"
+            if digest not in references:
+                references[digest] = extract_references(content_cache.text(digest), own_key)
+            citing = node(own_key, document.get('title') or Path(paths.get(digest, '')).stem,
+                          '; '.join(document.get('authors') or []), document.get('year') or 0,
+                          paths.get(digest, ''))
+            for key in references[digest]:
+                cited = node(key)
+                if cited != citing:
+                    sources.append(citing)
+                    targets.append(cited)
+
+        for entry in entries:
+            key = doi_key(entry['doi']) if entry.get('doi') else None
+            if key in ids and not titles[ids[key]]:
+                node_id = ids[key]
+                titles[node_id] = entry.get('title') or ''
+                authors[node_id] = '; '.join(entry.get('authors') or [])
+                years[node_id] = entry.get('year') or 0
+
+        out_offsets, out_targets = _csr(len(keys), sources, targets)
+        in_offsets, in_sources = _csr(len(keys), targets, sources)
+        arrays = {'out_offsets': out_offsets, 'out_targets': out_targets,
+                  'in_offsets': in_offsets, 'in_sources': in_sources}
+        nodes = {'keys': keys, 'titles': titles, 'authors': authors, 'years': years, 'paths': local_paths}
+
+        self._write(arrays, nodes, references, {
+            'signature': signature,
+            'nodes': len(keys),
+            'edges': len(sources),
+            'documents': len(documents),
+        })
+        return True
+
+    def _load_references(self):
+        try:
+            with open(self.references_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == GRAPH_VERSION:
+                return data['documents']
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Erreur lecture des références extraites: {e}")
+        return {}
+
+    def _write(self, arrays, nodes, references, meta):
+        """Écrire une nouvelle version puis basculer meta.json dessus"""
+        self.graph_dir.mkdir(parents=True, exist_ok=True)
+        previous = self._read_meta()
+        number = (previous or {}).get('number', 0) + 1
+        version_dir = self.graph_dir / f"v{number}"
+        if version_dir.exists():
+            shutil.rmtree(version_dir)
+        version_dir.mkdir()
+
+        for name, _ in ARRAYS:
+            with open(version_dir / f"{name}.bin", 'wb') as f:
+                arrays[name].tofile(f)
+        with open(version_dir / 'nodes.json', 'w', encoding='utf-8') as f:
+            json.dump(nodes, f, ensure_ascii=False)
+
+        tmp_file = self.references_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': GRAPH_VERSION, 'documents': references}, f, ensure_ascii=False)
+        os.replace(tmp_file, self.references_file)
+
+        meta.update({
+            'version': GRAPH_VERSION,
+            'number': number,
+            'byteorder': sys.byteorder,
+            'built': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        })
+        tmp_file = self.meta_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_file, self.meta_file)
+
+        # Les anciennes versions ne sont plus référencées (un lecteur ouvert garde ses mmap)
+        for old in self.graph_dir.glob('v*'):
+            if old != version_dir and old.is_dir():
+                shutil.rmtree(old, ignore_errors=True)
+        self.close()
+
+    # ------------------------------------------------------------------
+    # Chargement
+    # ------------------------------------------------------------------
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('version') == GRAPH_VERSION and meta.get('byteorder') == sys.byteorder:
+                return meta
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Erreur lecture du graphe de citations: {e}")
+        return None
+
+    def load(self):
+        """Projeter les tableaux en mémoire (mmap) et lire les nœuds; False si aucun graphe n'a été construit
+
+        Tout est ouvert ici: une reconstruction concurrente supprime les anciennes
+        versions, un lecteur déjà chargé garde ses mmap et ses nœuds. Si la
+        version pointée par meta.json disparaît pendant l'ouverture, la suivante
+        est relue.
+        """
+        for attempt in range(3):
+            self.close()
+            self.meta = self._read_meta()
+            if self.meta is None:
+                return False
+            try:
+                self._open_version(self.graph_dir / f"v{self.meta['number']}")
+                return True
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+        return False
+
+    def _open_version(self, version_dir):
+        for name, typecode in ARRAYS:
+            with open(version_dir / f"{name}.bin", 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    self._arrays[name] = memoryview(array(typecode))
+                    continue
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps.append(mapped)
+            self._arrays[name] = memoryview(mapped).cast(typecode)
+        with open(version_dir / 'nodes.json', 'r', encoding='utf-8') as f:
+            self._nodes = json.load(f)
+
+    def close(self):
+        for view in self._arrays.values():
+            view.release()
+        for mapped in self._maps:
+            mapped.close()
+        self._arrays, self._maps = {}, []
+        self._nodes = self._ids = None
+
+    def _ensure_loaded(self):
+        if not self._arrays and not self.load():
+            raise FileNotFoundError("Graphe de citations absent: lancez la commande citations --rebuild")
+
+    @property
+    def nodes(self):
+        self._ensure_loaded()
+        return self._nodes
+
+    # ------------------------------------------------------------------
+    # Requêtes
+    # ------------------------------------------------------------------
+
+    def node_id(self, key):
+        if self._ids is None:
+            self._ids = {k: i for i, k in enumerate(self.nodes['keys'])}
+        return self._ids.get(key)
+
+    def describe(self, node_id):
+        nodes = self.nodes
+        return {
+            'key': nodes['keys'][node_id],
+            'title': nodes['titles'][node_id],
+            'authors': nodes['authors'][node_id],
+            'year': nodes['years'][node_id] or None,
+            'path': nodes['paths'][node_id],
+        }
+
+    def resolve(self, query):
+        """Nœuds désignés par une requête: DOI, identifiant arXiv, clé, ou texte (titre/auteur des documents)"""
+        query = query.strip()
+        doi = DOI_PATTERN.search(query)
+        arxiv = ARXIV_ID_PATTERN.match(query)
+        if doi:
+            key = doi_key(doi.group(1))
+        elif arxiv:
+            key = f"arxiv:{arxiv.group(1).lower()}"
+        else:
+            key = query
+        node_id = self.node_id(key)
+        if node_id is not None:
+            return [node_id]
+        if doi or arxiv:
+            return []
+
+        needle = query.lower()
+        nodes = self.nodes
+        return [i for i, (title, authors) in enumerate(zip(nodes['titles'], nodes['authors']))
+                if needle in title.lower() or needle in authors.lower()]
+
+    def references(self, node_id):
+        """Nœuds cités par un document"""
+        self._ensure_loaded()
+        offsets = self._arrays['out_offsets']
+        return self._arrays['out_targets'][offsets[node_id]:offsets[node_id + 1]].tolist()
+
+    def cited_by(self, node_id):
+        """Documents qui citent un nœud"""
+        self._ensure_loaded()
+        offsets = self._arrays['in_offsets']
+        return self._arrays['in_sources'][offsets[node_id]:offsets[node_id + 1]].tolist()
+
+    def k_hop(self, seeds, hops=1, direction='both'):
+        """Parcours en largeur depuis `seeds`: {nœud: distance} jusqu'à `hops` arêtes
+
+        `direction`: 'out' (références), 'in' (citations reçues) ou 'both'.
+        """
+        self._ensure_loaded()
+        views = []
+        if direction in ('out', 'both'):
+            views.append((self._arrays['out_offsets'], self._arrays['out_targets']))
+        if direction in ('in', 'both'):
+            views.append((self._arrays['in_offsets'], self._arrays['in_sources']))
+
+        visited = bytearray(self.meta['nodes'])
+        distances = {}
+        queue = deque()
+        for seed in seeds:
+            if not visited[seed]:
+                visited[seed] = 1
+                distances[seed] = 0
+                queue.append(seed)
+
+        while queue:
+            node_id = queue.popleft()
+            distance = distances[node_id]
+            if distance >= hops:
+                continue
+            for offsets, neighbours in views:
+                for neighbour in neighbours[offsets[node_id]:offsets[node_id + 1]].tolist():
+                    if not visited[neighbour]:
+                        visited[neighbour] = 1
+                        distances[neighbour] = distance + 1
+                        queue.append(neighbour)
+        return distances
+
+    def co_cited(self, seeds, limit=20):
+        """Nœuds le plus souvent cités avec les nœuds `seeds` (co-citation): [(nœud, nombre)]
+
+        Les comptes sont cumulés sur tous les nœuds de départ; un document qui
+        cite plusieurs d'entre eux compte pour chacun.
+        """
+        self._ensure_loaded()
+        seeds = set(seeds)
+        out_offsets, out_targets = self._arrays['out_offsets'], self._arrays['out_targets']
+        counts = {}
+        for seed in seeds:
+            for citing in self.cited_by(seed):
+                for other in out_targets[out_offsets[citing]:out_offsets[citing + 1]].tolist():
+                    if other not in seeds:
+                        counts[other] = counts.get(other, 0) + 1
+        return heapq.nlargest(limit, counts.items(), key=lambda item: (item[1], -item[0]))
+
+    def coupled(self, seeds, limit=20):
+        """Documents qui partagent le plus de références avec les nœuds `seeds` (couplage bibliographique)"""
+        self._ensure_loaded()
+        seeds = set(seeds)
+        in_offsets, in_sources = self._arrays['in_offsets'], self._arrays['in_sources']
+        counts = {}
+        for seed in seeds:
+            for cited in self.references(seed):
+                for other in in_sources[in_offsets[cited]:in_offsets[cited + 1]].tolist():
+                    if other not in seeds:
+                        counts[other] = counts.get(other, 0) + 1
+        return heapq.nlargest(limit, counts.items(), key=lambda item: (item[1], -item[0]))
+
+    def stats(self):
+        meta = self._read_meta()
+        if meta is None:
+            return None
+        return {key: meta[key] for key in ('nodes', 'edges', 'documents', 'built')}
+
+
+# Test simple: graphe aléatoire de quelques millions d'arêtes
+if __name__ == "__main__":
+    import random
+    import tempfile
+    import time
+
+    nodes_count = int(os.getenv('GRAPH_NODES', '200000'))
+    edges_count = int(os.getenv('GRAPH_EDGES', '2000000'))
+    rng = random.Random(0)
+    sources = array('i', (rng.randrange(nodes_count) for _ in range(edges_count)))
+    # Citations concentrées sur les premiers nœuds (articles très cités)
+    targets = array('i', (int(nodes_count * rng.random() ** 3) for _ in range(edges_count)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        graph = CitationGraph(tmp)
+        start = time.perf_counter()
+        out_offsets, out_targets = _csr(nodes_count, sources, targets)
+        in_offsets, in_sources = _csr(nodes_count, targets, sources)
+        nodes = {'keys': [f"n{i}" for i in range(nodes_count)], 'titles': [''] * nodes_count,
+                 'authors': [''] * nodes_count, 'years': [0] * nodes_count, 'paths': [''] * nodes_count}
+        graph._write({'out_offsets': out_offsets, 'out_targets': out_targets, 'in_offsets': in_offsets,
+                      'in_sources': in_sources}, nodes, {},
+                     {'signature': '', 'nodes': nodes_count, 'edges': edges_count, 'documents': nodes_count})
+        print(f"Construction CSR ({edges_count} arêtes): {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        graph.load()
+        print(f"Chargement (mmap): {(time.perf_counter() - start) * 1000:.2f} ms")
+        for label, query in (('cited_by', lambda: graph.cited_by(0)),
+                             ('2-hop', lambda: graph.k_hop([12345], 2)),
+                             ('co_cited', lambda: graph.co_cited([5000])),
+                             ('coupled', lambda: graph.coupled([12345]))):
+            start = time.perf_counter()
+            result = query()
+            print(f"{label:10} {len(result):8} nœuds  {(time.perf_counter() - start) * 1000:8.2f} ms")
+        graph.close()
@@ -0,0 +1,242 @@
+"""
+Détection des doublons par empreinte de contenu
+
+Un même article peut exister sur Google Drive, sur GitHub et en local. Les
+fichiers sont d'abord regroupés par taille; seuls les groupes de même taille
+sont examinés. Les fichiers locaux reçoivent une empreinte partielle (début et
+fin du fichier), puis une empreinte complète seulement en cas de collision ou
+face à une copie distante. L'empreinte complète calcule en une passe le MD5
+(fourni par Drive, md5Checksum) et le SHA-1 de blob Git (fourni par GitHub,
+sha), ce qui permet de relier les copies des trois sources.
+
+Les empreintes locales sont conservées dans un cache disque: un fichier dont
+la taille et la date de modification n'ont pas changé n'est jamais relu.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+
+HASH_CACHE_VERSION = 1
+PARTIAL_BYTES = 64 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+
+def partial_hash(path, size):
+    """Empreinte rapide: taille, 64 Ko de début et 64 Ko de fin"""
+    digest = hashlib.sha1(str(size).encode('ascii'))
+    with open(path, 'rb') as f:
+        digest.update(f.read(PARTIAL_BYTES))
+        if size > 2 * PARTIAL_BYTES:
+            f.seek(size - PARTIAL_BYTES)
+            digest.update(f.read(PARTIAL_BYTES))
+        elif size > PARTIAL_BYTES:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def full_hashes(path):
+    """(md5, sha1 de blob Git) du contenu complet, en une seule lecture"""
+    size = os.path.getsize(path)
+    md5 = hashlib.md5()
+    git_sha = hashlib.sha1(f"blob {size}\0".encode('ascii'))
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            md5.update(chunk)
+            git_sha.update(chunk)
+    return md5.hexdigest(), git_sha.hexdigest()
+
+
+def copy_with_hashes(source, target):
+    """Copier un fichier et calculer (md5, sha1 de blob Git) pendant la même lecture"""
+    size = os.path.getsize(source)
+    md5 = hashlib.md5()
+    git_sha = hashlib.sha1(f"blob {size}\0".encode('ascii'))
+    with open(source, 'rb') as src, open(target, 'xb') as dst:
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+            md5.update(chunk)
+            git_sha.update(chunk)
+            dst.write(chunk)
+    shutil.copystat(source, target)
+    return md5.hexdigest(), git_sha.hexdigest()
+
+
+class ContentHashCache:
+    """Cache disque des empreintes des fichiers locaux"""
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir or os.getenv('CACHE_DIR', 'data/cache'))
+        self.cache_file = self.cache_dir / 'content_hashes.json'
+        self._files = None  # chemin -> [taille, mtime_ns, partielle, md5, sha git]
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.computed = 0  # Empreintes calculées (non lues depuis le cache)
+
+    @property
+    def files(self):
+        if self._files is None:
+            self._files = self._load()
+        return self._files
+
+    def _load(self):
+        if self.cache_file.exists():
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == HASH_CACHE_VERSION:
+                    return data['files']
+            except Exception as e:
+                print(f"Erreur lecture du cache d'empreintes: {e}")
+        return {}
+
+    def _entry(self, path):
+        """Entrée du cache pour un fichier inchangé (réinitialisée sinon)"""
+        stat = os.stat(path)
+        entry = self.files.get(path)
+        if not entry or entry[0] != stat.st_size or entry[1] != stat.st_mtime_ns:
+            entry = [stat.st_size, stat.st_mtime_ns, None, None, None]
+            with self._lock:
+                self.files[path] = entry
+        return entry
+
+    def partial(self, path):
+        entry = self._entry(path)
+        if entry[2] is None:
+            entry[2] = partial_hash(path, entry[0])
+            self._mark_computed()
+        return entry[2]
+
+    def full(self, path):
+        """(md5, sha git) d'un fichier local"""
+        entry = self._entry(path)
+        if entry[3] is None:
+            entry[3], entry[4] = full_hashes(path)
+            self._mark_computed()
+        return entry[3], entry[4]
+
+    def store(self, path, size, mtime_ns, md5, git_sha):
+        """Enregistrer les empreintes complètes d'un fichier calculées ailleurs (ex: import)"""
+        with self._lock:
+            self.files[path] = [size, mtime_ns, None, md5, git_sha]
+            self._dirty = True
+
+    def known_md5(self, files=None):
+        """MD5 déjà connus (fichiers locaux dont l'empreinte complète a été calculée)
+
+        Avec `files` ({chemin: (taille, mtime_ns)}), seulement ceux de ces
+        fichiers, et s'ils n'ont pas changé depuis le calcul.
+        """
+        with self._lock:
+            if files is None:
+                return {entry[3] for entry in self.files.values() if entry[3]}
+            known = set()
+            for path, (size, mtime_ns) in files.items():
+                entry = self.files.get(path)
+                if entry and entry[3] and entry[0] == size and entry[1] == mtime_ns:
+                    known.add(entry[3])
+            return known
+
+    def _mark_computed(self):
+        with self._lock:
+            self.computed += 1
+            self._dirty = True
+
+    def forget(self, paths):
+        """Oublier les fichiers qui n'existent plus"""
+        with self._lock:
+            for path in paths:
+                if self.files.pop(path, None) is not None:
+                    self._dirty = True
+
+    def save(self):
+        """Sauvegarder le cache de manière atomique (seulement si modifié)"""
+        if not self._dirty:
+            return
+
+        with self._lock:
+            data = {'version': HASH_CACHE_VERSION, 'files': dict(self.files)}
+            self._dirty = False
+
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.cache_file.with_suffix('.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            print(f"Erreur sauvegarde du cache d'empreintes: {e}")
+
+
+def find_duplicates(candidates, hash_cache):
+    """Regrouper les copies d'un même fichier
+
+    `candidates` est une liste de (doc_id, taille, empreinte connue, chemin
+    local): l'empreinte connue vaut "md5:..." (Drive) ou "git:..." (GitHub),
+    le chemin est None pour un fichier distant. Retourne la liste des groupes
+    (listes de doc_id) d'au moins deux copies.
+    """
+    by_size = {}
+    for candidate in candidates:
+        if candidate[1] > 0:
+            by_size.setdefault(candidate[1], []).append(candidate)
+
+    clusters = []
+    for group in by_size.values():
+        if len(group) > 1:
+            clusters.extend(_cluster_same_size(group, hash_cache))
+    return clusters
+
+
+def _cluster_same_size(group, hash_cache):
+    """Groupes de copies parmi des fichiers de même taille"""
+    keys = {}  # doc_id -> empreintes
+    local = [c for c in group if c[3]]
+    has_remote = any(c[2] and not c[3] for c in group)
+
+    for doc_id, _, known, path in group:
+        if known and not path:
+            keys[doc_id] = {known}
+
+    # Sans copie distante, l'empreinte partielle suffit à écarter la plupart des fichiers
+    if has_remote:
+        to_hash = local
+    else:
+        by_partial = {}
+        for candidate in local:
+            try:
+                by_partial.setdefault(hash_cache.partial(candidate[3]), []).append(candidate)
+            except OSError:
+                continue
+        to_hash = [c for same in by_partial.values() if len(same) > 1 for c in same]
+
+    for doc_id, _, _, path in to_hash:
+        try:
+            md5, git_sha = hash_cache.full(path)
+        except OSError:
+            continue
+        keys[doc_id] = {f"md5:{md5}", f"git:{git_sha}"}
+
+    # Union des documents partageant une empreinte
+    parent = {doc_id: doc_id for doc_id in keys}
+
+    def find(doc_id):
+        while parent[doc_id] != doc_id:
+            parent[doc_id] = parent[parent[doc_id]]
+            doc_id = parent[doc_id]
+        return doc_id
+
+    owner = {}
+    for doc_id, doc_keys in keys.items():
+        for key in doc_keys:
+            if key in owner:
+                parent[find(doc_id)] = find(owner[key])
+            else:
+                owner[key] = doc_id
+
+    clusters = {}
+    for doc_id in keys:
+        clusters.setdefault(find(doc_id), []).append(doc_id)
+    return [sorted(members) for members in clusters.values() if len(members) > 1]
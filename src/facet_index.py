@@ -0,0 +1,187 @@
+"""
+Index bitmap des facettes (source, type, année) et comptes par facette
+
+Chaque valeur d'une facette a un bitmap: le bit n°doc_id est à 1 si le document
+a cette valeur. Les bitmaps sont des bytearray modifiés bit à bit à chaque
+ajout ou suppression (O(1)); pour interroger, ils sont convertis en entiers
+Python (int.from_bytes, mis en cache jusqu'à la modification suivante): les ET,
+OU et comptages de bits se font alors en C, un mot machine à la fois. Filtrer
+par source, type ou intervalle d'années revient à combiner quelques bitmaps,
+et compter une facette sur un ensemble de résultats à un ET et un popcount
+par valeur.
+
+Les auteurs se comptent par milliers: un bitmap par auteur coûterait n/8
+octets chacun. Leur filtre reste celui des postings (préfixes de tokens) et
+leurs comptes sont lus dans la colonne auteur du store pour les seules lignes
+résultats.
+"""
+
+import re
+from collections import Counter, defaultdict
+
+FACETS = ('source', 'type', 'year')
+MAX_YEAR = 9999
+
+YEAR_RANGE_PATTERN = re.compile(r'^\s*(\d{1,4})?\s*(?:-|–|\.\.)\s*(\d{1,4})?\s*$')
+
+# int.bit_count n'existe qu'à partir de Python 3.10
+popcount = getattr(int, 'bit_count', None) or (lambda value: bin(value).count('1'))
+# Positions des bits à 1 de chaque octet
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def parse_year_range(year):
+    """Bornes (min, max) d'une année ou d'un intervalle: 2015, '2015-2020', '2015-', '-2020'
+
+    Retourne None si la valeur est illisible.
+    """
+    if isinstance(year, int):
+        return year, year
+    text = str(year).strip()
+    if text.isdigit():
+        return int(text), int(text)
+    match = YEAR_RANGE_PATTERN.match(text)
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    low = int(match.group(1)) if match.group(1) else 1
+    high = int(match.group(2)) if match.group(2) else MAX_YEAR
+    return (low, high) if low <= high else (high, low)
+
+
+def bitmap_from_rows(rows):
+    """Bitmap (entier) des lignes données"""
+    rows = list(rows)
+    if not rows:
+        return 0
+    bits = bytearray((max(rows) >> 3) + 1)
+    for row in rows:
+        bits[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def iter_rows(bitmap):
+    """Numéros des bits à 1 d'un bitmap, dans l'ordre croissant"""
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) >> 3, 'little')
+    return ((index << 3) + bit for index, value in enumerate(data) if value for bit in _BYTE_BITS[value])
+
+
+class FacetIndex:
+    def __init__(self):
+        self.bitmaps = {facet: {} for facet in FACETS}  # facette -> valeur -> bytearray
+        self.sizes = {facet: Counter() for facet in FACETS}  # facette -> valeur -> nombre de documents
+        self._ints = {}  # (facette, valeur) -> entier, recalculé après modification
+
+    @staticmethod
+    def _values(source, reference):
+        return (
+            ('source', source),
+            ('type', str(reference.get('type') or '').lower()),
+            ('year', int(reference.get('year') or 0)),
+        )
+
+    def add(self, row, source, reference):
+        byte, mask = row >> 3, 1 << (row & 7)
+        for facet, value in self._values(source, reference):
+            bits = self.bitmaps[facet].get(value)
+            if bits is None:
+                bits = self.bitmaps[facet][value] = bytearray()
+            if len(bits) <= byte:
+                bits.extend(bytes(byte + 1 - len(bits)))
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                self.sizes[facet][value] += 1
+            self._ints.pop((facet, value), None)
+
+    def remove(self, row, source, reference):
+        byte, mask = row >> 3, 1 << (row & 7)
+        for facet, value in self._values(source, reference):
+            bits = self.bitmaps[facet].get(value)
+            if bits is None or len(bits) <= byte or not bits[byte] & mask:
+                continue
+            bits[byte] &= ~mask & 0xFF
+            self._ints.pop((facet, value), None)
+            self.sizes[facet][value] -= 1
+            if not self.sizes[facet][value]:
+                del self.bitmaps[facet][value]
+                del self.sizes[facet][value]
+
+    @classmethod
+    def from_store(cls, store, keys):
+        """Reconstruire les bitmaps depuis les colonnes du store (chargement de l'index)"""
+        facets = cls()
+        pool, types, years = store.pool, store.types, store.years
+        rows = {facet: defaultdict(list) for facet in FACETS}
+        for key, row in keys.items():
+            rows['source'][key[:key.index(':')]].append(row)
+            rows['type'][str(pool[types[row]] or '').lower()].append(row)
+            rows['year'][int(years[row] or 0)].append(row)
+        for facet, values in rows.items():
+            for value, value_rows in values.items():
+                bitmap = bitmap_from_rows(value_rows)
+                facets.bitmaps[facet][value] = bytearray(bitmap.to_bytes((bitmap.bit_length() + 7) >> 3, 'little'))
+                facets.sizes[facet][value] = len(value_rows)
+                facets._ints[(facet, value)] = bitmap
+        return facets
+
+    # ------------------------------------------------------------------
+    # Interrogation
+    # ------------------------------------------------------------------
+
+    def bitmap(self, facet, value):
+        """Bitmap (entier) d'une valeur de facette"""
+        cached = self._ints.get((facet, value))
+        if cached is None:
+            bits = self.bitmaps[facet].get(value)
+            cached = self._ints[(facet, value)] = int.from_bytes(bits, 'little') if bits else 0
+        return cached
+
+    def union(self, facet, values):
+        result = 0
+        for value in values:
+            result |= self.bitmap(facet, value)
+        return result
+
+    def year_range(self, low, high):
+        """Bitmap des documents dont l'année connue est dans [low, high]"""
+        return self.union('year', [year for year in self.bitmaps['year'] if year and low <= year <= high])
+
+    def values(self, facet):
+        return list(self.bitmaps[facet])
+
+    def counts(self, rows, store=None, authors=10):
+        """Comptes de chaque valeur de facette parmi les lignes `rows` (résultats d'une recherche)
+
+        Avec `store`, ajoute les `authors` auteurs les plus fréquents. Les
+        valeurs sont des chaînes (année et type inconnus: 'Inconnue', 'unknown').
+        """
+        rows = list(rows)
+        results = bitmap_from_rows(rows)
+        counts = {}
+        for facet in FACETS:
+            facet_counts = {}
+            for value in self.bitmaps[facet]:
+                count = popcount(self.bitmap(facet, value) & results)
+                if count:
+                    facet_counts[_label(facet, value)] = count
+            counts[facet] = dict(sorted(facet_counts.items(), key=lambda item: (-item[1], str(item[0]))))
+        if store is not None:
+            pool = store.pool
+            top = Counter(map(store.authors.__getitem__, rows)).most_common(authors)
+            counts['author'] = {(pool[author] or 'Inconnu'): count for author, count in top}
+        return counts
+
+
+def _label(facet, value):
+    if facet == 'year':
+        return str(value) if value else 'Inconnue'
+    return value or 'unknown'
+
+
+# Test simple
+if __name__ == "__main__":
+    facets = FacetIndex()
+    for row, year in enumerate([2014, 2015, 2018, 2021, 0]):
+        facets.add(row, 'local', {'type': 'pdf', 'year': year})
+    print(parse_year_range('2015-2020'), list(iter_rows(facets.year_range(*parse_year_range('2015-2020')))))
+    facets.remove(4, 'local', {'type': 'pdf', 'year': 0})
+    print(facets.counts([0, 1, 2, 3]), facets.sizes['year'])
@@ -0,0 +1,193 @@
+"""
+Extraction des métadonnées (auteur, année, titre) depuis les noms de fichiers
+
+Les expressions régulières sont compilées une seule fois au chargement du
+module. Chaque nom de fichier n'est analysé qu'une fois: un cache LRU borné
+évite de recalculer dans le processus, et un cache disque partagé entre les
+processus (SQLite, CACHE_DIR/filename_cache.db) conserve les résultats tant
+que les règles d'extraction (version PARSER_VERSION) ne changent pas. Le cache
+disque est borné à FILENAME_CACHE_SIZE noms et purgé des noms qui ne figurent
+plus dans aucune source.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from contextlib import closing
+from functools import lru_cache
+from pathlib import Path
+
+# À incrémenter à chaque modification des règles ci-dessous
+PARSER_VERSION = 1
+DEFAULT_MAX_ENTRIES = 200000
+
+YEAR_PATTERN = re.compile(r'\b(19|20)\d{2}\b')
+AUTHOR_PATTERN = re.compile(r'^([A-Za-z][A-Za-z\-_\s]+?)(?:_|\s|-)(?:19|20)\d{2}')
+WORD_SPLIT_PATTERN = re.compile(r'[_\-\s]+')
+SEPARATORS_PATTERN = re.compile(r'[_\-]+')
+SPACES_PATTERN = re.compile(r'\s+')
+
+
+def _stem(filename):
+    return Path(filename).stem
+
+
+def extract_metadata(filename):
+    """Extraire auteur et année du nom de fichier"""
+    author = 'Inconnu'
+    year = None
+
+    try:
+        # Nettoyer le nom de fichier
+        name = _stem(filename)
+
+        # Patterns pour extraire l'année (4 chiffres)
+        year_match = YEAR_PATTERN.search(name)
+        if year_match:
+            year = int(year_match.group())
+
+        # Patterns pour extraire l'auteur (supposé être au début)
+        # Chercher des patterns comme "Smith_2020", "John-Smith_2020", etc.
+        author_match = AUTHOR_PATTERN.search(name)
+        if author_match:
+            author = author_match.group(1).replace('_', ' ').replace('-', ' ').strip()
+        else:
+            # Fallback: prendre les premiers mots avant un nombre ou underscore
+            words = WORD_SPLIT_PATTERN.split(name)
+            if words:
+                author = words[0]
+
+        # Patterns spéciaux pour "Mayrand" (superviseur)
+        if 'mayrand' in name.lower():
+            author = 'Mayrand, Maxence'
+
+    except Exception as e:
+        print(f"Erreur extraction métadonnées: {e}")
+
+    return author, year
+
+
+def clean_title(filename):
+    """Nettoyer le titre (enlever extension, caractères spéciaux)"""
+    try:
+        title = _stem(filename)
+        # Remplacer underscores et tirets par espaces
+        title = SEPARATORS_PATTERN.sub(' ', title)
+        # Enlever les patterns d'année
+        title = YEAR_PATTERN.sub('', title)
+        # Nettoyer les espaces multiples
+        title = SPACES_PATTERN.sub(' ', title).strip()
+        return title if title else filename
+    except Exception:
+        return filename
+
+
+@lru_cache(maxsize=65536)
+def parse_filename(filename):
+    """Retourner (auteur, année, titre) pour un nom de fichier (mémoïsé)"""
+    author, year = extract_metadata(filename)
+    return author, year, clean_title(filename)
+
+
+class FilenameParseCache:
+    """Cache disque des analyses de noms de fichiers, devant le cache LRU
+
+    Les analyses nouvelles sont ajoutées à la base par save(), sans réécrire
+    les autres; au-delà de `max_entries` noms, les plus anciens sont évincés.
+    """
+
+    def __init__(self, cache_dir=None, max_entries=None):
+        self.cache_dir = Path(cache_dir or os.getenv('CACHE_DIR', 'data/cache'))
+        self.db_file = self.cache_dir / 'filename_cache.db'
+        self.max_entries = int(max_entries if max_entries is not None
+                               else os.getenv('FILENAME_CACHE_SIZE', DEFAULT_MAX_ENTRIES))
+        self.entries = None  # Chargé à la première analyse
+        self.pending = {}    # Analyses pas encore enregistrées
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """Connexion à la base (une par opération: parse est appelé depuis plusieurs threads)"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(str(self.db_file), timeout=30, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS names (name TEXT PRIMARY KEY, author TEXT, year INTEGER, title TEXT)')
+        # Un cache produit par d'autres règles est vidé
+        if connection.execute('PRAGMA user_version').fetchone()[0] != PARSER_VERSION:
+            connection.execute('DELETE FROM names')
+            connection.execute(f'PRAGMA user_version = {PARSER_VERSION}')
+        return connection
+
+    def _load(self):
+        entries = {}
+        if self.db_file.exists():
+            try:
+                with closing(self._connect()) as connection:
+                    entries = {name: (author, year, title) for name, author, year, title
+                               in connection.execute('SELECT name, author, year, title FROM names')}
+            except Exception as e:
+                print(f"Erreur lecture du cache des noms de fichiers: {e}")
+        return entries
+
+    def parse(self, filename):
+        """(auteur, année, titre) depuis le cache disque, sinon par analyse"""
+        if self.entries is None:
+            with self._lock:
+                if self.entries is None:
+                    self.entries = self._load()
+
+        cached = self.entries.get(filename)
+        if cached is not None:
+            return cached
+
+        parsed = parse_filename(filename)
+        with self._lock:
+            self.entries[filename] = parsed
+            self.pending[filename] = parsed
+        return parsed
+
+    def save(self):
+        """Enregistrer les nouvelles analyses, puis évincer les plus anciennes au-delà de la limite"""
+        with self._lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return
+
+        try:
+            with closing(self._connect()) as connection:
+                connection.execute('BEGIN')
+                connection.executemany('INSERT OR REPLACE INTO names VALUES (?, ?, ?, ?)',
+                                       ((name,) + tuple(parsed) for name, parsed in pending.items()))
+                excess = connection.execute('SELECT COUNT(*) FROM names').fetchone()[0] - self.max_entries
+                if excess > 0:
+                    connection.execute(
+                        'DELETE FROM names WHERE rowid IN (SELECT rowid FROM names ORDER BY rowid LIMIT ?)', (excess,))
+                connection.execute('COMMIT')
+        except Exception as e:
+            print(f"Erreur sauvegarde du cache des noms de fichiers: {e}")
+
+    def prune(self, names):
+        """Oublier les noms absents de `names` (fichiers supprimés de toutes les sources)
+
+        Retourne le nombre de noms oubliés.
+        """
+        names = set(names)
+        self.save()
+        with self._lock:
+            if self.entries is not None:
+                self.entries = {name: parsed for name, parsed in self.entries.items() if name in names}
+        if not self.db_file.exists():
+            return 0
+
+        try:
+            with closing(self._connect()) as connection:
+                connection.execute('BEGIN')
+                connection.execute('CREATE TEMP TABLE live (name TEXT PRIMARY KEY)')
+                connection.executemany('INSERT OR IGNORE INTO live VALUES (?)', ((name,) for name in names))
+                removed = connection.execute('DELETE FROM names WHERE name NOT IN (SELECT name FROM live)').rowcount
+                connection.execute('COMMIT')
+            return removed
+        except Exception as e:
+            print(f"Erreur purge du cache des noms de fichiers: {e}")
+            return 0
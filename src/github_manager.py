@@ -1,15 +1,321 @@
 """
-Gestionnaire GitHub - Test simple
+Gestionnaire GitHub - Synchronisation incrémentale d'un dépôt de références
+
+Le dépôt est parcouru arbre par arbre via l'API Git (git/trees). Les arbres
+sont identifiés par leur SHA: un arbre déjà connu n'est jamais redemandé, donc
+un sous-dossier inchangé ne coûte aucune requête. La branche est interrogée
+avec If-None-Match (ETag): si rien n'a changé, la réponse 304 ne consomme pas
+de quota. À la première synchronisation, tout l'arbre est demandé en une seule
+requête (recursive=1); si GitHub la tronque (très gros dépôt), le parcours
+reprend arbre par arbre. Les requêtes passent par une session HTTP unique (connexions
+réutilisées). L'URL de l'API est configurable (GITHUB_API_URL), ce qui permet
+de tester contre un serveur local.
 """
 
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import quote
+
+from local_files_manager import SUPPORTED_EXTENSIONS
+from metrics import timed
+from source_cache import file_stamp, get_source_cache, manifest_lock, published_since
+
+MANIFEST_VERSION = 2
+DEFAULT_API_URL = 'https://api.github.com'
+DEFAULT_WEB_URL = 'https://github.com'
+
+
 class GitHubManager:
-    def __init__(self):
-        self.test_value = "OK"
-    
+    def __init__(self, repo=None, branch=None, token=None, api_url=None, cache_dir=None, timeout=30):
+        self.repo = repo or os.getenv('GITHUB_REPO', '')
+        self.branch = branch or os.getenv('GITHUB_BRANCH', 'main')
+        self.api_url = (api_url or os.getenv('GITHUB_API_URL', DEFAULT_API_URL)).rstrip('/')
+        self.web_url = os.getenv('GITHUB_WEB_URL', DEFAULT_WEB_URL).rstrip('/')
+        self.timeout = timeout
+        self.cache_dir = Path(cache_dir or os.getenv('CACHE_DIR', 'data/cache'))
+        self.manifest_file = self.cache_dir / 'github_manifest.json'
+        self._manifest_stamp = None
+        self._manifest = None  # Chargé au premier accès (inutile pour count/last_sync)
+        self.cache = get_source_cache(self.cache_dir)
+        self.origin = f"{self.repo}@{self.branch}"
+
+        self.token = token or os.getenv('GITHUB_TOKEN')
+        self._session = None
+
+        self.requests_made = 0
+        self.not_modified = 0
+
     def test(self):
         return "GitHub fonctionne"
 
+    # ------------------------------------------------------------------
+    # Manifeste
+    # ------------------------------------------------------------------
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            self._manifest = self._load_manifest()
+        return self._manifest
+
+    @manifest.setter
+    def manifest(self, value):
+        self._manifest = value
+
+    def _empty_manifest(self):
+        return {
+            'version': MANIFEST_VERSION,
+            'repo': self.repo,
+            'branch': self.branch,
+            'generation': 0,
+            'last_sync': None,
+            'root_tree': None,
+            'etags': {},    # url -> [etag, corps de la réponse]
+            'trees': {},    # sha d'arbre -> [[nom, type, sha, taille], ...]
+            'files': {},    # chemin -> [sha, taille]
+            'last_delta': None,
+        }
+
+    def _load_manifest(self):
+        """Charger le manifeste (celui d'un autre dépôt ou d'une autre branche est ignoré)"""
+        self._manifest_stamp = file_stamp(self.manifest_file)
+        if self.manifest_file.exists():
+            try:
+                with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                if (manifest.get('version') == MANIFEST_VERSION and manifest.get('repo') == self.repo
+                        and manifest.get('branch') == self.branch):
+                    return manifest
+            except Exception as e:
+                print(f"Erreur lecture du manifeste GitHub: {e}")
+        return self._empty_manifest()
+
+    def _save_manifest(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.manifest_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        os.replace(tmp_file, self.manifest_file)
+        self._manifest_stamp = file_stamp(self.manifest_file)
+
+    @contextmanager
+    def _locked(self):
+        """Mise à jour du manifeste sous verrou, depuis sa dernière version sur le disque"""
+        with manifest_lock(self.manifest_file):
+            if self._manifest is not None and file_stamp(self.manifest_file) != self._manifest_stamp:
+                self._manifest = None  # Remplacé par un autre processus depuis le chargement
+            yield
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    @property
+    def session(self):
+        """Session partagée (connexions réutilisées), créée à la première requête"""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+            session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+            session.headers['Accept'] = 'application/vnd.github+json'
+            if self.token:
+                session.headers['Authorization'] = f"Bearer {self.token}"
+            self._session = session
+        return self._session
+
+    def _get(self, path, conditional=False, **kwargs):
+        """GET sur l'API; avec `conditional`, réponse mise en cache et revalidée par ETag"""
+        url = f"{self.api_url}{path}"
+        headers = dict(kwargs.pop('headers', {}))
+        cached = self.manifest['etags'].get(url) if conditional else None
+        if cached:
+            headers['If-None-Match'] = cached[0]
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout, **kwargs)
+        self.requests_made += 1
+        if response.status_code == 304 and cached:
+            self.not_modified += 1
+            return cached[1]
+        response.raise_for_status()
+
+        if not conditional:
+            return response
+        body = response.json()
+        if response.headers.get('ETag'):
+            self.manifest['etags'][url] = [response.headers['ETag'], body]
+        return body
+
+    def _head_tree(self):
+        """SHA de l'arbre racine du dernier commit de la branche"""
+        if not self.repo:
+            raise ValueError("GITHUB_REPO n'est pas défini")
+        branch = self._get(f"/repos/{self.repo}/branches/{quote(self.branch, safe='')}", conditional=True)
+        return branch['commit']['commit']['tree']['sha']
+
+    def _tree(self, sha):
+        """Entrées d'un arbre (depuis le manifeste si ce SHA est déjà connu)"""
+        entries = self.manifest['trees'].get(sha)
+        if entries is None:
+            data = self._get(f"/repos/{self.repo}/git/trees/{sha}").json()
+            entries = [[item['path'], item['type'], item['sha'], item.get('size', 0)] for item in data['tree']]
+            self.manifest['trees'][sha] = entries
+        return entries
+
+    def _prefetch(self, root_sha):
+        """Remplir le cache d'arbres depuis une seule liste récursive (False si tronquée)"""
+        data = self._get(f"/repos/{self.repo}/git/trees/{root_sha}", params={'recursive': '1'}).json()
+        if data.get('truncated'):
+            return False
+
+        # Chaque entrée est rangée dans l'arbre de son dossier parent; un arbre
+        # présent à plusieurs chemins (même SHA) n'est rempli qu'une fois
+        tree_of = {'': root_sha}
+        owner = {root_sha: ''}
+        for item in data['tree']:
+            if item['type'] == 'tree':
+                tree_of[item['path']] = item['sha']
+                owner.setdefault(item['sha'], item['path'])
+
+        trees = {sha: [] for sha in owner}
+        for item in data['tree']:
+            parent, _, name = item['path'].rpartition('/')
+            sha = tree_of[parent]
+            if owner[sha] == parent:
+                trees[sha].append([name, item['type'], item['sha'], item.get('size', 0)])
+        self.manifest['trees'].update(trees)
+        return True
+
+    def _walk(self, tree_sha, prefix, files, reachable):
+        """Lister récursivement les fichiers de référence d'un arbre"""
+        reachable.add(tree_sha)
+        for name, kind, sha, size in self._tree(tree_sha):
+            path = f"{prefix}{name}"
+            if kind == 'tree':
+                self._walk(sha, f"{path}/", files, reachable)
+            elif kind == 'blob' and Path(name).suffix.lower() in SUPPORTED_EXTENSIONS:
+                files[path] = [sha, size]
+
+    # ------------------------------------------------------------------
+    # Synchronisation
+    # ------------------------------------------------------------------
+
+    @timed('sync.github')
+    def sync(self):
+        """Synchroniser la liste des fichiers du dépôt et retourner leur nombre
+
+        Si l'arbre racine n'a pas changé, aucun arbre n'est relu; sinon seuls
+        les arbres dont le SHA est nouveau sont demandés.
+        """
+        with self._locked():
+            return self._sync()
+
+    def _sync(self):
+        root_tree = self._head_tree()
+
+        if root_tree != self.manifest['root_tree']:
+            if not self.manifest['trees']:
+                self._prefetch(root_tree)
+            files = {}
+            reachable = set()
+            self._walk(root_tree, '', files, reachable)
+
+            old_files = self.manifest['files']
+            added = [p for p in files if p not in old_files]
+            changed = [p for p in files if p in old_files and old_files[p][0] != files[p][0]]
+            # Les documents sont identifiés par chemin: deux copies identiques
+            # (même SHA) sont deux documents, la suppression de l'une est un delta
+            removed = [p for p in old_files if p not in files]
+
+            # Les arbres qui ne sont plus atteignables sont oubliés
+            self.manifest['trees'] = {sha: entries for sha, entries in self.manifest['trees'].items()
+                                      if sha in reachable}
+            self.manifest['root_tree'] = root_tree
+            self.manifest['files'] = files
+            if added or changed or removed:
+                self.manifest['generation'] += 1
+                self.manifest['last_delta'] = {
+                    'from': self.manifest['generation'] - 1,
+                    'upserts': sorted(added + changed),
+                    'removed': sorted(removed),
+                }
+
+        self.manifest['last_sync'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self._save_manifest()
+        self._publish()
+        return len(self.manifest['files'])
+
+    # ------------------------------------------------------------------
+    # Cache
+    # ------------------------------------------------------------------
+
+    def _file_info(self, path):
+        sha, size = self.manifest['files'][path]
+        return {
+            'name': Path(path).name,
+            'path': path,
+            'sha': sha,
+            'size': size,
+            'html_url': f"{self.web_url}/{self.repo}/blob/{quote(self.branch)}/{quote(path)}",
+        }
+
+    def _publish(self, synced=True):
+        """Publier la liste des fichiers dans le cache partagé"""
+        self.cache.publish('github', self.origin, self.manifest['generation'], self.manifest['last_sync'],
+                           lambda: [self._file_info(path) for path in self.manifest['files']], synced=synced)
+
+    def get_cached_files(self):
+        """Fichiers connus depuis la dernière synchronisation (cache partagé, sinon manifeste)"""
+        files = self.cache.get_files('github', self.origin)
+        if files is None:
+            files = [self._file_info(path) for path in self.manifest['files']]
+            if self.manifest['last_sync']:
+                self._publish(synced=False)
+        return files
+
+    def get_changes(self, since_generation):
+        """Fichiers ajoutés/modifiés et chemins supprimés depuis une génération (None si inconnu)"""
+        if since_generation == self.manifest['generation']:
+            return [], []
+        delta = self.manifest.get('last_delta')
+        if not delta or delta['from'] != since_generation:
+            return None
+        upserts = [self._file_info(path) for path in delta['upserts'] if path in self.manifest['files']]
+        return upserts, list(delta['removed'])
+
+    def generation(self):
+        snapshot = self._snapshot()
+        return snapshot['generation'] if snapshot else self.manifest['generation']
+
+    def count(self):
+        snapshot = self._snapshot()
+        return snapshot['count'] if snapshot else len(self.manifest['files'])
+
+    def last_sync(self):
+        snapshot = self._snapshot()
+        last_sync = snapshot['last_sync'] if snapshot else self.manifest['last_sync']
+        return last_sync or 'Jamais'
+
+    def is_stale(self):
+        """Vrai si la dernière synchronisation dépasse la durée de validité du cache (CACHE_TTL_GITHUB)"""
+        return self.cache.is_expired('github', self.origin)
+
+    def _snapshot(self):
+        # Le manifeste en mémoire fait foi, sauf si un autre processus a publié depuis
+        snapshot = self.cache.snapshot('github', self.origin)
+        if self._manifest is not None:
+            if not published_since(snapshot, self._manifest['generation'], self._manifest['last_sync']):
+                return None
+            self._manifest = None
+        return snapshot
+
+
 # Test simple
 if __name__ == "__main__":
     manager = GitHubManager()
-    print(manager.test())
\ No newline at end of file
+    print(manager.test())
@@ -1,15 +1,488 @@
 """
-Gestionnaire Google Drive - Test simple
+Gestionnaire Google Drive - Synchronisation incrémentale par flux de changements
+
+La première synchronisation liste le dossier de références (et ses
+sous-dossiers, plusieurs dossiers en parallèle) après avoir noté un jeton de
+départ du flux de changements (changes.getStartPageToken). Les
+synchronisations suivantes ne lisent que les changements depuis ce jeton,
+persisté dans le manifeste: le flux ne demande que les champs nécessaires pour
+savoir si un fichier est dans l'arborescence, puis les métadonnées des fichiers
+concernés sont récupérées par lots (requêtes batch multipart).
+
+L'accès passe par OAuth: identifiants de l'application dans
+GOOGLE_CREDENTIALS_FILE (config/credentials.json), jeton d'accès conservé dans
+GOOGLE_TOKEN_FILE (config/token.json) et rafraîchi dès qu'il expire, y compris
+au milieu d'une longue synchronisation. Chaque thread de listing a sa propre
+session HTTP (requests.Session n'est pas garantie sûre entre threads).
+
+L'URL de l'API est configurable (GOOGLE_DRIVE_API_URL), ce qui permet de tester
+contre un faux serveur local (sans fichier d'identifiants, aucune authentification).
 """
 
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import quote
+
+from metrics import timed
+from source_cache import file_stamp, get_source_cache, manifest_lock, published_since
+
+MANIFEST_VERSION = 1
+DEFAULT_API_URL = 'https://www.googleapis.com'
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+NATIVE_MIME_PREFIX = 'application/vnd.google-apps.'  # Docs, Sheets...: pas de contenu binaire
+
+PAGE_SIZE = 1000
+BATCH_SIZE = 100          # Limite de l'API batch de Drive
+LIST_WORKERS = 8          # Dossiers listés en parallèle
+
+FILE_FIELDS = 'id,name,mimeType,parents,size,md5Checksum,modifiedTime,webViewLink,trashed'
+CHANGE_FIELDS = 'nextPageToken,newStartPageToken,changes(fileId,removed,file(id,mimeType,parents,trashed))'
+SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+
+
 class GoogleDriveManager:
-    def __init__(self):
-        self.test_value = "OK"
-    
+    def __init__(self, folder_id=None, token=None, api_url=None, cache_dir=None, timeout=30):
+        self.folder_id = folder_id or os.getenv('GOOGLE_DRIVE_FOLDER_ID', '')
+        self.api_url = (api_url or os.getenv('GOOGLE_DRIVE_API_URL', DEFAULT_API_URL)).rstrip('/')
+        self.timeout = timeout
+        self.cache_dir = Path(cache_dir or os.getenv('CACHE_DIR', 'data/cache'))
+        self.manifest_file = self.cache_dir / 'drive_manifest.json'
+        self._manifest_stamp = None
+        self._manifest = None  # Chargé au premier accès (inutile pour count/last_sync)
+        self.cache = get_source_cache(self.cache_dir)
+
+        # `token`: jeton d'accès fixe (tests); sinon OAuth depuis le fichier d'identifiants
+        self.token = token
+        self.credentials_file = Path(os.getenv('GOOGLE_CREDENTIALS_FILE', 'config/credentials.json'))
+        self.token_file = Path(os.getenv('GOOGLE_TOKEN_FILE', 'config/token.json'))
+        self._credentials = None
+        self._auth_lock = threading.Lock()
+        self._local = threading.local()
+
+        self.requests_made = 0
+        self._count_lock = threading.Lock()
+
     def test(self):
         return "Google Drive fonctionne"
 
+    # ------------------------------------------------------------------
+    # Manifeste
+    # ------------------------------------------------------------------
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            self._manifest = self._load_manifest()
+        return self._manifest
+
+    @manifest.setter
+    def manifest(self, value):
+        self._manifest = value
+
+    def _empty_manifest(self):
+        return {
+            'version': MANIFEST_VERSION,
+            'folder_id': self.folder_id,
+            'generation': 0,
+            'last_sync': None,
+            'page_token': None,   # curseur du flux de changements
+            'folders': {},        # id de dossier -> id du parent
+            'files': {},          # id -> métadonnées
+            'last_delta': None,
+        }
+
+    def _load_manifest(self):
+        """Charger le manifeste (celui d'un autre dossier est ignoré)"""
+        self._manifest_stamp = file_stamp(self.manifest_file)
+        if self.manifest_file.exists():
+            try:
+                with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                if manifest.get('version') == MANIFEST_VERSION and manifest.get('folder_id') == self.folder_id:
+                    return manifest
+            except Exception as e:
+                print(f"Erreur lecture du manifeste Drive: {e}")
+        return self._empty_manifest()
+
+    def _save_manifest(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.manifest_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        os.replace(tmp_file, self.manifest_file)
+        self._manifest_stamp = file_stamp(self.manifest_file)
+
+    @contextmanager
+    def _locked(self):
+        """Mise à jour du manifeste sous verrou, depuis sa dernière version sur le disque"""
+        with manifest_lock(self.manifest_file):
+            if self._manifest is not None and file_stamp(self.manifest_file) != self._manifest_stamp:
+                self._manifest = None  # Remplacé par un autre processus depuis le chargement
+            yield
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    @property
+    def session(self):
+        """Session du thread courant (connexions réutilisées), créée à sa première requête"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=2)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._local.session = session
+        return session
+
+    def _load_credentials(self):
+        """Identifiants OAuth: jeton enregistré, sinon autorisation dans le navigateur"""
+        from google.oauth2.credentials import Credentials
+
+        credentials = None
+        if self.token_file.exists():
+            credentials = Credentials.from_authorized_user_file(str(self.token_file), SCOPES)
+        if not credentials or not (credentials.valid or credentials.refresh_token):
+            from google_auth_oauthlib.flow import InstalledAppFlow
+
+            flow = InstalledAppFlow.from_client_secrets_file(str(self.credentials_file), SCOPES)
+            credentials = flow.run_local_server(port=0)
+            self._save_token(credentials)
+        return credentials
+
+    def _save_token(self, credentials):
+        self.token_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.token_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(credentials.to_json())
+        os.replace(tmp_file, self.token_file)
+
+    def _auth_headers(self):
+        """En-tête Authorization, jeton rafraîchi s'il a expiré (un seul thread rafraîchit)"""
+        if self.token:
+            return {'Authorization': f"Bearer {self.token}"}
+        if not self.credentials_file.exists() and not self.token_file.exists():
+            return {}
+
+        with self._auth_lock:
+            if self._credentials is None:
+                self._credentials = self._load_credentials()
+            if not self._credentials.valid:
+                from google.auth.transport.requests import Request
+
+                self._credentials.refresh(Request())
+                self._save_token(self._credentials)
+            return {'Authorization': f"Bearer {self._credentials.token}"}
+
+    def _count_request(self):
+        with self._count_lock:
+            self.requests_made += 1
+
+    def _get(self, path, params):
+        response = self.session.get(f"{self.api_url}/drive/v3{path}", params=params,
+                                    headers=self._auth_headers(), timeout=self.timeout)
+        self._count_request()
+        response.raise_for_status()
+        return response.json()
+
+    def _list_folder(self, folder_id):
+        """Tous les éléments d'un dossier (pages successives)"""
+        items = []
+        params = {
+            'q': f"'{folder_id}' in parents and trashed = false",
+            'fields': f"nextPageToken,files({FILE_FIELDS})",
+            'pageSize': PAGE_SIZE,
+            'supportsAllDrives': 'true',
+            'includeItemsFromAllDrives': 'true',
+        }
+        while True:
+            data = self._get('/files', params)
+            items.extend(data.get('files', []))
+            if not data.get('nextPageToken'):
+                return items
+            params['pageToken'] = data['nextPageToken']
+
+    def _list_tree(self, folder_ids):
+        """Lister des dossiers et leurs sous-dossiers, niveau par niveau en parallèle
+
+        Retourne (dossiers {id: parent}, fichiers {id: métadonnées}).
+        """
+        folders, files = {}, {}
+        level = list(folder_ids)
+        with ThreadPoolExecutor(max_workers=LIST_WORKERS) as pool:
+            while level:
+                next_level = []
+                for folder_id, items in zip(level, pool.map(self._list_folder, level)):
+                    for item in items:
+                        if item.get('mimeType') == FOLDER_MIME_TYPE:
+                            folders[item['id']] = folder_id
+                            next_level.append(item['id'])
+                        elif not item.get('mimeType', '').startswith(NATIVE_MIME_PREFIX):
+                            files[item['id']] = self._file_entry(item)
+                level = next_level
+        return folders, files
+
+    def _batch_get(self, file_ids):
+        """Métadonnées de plusieurs fichiers, par lots de BATCH_SIZE requêtes multipart"""
+        found = {}
+        for start in range(0, len(file_ids), BATCH_SIZE):
+            chunk = file_ids[start:start + BATCH_SIZE]
+            boundary = f"batch_{uuid.uuid4().hex}"
+            parts = []
+            for file_id in chunk:
+                parts.append(
+                    f"--{boundary}\r\n"
+                    f"Content-Type: application/http\r\n"
+                    f"Content-ID: <{file_id}>\r\n\r\n"
+                    f"GET /drive/v3/files/{quote(file_id)}?fields={FILE_FIELDS}&supportsAllDrives=true HTTP/1.1\r\n\r\n"
+                )
+            body = ''.join(parts) + f"--{boundary}--\r\n"
+
+            headers = {'Content-Type': f"multipart/mixed; boundary={boundary}", **self._auth_headers()}
+            response = self.session.post(f"{self.api_url}/batch/drive/v3", data=body.encode('utf-8'),
+                                         headers=headers, timeout=self.timeout)
+            self._count_request()
+            response.raise_for_status()
+            found.update(parse_batch_response(response))
+        return found
+
+    # ------------------------------------------------------------------
+    # Synchronisation
+    # ------------------------------------------------------------------
+
+    @timed('sync.drive')
+    def sync(self):
+        """Synchroniser et retourner le nombre de fichiers
+
+        Sans curseur, liste complète du dossier; sinon seuls les changements
+        depuis le curseur sont lus.
+        """
+        if not self.folder_id:
+            raise ValueError("GOOGLE_DRIVE_FOLDER_ID n'est pas défini")
+
+        with self._locked():
+            return self._sync()
+
+    def _sync(self):
+        if self.manifest['page_token']:
+            upserts, removed = self._apply_changes()
+        else:
+            upserts, removed = self._full_listing()
+
+        if upserts or removed:
+            self.manifest['generation'] += 1
+            self.manifest['last_delta'] = {
+                'from': self.manifest['generation'] - 1,
+                'upserts': sorted(upserts),
+                'removed': sorted(removed),
+            }
+        self.manifest['last_sync'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self._save_manifest()
+        self._publish()
+        return len(self.manifest['files'])
+
+    def _full_listing(self):
+        # Le jeton est pris avant le listing: rien ne peut échapper aux deux
+        start_token = self._get('/changes/startPageToken', {'supportsAllDrives': 'true'})['startPageToken']
+        folders, files = self._list_tree([self.folder_id])
+
+        old_files = self.manifest['files']
+        upserts = [file_id for file_id, entry in files.items() if old_files.get(file_id) != entry]
+        removed = [file_id for file_id in old_files if file_id not in files]
+
+        self.manifest['folders'] = folders
+        self.manifest['files'] = files
+        self.manifest['page_token'] = start_token
+        return upserts, removed
+
+    def _apply_changes(self):
+        """Lire le flux de changements depuis le curseur et mettre à jour l'arborescence"""
+        changes = []
+        params = {
+            'pageToken': self.manifest['page_token'],
+            'fields': CHANGE_FIELDS,
+            'pageSize': PAGE_SIZE,
+            'includeRemoved': 'true',
+            'supportsAllDrives': 'true',
+            'includeItemsFromAllDrives': 'true',
+        }
+        while True:
+            data = self._get('/changes', params)
+            changes.extend(data.get('changes', []))
+            if data.get('newStartPageToken'):
+                new_token = data['newStartPageToken']
+                break
+            params['pageToken'] = data['nextPageToken']
+
+        folders = self.manifest['folders']
+        files = self.manifest['files']
+        upserts, removed = set(), set()
+
+        def in_tree(parents):
+            return any(p == self.folder_id or p in folders for p in parents or [])
+
+        # Dossiers d'abord: un fichier peut dépendre d'un dossier créé dans le même lot
+        new_folders = []
+        for change in changes:
+            item = change.get('file') or {}
+            folder_id = change['fileId']
+            if item.get('mimeType') != FOLDER_MIME_TYPE and folder_id not in folders:
+                continue
+            if change.get('removed') or item.get('trashed') or not in_tree(item.get('parents')):
+                folders.pop(folder_id, None)
+            else:
+                if folder_id not in folders:
+                    new_folders.append(folder_id)
+                folders[folder_id] = item['parents'][0]
+
+        # Un dossier déplacé dans l'arborescence n'émet pas de changement pour son contenu
+        if new_folders:
+            added_folders, added_files = self._list_tree(new_folders)
+            folders.update(added_folders)
+            for file_id, entry in added_files.items():
+                if files.get(file_id) != entry:
+                    files[file_id] = entry
+                    upserts.add(file_id)
+
+        # Les dossiers sortis de l'arborescence emportent leurs descendants
+        reachable = {self.folder_id}
+        pending = True
+        while pending:
+            pending = False
+            for folder_id, parent_id in folders.items():
+                if folder_id not in reachable and parent_id in reachable:
+                    reachable.add(folder_id)
+                    pending = True
+        for folder_id in [f for f in folders if f not in reachable]:
+            del folders[folder_id]
+
+        to_fetch = []
+        for change in changes:
+            item = change.get('file') or {}
+            file_id = change['fileId']
+            if item.get('mimeType') == FOLDER_MIME_TYPE or file_id in folders:
+                continue
+            if change.get('removed') or item.get('trashed') or not in_tree(item.get('parents')):
+                if files.pop(file_id, None) is not None:
+                    removed.add(file_id)
+            else:
+                to_fetch.append(file_id)
+
+        for file_id, entry in list(files.items()):
+            if not in_tree(entry.get('parents')):
+                del files[file_id]
+                removed.add(file_id)
+
+        for file_id, item in self._batch_get(sorted(set(to_fetch))).items():
+            if item.get('mimeType', '').startswith(NATIVE_MIME_PREFIX):
+                continue
+            entry = self._file_entry(item)
+            if files.get(file_id) != entry:
+                files[file_id] = entry
+                upserts.add(file_id)
+
+        self.manifest['page_token'] = new_token
+        return upserts - removed, removed
+
+    @staticmethod
+    def _file_entry(item):
+        return {
+            'id': item['id'],
+            'name': item.get('name', ''),
+            'size': int(item.get('size') or 0),
+            'md5Checksum': item.get('md5Checksum', ''),
+            'modified': item.get('modifiedTime', ''),
+            'link': item.get('webViewLink', ''),
+            'parents': item.get('parents', []),
+        }
+
+    # ------------------------------------------------------------------
+    # Cache
+    # ------------------------------------------------------------------
+
+    def _publish(self, synced=True):
+        """Publier la liste des fichiers dans le cache partagé"""
+        self.cache.publish('drive', self.folder_id, self.manifest['generation'], self.manifest['last_sync'],
+                           lambda: list(self.manifest['files'].values()), synced=synced)
+
+    def get_cached_files(self):
+        """Fichiers connus depuis la dernière synchronisation (cache partagé, sinon manifeste)"""
+        files = self.cache.get_files('drive', self.folder_id)
+        if files is None:
+            files = list(self.manifest['files'].values())
+            if self.manifest['last_sync']:
+                self._publish(synced=False)
+        return files
+
+    def get_changes(self, since_generation):
+        """Fichiers ajoutés/modifiés et identifiants supprimés depuis une génération (None si inconnu)"""
+        if since_generation == self.manifest['generation']:
+            return [], []
+        delta = self.manifest.get('last_delta')
+        if not delta or delta['from'] != since_generation:
+            return None
+        files = self.manifest['files']
+        return [files[file_id] for file_id in delta['upserts'] if file_id in files], list(delta['removed'])
+
+    def generation(self):
+        snapshot = self._snapshot()
+        return snapshot['generation'] if snapshot else self.manifest['generation']
+
+    def count(self):
+        snapshot = self._snapshot()
+        return snapshot['count'] if snapshot else len(self.manifest['files'])
+
+    def last_sync(self):
+        snapshot = self._snapshot()
+        last_sync = snapshot['last_sync'] if snapshot else self.manifest['last_sync']
+        return last_sync or 'Jamais'
+
+    def is_stale(self):
+        """Vrai si la dernière synchronisation dépasse la durée de validité du cache (CACHE_TTL_DRIVE)"""
+        return self.cache.is_expired('drive', self.folder_id)
+
+    def _snapshot(self):
+        # Le manifeste en mémoire fait foi, sauf si un autre processus a publié depuis
+        snapshot = self.cache.snapshot('drive', self.folder_id)
+        if self._manifest is not None:
+            if not published_since(snapshot, self._manifest['generation'], self._manifest['last_sync']):
+                return None
+            self._manifest = None
+        return snapshot
+
+
+def parse_batch_response(response):
+    """Réponses JSON d'une requête batch multipart, par identifiant de fichier"""
+    content_type = response.headers.get('Content-Type', '')
+    boundary = content_type.split('boundary=')[-1].strip('"')
+    found = {}
+    for part in response.content.split(f"--{boundary}".encode('ascii')):
+        # En-têtes de la partie, puis réponse HTTP (ligne de statut, en-têtes, corps)
+        sections = part.split(b'\r\n\r\n', 2)
+        if len(sections) < 3:
+            continue
+        status_line = sections[1].split(b'\r\n', 1)[0].decode('latin-1')
+        if ' 200 ' not in f"{status_line} ":
+            continue  # Fichier supprimé entre-temps ou inaccessible
+        try:
+            item = json.loads(sections[2].decode('utf-8'))
+        except ValueError:
+            continue
+        found[item['id']] = item
+    return found
+
+
 # Test simple
 if __name__ == "__main__":
     manager = GoogleDriveManager()
-    print(manager.test())
\ No newline at end of file
+    print(manager.test())
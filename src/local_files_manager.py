@@ -1,16 +1,621 @@
 """
-Gestionnaire fichiers locaux - Test simple
+Gestionnaire fichiers locaux - Scan incrémental du dossier de références
+
+Le scan s'appuie sur un manifeste persistant (chemin, taille, mtime, inode).
+Un dossier dont le mtime n'a pas changé a la même liste d'entrées qu'au scan
+précédent: ses fichiers ne sont pas re-stat, seuls ses sous-dossiers sont
+revisités. Seuls les fichiers ajoutés, modifiés ou supprimés sont émis.
 """
 
+import csv
+import glob
+import json
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from content_hashes import ContentHashCache, copy_with_hashes, full_hashes
+from metrics import timed
+from source_cache import file_stamp, get_source_cache, manifest_lock, published_since
+
+MANIFEST_VERSION = 1
+
+SUPPORTED_EXTENSIONS = {'.pdf', '.djvu', '.ps', '.epub', '.tex'}
+
+# Fichiers listant les références à importer (un chemin par ligne, CSV ou JSON Lines)
+IMPORT_LIST_EXTENSIONS = {'.txt', '.lst', '.csv', '.jsonl'}
+IMPORT_BATCH = 500
+IMPORT_WORKERS = 8
+
+
 class LocalFilesManager:
-    def __init__(self):
-        self.test_value = "OK"
-    
+    def __init__(self, refs_path=None, cache_dir=None, hash_cache=None):
+        self.refs_path = Path(refs_path or os.getenv('LOCAL_REFS_PATH', '~/Desktop/References')).expanduser()
+        self.cache_dir = Path(cache_dir or os.getenv('CACHE_DIR', 'data/cache'))
+        self.manifest_file = self.cache_dir / 'local_manifest.json'
+        self._manifest_stamp = None
+        self._manifest = None  # Chargé au premier accès (inutile pour count/last_scan)
+        self.cache = get_source_cache(self.cache_dir)
+        # Empreintes des fichiers (lues seulement pour oublier les fichiers supprimés)
+        self.hash_cache = hash_cache or ContentHashCache(self.cache_dir)
+
     def test(self):
         return "Local files fonctionne"
 
+    # ------------------------------------------------------------------
+    # Manifeste
+    # ------------------------------------------------------------------
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            self._manifest = self._load_manifest()
+        return self._manifest
+
+    @manifest.setter
+    def manifest(self, value):
+        self._manifest = value
+
+    def _empty_manifest(self):
+        return {
+            'version': MANIFEST_VERSION,
+            'root': str(self.refs_path),
+            'generation': 0,
+            'last_scan': None,
+            'files': {},   # chemin relatif -> [taille, mtime_ns, inode]
+            'dirs': {},    # chemin relatif -> {'mtime': ns, 'files': [...], 'subdirs': [...]}
+            'last_delta': None,
+        }
+
+    def _load_manifest(self):
+        """Charger le manifeste (un manifeste d'un autre dossier est ignoré)"""
+        self._manifest_stamp = file_stamp(self.manifest_file)
+        if self.manifest_file.exists():
+            try:
+                with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                if manifest.get('version') == MANIFEST_VERSION and manifest.get('root') == str(self.refs_path):
+                    return manifest
+            except Exception as e:
+                print(f"Erreur lecture du manifeste local: {e}")
+        return self._empty_manifest()
+
+    def _save_manifest(self):
+        """Sauvegarder le manifeste de manière atomique"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.manifest_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        os.replace(tmp_file, self.manifest_file)
+        self._manifest_stamp = file_stamp(self.manifest_file)
+
+    @contextmanager
+    def _locked(self):
+        """Mise à jour du manifeste sous verrou, depuis sa dernière version sur le disque"""
+        with manifest_lock(self.manifest_file):
+            if self._manifest is not None and file_stamp(self.manifest_file) != self._manifest_stamp:
+                self._manifest = None  # Remplacé par un autre processus depuis le chargement
+            yield
+
+    # ------------------------------------------------------------------
+    # Scan
+    # ------------------------------------------------------------------
+
+    @timed('scan.local')
+    def scan(self, full=False):
+        """Scanner le dossier de références et retourner le nombre de fichiers
+
+        En mode incrémental, les dossiers inchangés (même mtime) ne sont pas
+        relistés. Une modification en place d'un fichier ne change pas le mtime
+        de son dossier: `full=True` re-stat tous les fichiers.
+        """
+        if not self.refs_path.is_dir():
+            raise FileNotFoundError(f"Dossier introuvable: {self.refs_path}")
+
+        with self._locked():
+            return self._scan(full)
+
+    def _scan(self, full):
+        old_files = self.manifest['files']
+        old_dirs = self.manifest['dirs']
+        new_files = {}
+        new_dirs = {}
+
+        self._walk('', old_files, old_dirs, new_files, new_dirs, full)
+
+        added = [path for path in new_files if path not in old_files]
+        changed = [path for path in new_files if path in old_files and new_files[path] != old_files[path]]
+        removed = [path for path in old_files if path not in new_files]
+
+        self._commit(new_files, new_dirs, added, changed, removed)
+        return len(new_files)
+
+    def _walk(self, rel_dir, old_files, old_dirs, new_files, new_dirs, full):
+        """Parcourir un dossier avec os.scandir en réutilisant le manifeste si possible"""
+        abs_dir = self.refs_path / rel_dir if rel_dir else self.refs_path
+        try:
+            dir_mtime = os.stat(abs_dir).st_mtime_ns
+        except OSError:
+            return  # Dossier supprimé pendant le scan
+
+        previous = old_dirs.get(rel_dir)
+        if not full and previous and previous['mtime'] == dir_mtime:
+            # Liste d'entrées inchangée: reprendre les fichiers connus tels quels
+            for name in previous['files']:
+                path = self._join(rel_dir, name)
+                if path in old_files:
+                    new_files[path] = old_files[path]
+            new_dirs[rel_dir] = previous
+            for name in previous['subdirs']:
+                self._walk(self._join(rel_dir, name), old_files, old_dirs, new_files, new_dirs, full)
+            return
+
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(abs_dir) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                        elif entry.is_file() and Path(entry.name).suffix.lower() in SUPPORTED_EXTENSIONS:
+                            stat = entry.stat()
+                            files.append(entry.name)
+                            new_files[self._join(rel_dir, entry.name)] = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+                    except OSError as e:
+                        print(f"Erreur lecture de {entry.path}: {e}")
+        except OSError as e:
+            print(f"Erreur scan de {abs_dir}: {e}")
+            return
+
+        new_dirs[rel_dir] = {'mtime': dir_mtime, 'files': sorted(files), 'subdirs': sorted(subdirs)}
+        for name in subdirs:
+            self._walk(self._join(rel_dir, name), old_files, old_dirs, new_files, new_dirs, full)
+
+    @timed('scan.local.paths')
+    def apply_paths(self, paths):
+        """Appliquer au manifeste une liste de chemins modifiés (fichiers ou dossiers)
+
+        Utilisé par le mode surveillance: seuls les chemins signalés sont
+        re-stat, sans parcourir le reste de l'arborescence. Retourne le
+        tuple (ajoutés, modifiés, supprimés).
+        """
+        with self._locked():
+            return self._apply_paths(paths)
+
+    def _apply_paths(self, paths):
+        files = dict(self.manifest['files'])
+        dirs = dict(self.manifest['dirs'])
+        added, changed, removed = [], [], []
+        root_changed = False
+
+        for path in paths:
+            rel = self._relative(path)
+            if rel is None:
+                continue
+            if rel == '':
+                root_changed = True  # Reparcours après les autres chemins du lot
+                continue
+
+            abs_path = self.refs_path / rel
+            prefix = rel + '/'
+            under = [p for p in files if p == rel or p.startswith(prefix)]
+
+            if abs_path.is_dir():
+                sub_files, sub_dirs = {}, {}
+                self._walk(rel, files, dirs, sub_files, sub_dirs, full=True)
+                for p in under:
+                    if p not in sub_files:
+                        removed.append(p)
+                        del files[p]
+                for p, signature in sub_files.items():
+                    if p not in files:
+                        added.append(p)
+                    elif files[p] != signature:
+                        changed.append(p)
+                    files[p] = signature
+                for d in [d for d in dirs if d == rel or d.startswith(prefix)]:
+                    del dirs[d]
+                dirs.update(sub_dirs)
+            elif abs_path.is_file() and abs_path.suffix.lower() in SUPPORTED_EXTENSIONS:
+                stat = abs_path.stat()
+                signature = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+                if rel not in files:
+                    added.append(rel)
+                elif files[rel] != signature:
+                    changed.append(rel)
+                files[rel] = signature
+            else:
+                # Chemin disparu (fichier ou dossier entier)
+                for p in under:
+                    removed.append(p)
+                    del files[p]
+                for d in [d for d in dirs if d == rel or d.startswith(prefix)]:
+                    del dirs[d]
+
+        if root_changed:
+            # La racine elle-même a changé: parcours incrémental depuis l'état mis à
+            # jour ci-dessus. Les dossiers de même mtime ne sont pas relistés, mais les
+            # fichiers modifiés en place signalés dans le lot y sont déjà à jour.
+            new_files, new_dirs = {}, {}
+            self._walk('', files, dirs, new_files, new_dirs, full=False)
+            old_files = self.manifest['files']
+            added = [p for p in new_files if p not in old_files]
+            changed = [p for p in new_files if p in old_files and new_files[p] != old_files[p]]
+            removed = [p for p in old_files if p not in new_files]
+            files, dirs = new_files, new_dirs
+
+        if added or changed or removed or root_changed:
+            # Les dossiers parents ont changé de mtime: ils seront relistés au prochain scan
+            generation = self.generation()
+            self._commit(files, dirs, added, changed, removed, scanned=root_changed)
+            if self.generation() == generation:
+                return 0, 0, 0
+        return len(added), len(changed), len(removed)
+
+    def _relative(self, path):
+        """Chemin relatif à la racine des références (None si hors du dossier)"""
+        try:
+            rel = Path(os.path.abspath(path)).relative_to(os.path.abspath(self.refs_path))
+        except ValueError:
+            return None
+        if any(part.startswith('.') for part in rel.parts):
+            return None
+        return rel.as_posix() if rel.parts else ''
+
+    def delta_counts(self):
+        """(ajoutés, modifiés, supprimés) du dernier changement enregistré"""
+        delta = self.manifest.get('last_delta') or {}
+        return tuple(len(delta.get(kind, ())) for kind in ('added', 'changed', 'removed'))
+
+    def reload(self):
+        """Relire le manifeste (modifié par un autre processus, ex: add)"""
+        self.manifest = self._load_manifest()
+
+    @staticmethod
+    def _join(rel_dir, name):
+        return f"{rel_dir}/{name}" if rel_dir else name
+
+    def _commit(self, new_files, new_dirs, added, changed, removed, scanned=True):
+        """Enregistrer un nouvel état et le delta par rapport au précédent"""
+        previous_generation = self.manifest['generation']
+        if added or changed or removed or (scanned and not self.manifest['last_scan']):
+            self.manifest['generation'] = previous_generation + 1
+            self.manifest['last_delta'] = {
+                'from': previous_generation,
+                'added': added,
+                'changed': changed,
+                'removed': removed,
+            }
+
+        self.manifest['files'] = new_files
+        self.manifest['dirs'] = new_dirs
+        if removed:
+            # Un fichier supprimé ne compte plus comme déjà importé
+            self.hash_cache.forget([str(self.refs_path / path) for path in removed])
+            self.hash_cache.save()
+        if scanned:
+            self.manifest['last_scan'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self._save_manifest()
+        self._publish(synced=scanned)
+
+    def _publish(self, synced=True):
+        """Publier la liste des fichiers dans le cache partagé"""
+        self.cache.publish('local', str(self.refs_path), self.manifest['generation'], self.manifest['last_scan'],
+                           lambda: [self._file_info(path) for path in self.manifest['files']], synced=synced)
+
+    # ------------------------------------------------------------------
+    # Cache
+    # ------------------------------------------------------------------
+
+    def _file_info(self, path):
+        size, mtime_ns, _ = self.manifest['files'][path]
+        name = path.rsplit('/', 1)[-1]
+        return {
+            'id': path,
+            'name': name,
+            'path': str(self.refs_path / path),
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'modified': datetime.fromtimestamp(mtime_ns / 1e9).strftime('%Y-%m-%d %H:%M:%S'),
+            'extension': Path(name).suffix.lower(),
+        }
+
+    def get_cached_files(self):
+        """Liste des fichiers connus depuis le dernier scan (cache partagé, sinon manifeste)"""
+        files = self.cache.get_files('local', str(self.refs_path))
+        if files is None:
+            files = [self._file_info(path) for path in self.manifest['files']]
+            if self.manifest['last_scan']:
+                self._publish(synced=False)
+        return files
+
+    def get_changes(self, since_generation):
+        """Fichiers ajoutés/modifiés et identifiants supprimés depuis une génération
+
+        Retourne None si le delta disponible ne part pas de cette génération.
+        """
+        delta = self.manifest.get('last_delta')
+        if since_generation == self.manifest['generation']:
+            return [], []
+        if not delta or delta['from'] != since_generation:
+            return None
+
+        upserts = [self._file_info(path) for path in delta['added'] + delta['changed']
+                   if path in self.manifest['files']]
+        return upserts, list(delta['removed'])
+
+    def generation(self):
+        """Compteur incrémenté à chaque scan qui modifie le contenu"""
+        snapshot = self._snapshot()
+        return snapshot['generation'] if snapshot else self.manifest['generation']
+
+    def count(self):
+        snapshot = self._snapshot()
+        return snapshot['count'] if snapshot else len(self.manifest['files'])
+
+    def last_scan(self):
+        snapshot = self._snapshot()
+        last_scan = snapshot['last_sync'] if snapshot else self.manifest['last_scan']
+        return last_scan or 'Jamais'
+
+    def is_stale(self):
+        """Vrai si le dernier scan dépasse la durée de validité du cache (CACHE_TTL_LOCAL)"""
+        return self.cache.is_expired('local', str(self.refs_path))
+
+    def _snapshot(self):
+        """État publié (None si le manifeste en mémoire est à jour, il fait alors foi)
+
+        Pendant une surveillance, le manifeste en mémoire est le plus récent;
+        s'il a été dépassé par un autre processus (add, import, scan), il est
+        oublié et sera relu depuis le disque au prochain accès.
+        """
+        snapshot = self.cache.snapshot('local', str(self.refs_path))
+        if self._manifest is not None:
+            if not published_since(snapshot, self._manifest['generation'], self._manifest['last_scan']):
+                return None
+            self._manifest = None
+        return snapshot
+
+    # ------------------------------------------------------------------
+    # Ajout
+    # ------------------------------------------------------------------
+
+    def add_reference(self, file_path, title=None, author=None, year=None):
+        """Copier un fichier dans le dossier de références (nommé Auteur_Année_Titre.ext)"""
+        source = Path(file_path)
+        if not source.is_file():
+            print(f"Fichier introuvable: {file_path}")
+            return False
+        if source.suffix.lower() not in SUPPORTED_EXTENSIONS:
+            print(f"Extension non supportée: {source.suffix}")
+            return False
+
+        try:
+            target = self.refs_path / self._reference_filename(source, title, author, year)
+            if target.exists():
+                print(f"Une référence existe déjà: {target}")
+                return False
+
+            self.refs_path.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(source, target)
+
+            stat = target.stat()
+            path = target.name
+            with self._locked():
+                new_files = dict(self.manifest['files'])
+                new_files[path] = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+                # Le dossier racine a changé: il sera relisté au prochain scan
+                self._commit(new_files, self.manifest['dirs'], [path], [], [], scanned=False)
+            return True
+        except Exception as e:
+            print(f"Erreur lors de l'ajout: {e}")
+            return False
+
+    def import_references(self, items, link=False, workers=IMPORT_WORKERS, batch_size=IMPORT_BATCH,
+                          hash_cache=None, progress=None):
+        """Importer des fichiers en lot; générateur de (infos des fichiers importés, rapport)
+
+        `items` est une liste de dicts (path, et éventuellement title, author,
+        year). Un pool de threads copie (ou lie, avec `link`) les fichiers en
+        calculant leurs empreintes au passage. Dès que `batch_size` fichiers
+        sont importés, le lot est enregistré en une fois (une écriture du
+        manifeste, une transaction du cache partagé) puis produit: l'appelant
+        peut l'extraire et l'indexer pendant que les copies continuent.
+        Les fichiers déjà présents et les contenus en double (même MD5) sont
+        ignorés; un nom déjà pris par un autre contenu reçoit un suffixe (_2, _3...).
+        """
+        stats = {'total': len(items), 'imported': 0, 'existing': 0, 'duplicates': 0, 'errors': [], 'bytes': 0}
+        self.refs_path.mkdir(parents=True, exist_ok=True)
+        # Contenus encore présents dans la bibliothèque (fichiers du manifeste inchangés depuis leur empreinte)
+        present = {str(self.refs_path / path): (size, mtime_ns)
+                   for path, (size, mtime_ns, _) in self.manifest['files'].items()}
+        state = {
+            'lock': threading.Lock(),
+            'reserved': set(),   # Noms pris par cet import
+            'md5': hash_cache.known_md5(present) if hash_cache else set(),
+        }
+
+        pool = ThreadPoolExecutor(max_workers=workers)
+        futures = []
+        try:
+            futures = [pool.submit(self._import_one, item, link, state, hash_cache) for item in items]
+            batch = []
+            for future in as_completed(futures):
+                outcome, item, value = future.result()
+                if outcome == 'imported':
+                    batch.append(value)
+                    stats['imported'] += 1
+                    stats['bytes'] += value[1][0]
+                elif outcome == 'error':
+                    stats['errors'].append((item['path'], value))
+                else:
+                    stats[outcome] += 1
+                if progress:
+                    progress(stats)
+                if len(batch) >= batch_size:
+                    yield self._commit_import(batch), stats
+                    batch = []
+            if batch:
+                yield self._commit_import(batch), stats
+        finally:
+            # shutdown(cancel_futures=True) demande Python 3.9
+            for future in futures:
+                future.cancel()
+            pool.shutdown()
+
+    def _import_one(self, item, link, state, hash_cache):
+        """Copier ou lier un fichier (exécuté dans un thread): (résultat, item, valeur)"""
+        source = Path(item['path'])
+        try:
+            if source.suffix.lower() not in SUPPORTED_EXTENSIONS:
+                raise ValueError(f"Extension non supportée: {source.suffix}")
+            name = self._claim_name(source, item, state, hash_cache)
+            if name is None:
+                return 'existing', item, None
+
+            target = self.refs_path / name
+            try:
+                linked = False
+                if link:
+                    try:
+                        os.link(source, target)
+                        linked = True
+                    except FileExistsError:
+                        raise
+                    except OSError:
+                        pass  # Autre système de fichiers: copie
+                if linked:
+                    md5, git_sha = full_hashes(target)
+                else:
+                    md5, git_sha = copy_with_hashes(source, target)
+            except FileExistsError:
+                raise  # Créé entre-temps par un autre processus: ce fichier n'est pas le nôtre
+            except BaseException:
+                if target.exists():
+                    target.unlink()
+                raise
+
+            with state['lock']:
+                duplicate = md5 in state['md5']
+                state['md5'].add(md5)
+            if duplicate:
+                target.unlink()
+                return 'duplicates', item, None
+
+            stat = target.stat()
+            if hash_cache is not None:
+                hash_cache.store(str(target), stat.st_size, stat.st_mtime_ns, md5, git_sha)
+            return 'imported', item, (name, [stat.st_size, stat.st_mtime_ns, stat.st_ino])
+        except Exception as e:
+            return 'error', item, str(e)
+
+    def _claim_name(self, source, item, state, hash_cache):
+        """Réserver un nom libre pour un fichier importé (paper.pdf, puis paper_2.pdf...)
+
+        Retourne None si un fichier de la bibliothèque porte déjà l'un de ces
+        noms avec le même contenu (même MD5): le fichier est déjà présent.
+        """
+        name = self._reference_filename(source, item.get('title'), item.get('author'), item.get('year'))
+        stem, suffix = Path(name).stem, Path(name).suffix
+        source_md5 = None
+        number = 1
+        while True:
+            path = self.refs_path / name
+            with state['lock']:
+                claimed = name in state['reserved']
+                if not claimed and not path.exists():
+                    state['reserved'].add(name)
+                    return name
+            # Les noms réservés par cet import sont en cours d'écriture: comparés par MD5 après la copie
+            if not claimed and path.is_file():
+                if source_md5 is None:
+                    source_md5 = full_hashes(source)[0]
+                existing_md5 = hash_cache.full(str(path))[0] if hash_cache is not None else full_hashes(path)[0]
+                if existing_md5 == source_md5:
+                    return None
+            number += 1
+            name = f"{stem}_{number}{suffix}"
+
+    def _commit_import(self, batch):
+        """Enregistrer un lot de fichiers importés et retourner leurs infos"""
+        paths = [path for path, _ in batch]
+        with self._locked():
+            new_files = dict(self.manifest['files'])
+            new_files.update(batch)
+            # Le dossier racine a changé: il sera relisté au prochain scan
+            self._commit(new_files, self.manifest['dirs'], paths, [], [], scanned=False)
+            return [self._file_info(path) for path in paths]
+
+    def _reference_filename(self, source, title, author, year):
+        """Construire un nom de fichier compatible avec l'extraction des métadonnées"""
+        if not (title or author or year):
+            return source.name
+
+        parts = [author, str(year) if year else None, title or source.stem]
+        name = '_'.join(re.sub(r'[^\w\-]+', '_', part).strip('_') for part in parts if part)
+        return name + source.suffix.lower()
+
+
+def expand_import_sources(sources):
+    """Fichiers à importer à partir de dossiers, motifs glob, fichiers ou listes
+
+    Une liste (.txt/.lst: un chemin par ligne; .csv: colonnes path, title,
+    author, year; .jsonl: un objet par ligne) peut préciser les métadonnées
+    utilisées pour nommer les fichiers. Retourne une liste de dicts.
+    """
+    items = []
+    seen = set()
+
+    def add(path, **metadata):
+        path = os.path.abspath(os.path.expanduser(path))
+        if path not in seen:
+            seen.add(path)
+            items.append(dict(metadata, path=path))
+
+    for source in sources:
+        path = Path(source).expanduser()
+        if path.is_dir():
+            for root, dirs, files in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+                for name in sorted(files):
+                    if not name.startswith('.') and Path(name).suffix.lower() in SUPPORTED_EXTENSIONS:
+                        add(os.path.join(root, name))
+        elif path.is_file() and path.suffix.lower() in IMPORT_LIST_EXTENSIONS:
+            for entry in _read_import_list(path):
+                add(str(path.parent / Path(entry.pop('path')).expanduser()), **entry)
+        elif path.is_file():
+            add(str(path))
+        elif glob.has_magic(source):
+            for match in sorted(glob.glob(os.path.expanduser(source), recursive=True)):
+                if os.path.isfile(match) and Path(match).suffix.lower() in SUPPORTED_EXTENSIONS:
+                    add(match)
+        else:
+            raise FileNotFoundError(f"Introuvable: {source}")
+    return items
+
+
+def _read_import_list(path):
+    """Entrées (path, title, author, year) d'un fichier liste"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.suffix.lower() == '.csv':
+            rows = list(csv.DictReader(f))
+        elif path.suffix.lower() == '.jsonl':
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = [{'path': line.strip()} for line in f if line.strip() and not line.startswith('#')]
+    return [{key: row.get(key) or None for key in ('path', 'title', 'author', 'year')} for row in rows
+            if row.get('path')]
+
+
 # Test simple
 if __name__ == "__main__":
     manager = LocalFilesManager()
     print(manager.test())
-    
\ No newline at end of file
@@ -0,0 +1,158 @@
+"""
+Surveillance du dossier de références local (mode daemon)
+
+Les événements du système de fichiers (watchdog) sont placés dans une file
+bornée, regroupés tant que le dossier est actif (debounce), dédoublonnés par
+chemin, puis appliqués au manifeste de LocalFilesManager et à l'index de
+recherche. Si la file déborde (copie massive d'un dossier), les événements
+sont abandonnés au profit d'un scan incrémental.
+"""
+
+import os
+import queue
+import threading
+import time
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+
+class _EventCollector(FileSystemEventHandler):
+    """Transmettre les chemins touchés à la file bornée"""
+
+    def __init__(self, events, overflow):
+        super().__init__()
+        self.events = events
+        self.overflow = overflow
+
+    def on_any_event(self, event):
+        # La modification d'un dossier est redondante avec les événements de ses fichiers
+        if event.is_directory and event.event_type == 'modified':
+            return
+
+        paths = [event.src_path]
+        if getattr(event, 'dest_path', None):
+            paths.append(event.dest_path)
+
+        for path in paths:
+            try:
+                self.events.put_nowait(path)
+            except queue.Full:
+                self.overflow.set()
+
+
+class LocalWatcher:
+    def __init__(self, searcher, debounce=1.0, max_delay=10.0, queue_size=10000, on_batch=None):
+        self.searcher = searcher
+        self.manager = searcher.local_manager
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.on_batch = on_batch
+
+        self.events = queue.Queue(maxsize=queue_size)
+        self.overflow = threading.Event()
+        self.stopped = threading.Event()
+        self.observer = None
+
+    def start(self):
+        """Rattraper les changements hors surveillance puis s'abonner aux événements"""
+        if self.manager is None:
+            raise RuntimeError("Gestionnaire local non disponible")
+
+        self.manager.scan()
+        self._refresh_index()
+
+        self.observer = Observer()
+        self.observer.schedule(_EventCollector(self.events, self.overflow), str(self.manager.refs_path), recursive=True)
+        self.observer.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.observer:
+            self.observer.stop()
+            self.observer.join()
+
+    def run_forever(self):
+        """Boucle principale: attendre un lot d'événements, l'appliquer, recommencer"""
+        self.start()
+        try:
+            while not self.stopped.is_set():
+                paths = self._next_batch()
+                if paths or self.overflow.is_set():
+                    self._apply(paths)
+        finally:
+            self.stop()
+
+    def _next_batch(self):
+        """Collecter les événements jusqu'à un silence de `debounce` secondes
+
+        Un lot n'attend jamais plus de `max_delay` secondes, même si le dossier
+        reste actif en continu.
+        """
+        try:
+            first = self.events.get(timeout=0.5)
+        except queue.Empty:
+            return set()
+
+        paths = {first}
+        started = time.monotonic()
+        while time.monotonic() - started < self.max_delay:
+            try:
+                paths.add(self.events.get(timeout=self.debounce))
+            except queue.Empty:
+                break
+        return paths
+
+    def _apply(self, paths):
+        started = time.monotonic()
+        # Un manifeste modifié par un autre processus (add, import) est relu sous verrou
+        if self.overflow.is_set():
+            self.overflow.clear()
+            self._drain()
+            generation = self.manager.generation()
+            self.manager.scan()
+            counts = self.manager.delta_counts() if self.manager.generation() != generation else (0, 0, 0)
+        else:
+            counts = self.manager.apply_paths(coalesce_paths(paths, self.manager.refs_path))
+
+        self._refresh_index()
+        if self.on_batch:
+            self.on_batch(len(paths), counts, time.monotonic() - started)
+
+    def _drain(self):
+        """Vider la file: le scan qui suit couvre tous les événements en attente"""
+        while True:
+            try:
+                self.events.get_nowait()
+            except queue.Empty:
+                return
+
+    def _refresh_index(self):
+        for source, error in self.searcher.refresh_sources(['local']):
+            if error:
+                print(f"Erreur mise à jour de l'index local: {error}")
+        self.searcher.update_duplicates()
+
+
+def coalesce_paths(paths, root=None):
+    """Supprimer les chemins couverts par un dossier parent déjà présent dans le lot
+
+    La racine `root` ne couvre pas ses descendants: elle est reparcourue en
+    mode incrémental, qui ne voit pas les modifications en place.
+    """
+    paths = {os.path.abspath(p) for p in paths}
+    root = os.path.abspath(root) if root else None
+    directories = {p for p in paths if p != root and os.path.isdir(p)}
+
+    kept = []
+    for path in sorted(paths):
+        parent = os.path.dirname(path)
+        covered = False
+        while parent and parent != os.path.dirname(parent):
+            if parent in directories:
+                covered = True
+                break
+            parent = os.path.dirname(parent)
+        if not covered:
+            kept.append(path)
+    return kept
@@ -1,4 +1,3 @@
-print("=== SCRIPT DEMARRE ===")
 #!/usr/bin/env python3
 """
 Gestionnaire de références avancé
@@ -8,50 +7,130 @@ Accès à Google Drive, fichiers locaux et GitHub via terminal
 import os
 import sys
 import click
-from rich.console import Console
-from rich.table import Table
-from rich.progress import Progress, SpinnerColumn, TextColumn
 from pathlib import Path
 from dotenv import load_dotenv
 
+# Sur stderr: la sortie standard reste exploitable (search --format jsonl|csv)
+print("=== SCRIPT DEMARRE ===", file=sys.stderr)
+
 # Charger les variables d'environnement
 load_dotenv('config/.env')
 
 # Ajouter le dossier src au path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-try:
-    from google_drive_manager import GoogleDriveManager
-    from github_manager import GitHubManager
-    from local_files_manager import LocalFilesManager
-    from reference_search import ReferenceSearch
-except ImportError as e:
-    print(f"Erreur d'import: {e}")
-    print("Assurez-vous que tous les modules sont créés.")
+# Les managers, rich et les clients HTTP ne sont importés que par les commandes
+# qui les utilisent: `--help` ou `config` ne paient pas leur temps de chargement.
+
+
+class _LazyConsole:
+    """Console rich créée au premier affichage"""
+    _console = None
+
+    def __getattr__(self, name):
+        if _LazyConsole._console is None:
+            from rich.console import Console
+            _LazyConsole._console = Console()
+        return getattr(_LazyConsole._console, name)
+
+    # Les méthodes spéciales ne passent pas par __getattr__ (Progress fait `with console`)
+    def __enter__(self):
+        return self.__getattr__('__enter__')()
+
+    def __exit__(self, *exc):
+        return self.__getattr__('__exit__')(*exc)
 
-console = Console()
+
+console = _LazyConsole()
+
+def _report_metrics(profile, metrics_out):
+    """Afficher et/ou exporter les mesures des étapes à la fin d'une commande"""
+    from metrics import metrics
+    
+    if metrics_out:
+        try:
+            metrics.export(metrics_out)
+        except Exception as e:
+            console.print(f"[red]Erreur export des mesures: {e}[/red]")
+    if not profile:
+        return
+    
+    from rich.table import Table
+    snapshot = metrics.snapshot()
+    elapsed_ms = snapshot['elapsed_s'] * 1000
+    table = Table(title=f"⏱️ Profil ({elapsed_ms:.1f} ms au total, étapes imbriquées)")
+    table.add_column("Étape", style="cyan")
+    table.add_column("Appels", justify="right")
+    table.add_column("Total (ms)", justify="right", style="magenta")
+    table.add_column("Moyenne (ms)", justify="right")
+    table.add_column("Max (ms)", justify="right")
+    table.add_column("%", justify="right", style="yellow")
+    for name, stage in snapshot['stages'].items():
+        share = stage['total_ms'] / elapsed_ms * 100 if elapsed_ms else 0
+        table.add_row(name, str(stage['calls']), f"{stage['total_ms']:.2f}", f"{stage['mean_ms']:.3f}",
+                      f"{stage['max_ms']:.2f}", f"{share:.1f}")
+    console.print(table)
+    for name, value in snapshot['counters'].items():
+        console.print(f"[red]{name}: {value}[/red]")
 
 @click.group()
 @click.version_option(version='1.0.0')
-def cli():
+@click.option('--profile', is_flag=True, help='Afficher le temps passé dans chaque étape (recherche locale)')
+@click.option('--metrics-out', type=click.Path(dir_okay=False),
+              help='Exporter les mesures des étapes (.prom: format Prometheus, sinon JSON)')
+@click.pass_context
+def cli(ctx, profile, metrics_out):
     """🔬 Gestionnaire de Références PhD - Interface Terminal Avancée
     
     Gérez vos références depuis Google Drive, GitHub et fichiers locaux.
     Développé par Yassine pour son doctorat en mathématiques.
     """
-    console.print("[bold blue]📚 Gestionnaire de Références PhD - Yassine[/bold blue]")
+    # Bannière seulement dans un terminal: rien ne se mêle aux données redirigées
+    if sys.stdout.isatty():
+        console.print("[bold blue]📚 Gestionnaire de Références PhD - Yassine[/bold blue]")
+    ctx.obj = {'profile': profile or bool(metrics_out)}
+    if profile or metrics_out:
+        from metrics import metrics
+        metrics.enable()
+        ctx.call_on_close(lambda: _report_metrics(profile, metrics_out))
 
 @cli.command()
 @click.option('--source', '-s', 
-              type=click.Choice(['drive', 'local', 'github', 'all']), 
+              type=click.Choice(['drive', 'local', 'github', 'bibtex', 'all']), 
               default='all', 
               help='Source des références à rechercher')
 @click.option('--keyword', '-k', help='Mot-clé de recherche')
 @click.option('--author', '-a', help='Nom de l\'auteur')
-@click.option('--year', '-y', help='Année de publication')
-@click.option('--limit', '-l', default=10, help='Nombre max de résultats')
-def search(source, keyword, author, year, limit):
+@click.option('--year', '-y', help='Année de publication ou intervalle (2015-2020, 2015-, -2020)')
+@click.option('--type', '-t', 'doc_type', help='Type de document (pdf, article, book...)')
+@click.option('--limit', '-l', type=int, help='Nombre max de résultats (défaut: 10 pour le tableau, tous en jsonl/csv)')
+@click.option('--offset', default=0, help='Nombre de résultats à sauter')
+@click.option('--cursor', help='Curseur de la page suivante (affiché après une recherche)')
+@click.option('--ranking', '-r',
+              type=click.Choice(['classic', 'bm25']),
+              default='classic',
+              help='Classement: sous-chaînes (classic) ou BM25 tolérant aux fautes (bm25)')
+@click.option('--keep-duplicates', is_flag=True, help='Afficher séparément les copies d\'un même fichier')
+@click.option('--no-server', is_flag=True, help='Ne pas utiliser le serveur de requêtes (commande serve)')
+@click.option('--format', 'output_format', type=click.Choice(['table', 'jsonl', 'csv']), default='table',
+              help='Tableau, ou flux JSON Lines / CSV sur la sortie standard (une ligne par résultat)')
+@click.option('--unsorted', is_flag=True, help='En jsonl/csv: ordre de l\'index, sans tri (mémoire constante)')
+@click.option('--facets', is_flag=True, help='Afficher les comptes par source, type, année et auteur')
+@click.pass_obj
+def search(obj, source, keyword, author, year, doc_type, limit, offset, cursor, ranking, keep_duplicates, no_server,
+           output_format, unsorted, facets):
     """🔍 Rechercher dans les références"""
+    if output_format != 'table':
+        if cursor or facets:
+            raise click.UsageError("--cursor et --facets ne sont utilisables qu'avec --format table")
+        _stream_search(output_format, limit, offset, unsorted, sources=source, keyword=keyword, author=author,
+                       year=year, ranking=ranking, dedupe=not keep_duplicates, doc_type=doc_type)
+        return
+    
+    limit = limit or 10
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+    from rich.table import Table
+    from query_server import remote_search
     
     with Progress(
         SpinnerColumn(),
@@ -61,22 +140,36 @@ def search(source, keyword, author, year, limit):
         task = progress.add_task(f"Recherche dans {source}...", total=None)
         
         try:
-            searcher = ReferenceSearch()
-            results = searcher.search(
+            params = dict(
                 sources=source,
                 keyword=keyword,
                 author=author,
                 year=year,
-                limit=limit
+                limit=limit,
+                offset=offset,
+                cursor=cursor,
+                ranking=ranking,
+                dedupe=not keep_duplicates,
+                doc_type=doc_type,
+                facets=facets
             )
+            # Index chaud du serveur s'il tourne, sinon recherche dans ce processus
+            # (toujours locale avec --profile: les étapes sont mesurées ici)
+            page = None if no_server or obj['profile'] else remote_search(**params)
+            if page is None:
+                from reference_search import ReferenceSearch
+                searcher = ReferenceSearch()
+                page = searcher.search_page(**params)
+            results = page['results']
             progress.stop()
             
             if not results:
                 console.print("[yellow]Aucun résultat trouvé.[/yellow]")
+                console.print("[dim]La recherche lit l'état de la dernière synchronisation (commande sync)[/dim]")
                 return
             
             # Affichage des résultats
-            table = Table(title=f"Résultats de recherche ({len(results)} trouvés)")
+            table = Table(title=f"Résultats de recherche ({len(results)} affichés sur {page['total']} trouvés)")
             table.add_column("Source", style="cyan", width=12)
             table.add_column("Titre", style="magenta", max_width=40)
             table.add_column("Auteur", style="green", max_width=20)
@@ -84,8 +177,9 @@ def search(source, keyword, author, year, limit):
             table.add_column("Chemin", style="blue", max_width=30)
             
             for result in results[:limit]:
+                copies = len(result.get('locations', []))
                 table.add_row(
-                    result.get('source', 'N/A'),
+                    result.get('source', 'N/A') + (f" +{copies - 1}" if copies > 1 else ''),
                     result.get('title', 'N/A')[:40] + '...' if len(result.get('title', '')) > 40 else result.get('title', 'N/A'),
                     result.get('author', 'N/A')[:20] + '...' if len(result.get('author', '')) > 20 else result.get('author', 'N/A'),
                     str(result.get('year', 'N/A')),
@@ -94,13 +188,83 @@ def search(source, keyword, author, year, limit):
             
             console.print(table)
             
+            if page['next_cursor']:
+                console.print(f"[dim]Page suivante: --cursor {page['next_cursor']}[/dim]")
+            
+            if facets:
+                _print_facets(page.get('facets', {}))
+            
         except Exception as e:
             progress.stop()
             console.print(f"[red]Erreur lors de la recherche: {e}[/red]")
 
+FACET_TITLES = {'source': 'Source', 'type': 'Type', 'year': 'Année', 'author': 'Auteur'}
+
+def _print_facets(facets, top=10):
+    """Afficher les comptes de chaque facette, côte à côte"""
+    from rich.columns import Columns
+    from rich.table import Table
+    
+    tables = []
+    for facet, title in FACET_TITLES.items():
+        counts = facets.get(facet)
+        if not counts:
+            continue
+        table = Table(title=title)
+        table.add_column("Valeur", style="cyan", max_width=25)
+        table.add_column("Nombre", justify="right", style="green")
+        for value, count in list(counts.items())[:top]:
+            table.add_row(str(value), str(count))
+        tables.append(table)
+    console.print(Columns(tables))
+
+STREAM_FIELDS = ('source', 'title', 'author', 'year', 'type', 'path', 'size', 'modified', 'id', 'score')
+
+def _stream_search(output_format, limit, offset, unsorted, **params):
+    """Écrire les résultats sur la sortie standard au fur et à mesure (jsonl ou csv)"""
+    import contextlib
+    import csv
+    import itertools
+    import json
+    from reference_search import ReferenceSearch
+    
+    out = sys.stdout
+    # Les messages des managers vont sur stderr pour ne pas corrompre le flux
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            results = ReferenceSearch().iter_search(
+                ordered=not unsorted, limit=offset + limit if limit is not None else None, **params)
+            results = itertools.islice(results, offset, None)
+            
+            if output_format == 'csv':
+                writer = csv.writer(out)
+                writer.writerow(STREAM_FIELDS + ('copies',))
+                for result in results:
+                    copies = [copy['path'] for copy in result.get('locations', [])[1:]]
+                    writer.writerow([result.get(field, '') for field in STREAM_FIELDS] + [' | '.join(copies)])
+            else:
+                for result in results:
+                    out.write(json.dumps(result, ensure_ascii=False, default=str) + '\n')
+            out.flush()
+        except BrokenPipeError:
+            # Lecteur fermé (ex: `| head`): arrêt silencieux
+            os.dup2(os.open(os.devnull, os.O_WRONLY), out.fileno())
+        except Exception as e:
+            print(f"Erreur lors de la recherche: {e}")
+            sys.exit(1)
+
 @cli.command()
-def sync():
+@click.option('--timeout', default=float(os.getenv('SYNC_TIMEOUT', '600')),
+              help='Délai max (secondes) par source')
+@click.option('--full', is_flag=True, help='Re-stat tous les fichiers locaux (scan non incrémental)')
+def sync(timeout, full):
     """🔄 Synchroniser toutes les sources"""
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+    from bibtex_manager import BibTeXManager
+    from github_manager import GitHubManager
+    from google_drive_manager import GoogleDriveManager
+    from local_files_manager import LocalFilesManager
+    from source_fanout import fan_out
     
     with Progress(
         SpinnerColumn(),
@@ -108,32 +272,35 @@ def sync():
         console=console,
     ) as progress:
         
-        # Google Drive
-        task1 = progress.add_task("Synchronisation Google Drive...", total=None)
-        try:
-            drive_manager = GoogleDriveManager()
-            drive_count = drive_manager.sync()
-            progress.update(task1, description=f"✅ Google Drive ({drive_count} fichiers)")
-        except Exception as e:
-            progress.update(task1, description=f"❌ Google Drive: {e}")
+        # Les sources sont synchronisées en parallèle
+        sources = {
+            'drive': ("Google Drive", lambda: GoogleDriveManager().sync()),
+            'github': ("GitHub", lambda: GitHubManager().sync()),
+            'local': ("Local", lambda: LocalFilesManager().scan(full=full)),
+            'bibtex': ("BibTeX", lambda: BibTeXManager().sync()),
+        }
+        tasks = {
+            'drive': progress.add_task("Synchronisation Google Drive...", total=None),
+            'github': progress.add_task("Synchronisation GitHub...", total=None),
+            'local': progress.add_task("Scan fichiers locaux...", total=None),
+            'bibtex': progress.add_task("Analyse des fichiers BibTeX...", total=None),
+        }
         
-        # GitHub
-        task2 = progress.add_task("Synchronisation GitHub...", total=None)
-        try:
-            github_manager = GitHubManager()
-            github_count = github_manager.sync()
-            progress.update(task2, description=f"✅ GitHub ({github_count} fichiers)")
-        except Exception as e:
-            progress.update(task2, description=f"❌ GitHub: {e}")
-        
-        # Fichiers locaux
-        task3 = progress.add_task("Scan fichiers locaux...", total=None)
-        try:
-            local_manager = LocalFilesManager()
-            local_count = local_manager.scan()
-            progress.update(task3, description=f"✅ Local ({local_count} fichiers)")
-        except Exception as e:
-            progress.update(task3, description=f"❌ Local: {e}")
+        # Chaque ligne est mise à jour dès que sa source termine
+        for source, count, error in fan_out({name: run for name, (_, run) in sources.items()}, timeout=timeout):
+            label = sources[source][0]
+            if error:
+                progress.update(tasks[source], description=f"❌ {label}: {error}")
+            else:
+                progress.update(tasks[source], description=f"✅ {label} ({count} fichiers)")
+    
+    # Index et doublons recalculés ici plutôt qu'à la première recherche;
+    # les analyses de noms de fichiers supprimés de toutes les sources sont oubliées
+    from reference_search import ReferenceSearch
+    searcher = ReferenceSearch()
+    searcher.refresh_all()
+    searcher.update_duplicates()
+    searcher.prune_filename_cache()
     
     console.print("[bold green]🎉 Synchronisation terminée![/bold green]")
 
@@ -144,6 +311,7 @@ def sync():
 @click.option('--year', '-y', help='Année de publication')
 def add(file_path, title, author, year):
     """📄 Ajouter une nouvelle référence"""
+    from local_files_manager import LocalFilesManager
     
     console.print(f"[bold blue]Ajout de: {file_path}[/bold blue]")
     
@@ -164,16 +332,398 @@ def add(file_path, title, author, year):
     except Exception as e:
         console.print(f"[red]Erreur: {e}[/red]")
 
+@cli.command('import')
+@click.argument('sources', nargs=-1, required=True)
+@click.option('--link', is_flag=True, help='Lien physique au lieu d\'une copie (copie si autre disque)')
+@click.option('--workers', '-w', default=8, help='Copies/empreintes en parallèle')
+@click.option('--batch-size', default=500, help='Fichiers enregistrés et indexés par lot')
+@click.option('--no-extract', is_flag=True, help='Ne pas extraire le contenu des PDF importés')
+def import_(sources, link, workers, batch_size, no_extract):
+    """📥 Importer en lot des dossiers, motifs glob ou listes (.txt, .csv, .jsonl)"""
+    import time
+    from rich.progress import BarColumn, MofNCompleteColumn, Progress, TextColumn, TimeElapsedColumn
+    from local_files_manager import expand_import_sources
+    from reference_search import ReferenceSearch
+
+    try:
+        items = expand_import_sources(sources)
+        if not items:
+            console.print("[yellow]Aucun fichier à importer.[/yellow]")
+            return
+
+        searcher = ReferenceSearch()
+        started = time.monotonic()
+        with Progress(
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            MofNCompleteColumn(),
+            TextColumn("[cyan]{task.fields[rate]}"),
+            TimeElapsedColumn(),
+            console=console,
+        ) as progress:
+            task = progress.add_task("Import", total=len(items), rate="")
+
+            def report(stats):
+                done = stats['imported'] + stats['existing'] + stats['duplicates'] + len(stats['errors'])
+                rate = done / max(time.monotonic() - started, 1e-9)
+                progress.update(task, completed=done, rate=f"{rate:.1f} fichiers/s")
+
+            stats = searcher.import_files(items, link=link, workers=workers, batch_size=batch_size,
+                                          extract=not no_extract, progress=report)
+
+        elapsed = time.monotonic() - started
+        console.print(f"[bold green]✅ {stats['imported']} fichier(s) importé(s) en {elapsed:.1f}s "
+                      f"({stats['imported'] / max(elapsed, 1e-9):.1f} fichiers/s, "
+                      f"{stats['bytes'] / 1e6:.1f} Mo, {stats['pages']} pages extraites)[/bold green]")
+        if stats['existing'] or stats['duplicates']:
+            console.print(f"[yellow]{stats['existing']} déjà présent(s), "
+                          f"{stats['duplicates']} doublon(s) de contenu ignoré(s)[/yellow]")
+        for path, error in stats['errors'][:10]:
+            console.print(f"[red]❌ {path}: {error}[/red]")
+        if len(stats['errors']) > 10:
+            console.print(f"[red]... et {len(stats['errors']) - 10} autre(s) erreur(s)[/red]")
+
+    except Exception as e:
+        console.print(f"[red]Erreur lors de l'import: {e}[/red]")
+
+@cli.command()
+@click.option('--debounce', default=1.0, help='Silence (secondes) avant d\'appliquer un lot d\'événements')
+@click.option('--max-delay', default=10.0, help='Attente max (secondes) pour un lot')
+def watch(debounce, max_delay):
+    """👀 Surveiller le dossier local et garder le cache à jour"""
+    from local_watcher import LocalWatcher
+    from reference_search import ReferenceSearch
+    
+    def report(events, counts, elapsed):
+        added, changed, removed = counts
+        console.print(f"[cyan]{events} événements → +{added} ~{changed} -{removed} ({elapsed:.2f}s)[/cyan]")
+    
+    try:
+        searcher = ReferenceSearch()
+        watcher = LocalWatcher(searcher, debounce=debounce, max_delay=max_delay, on_batch=report)
+        console.print(f"[bold blue]👀 Surveillance de {searcher.local_manager.refs_path} (Ctrl+C pour arrêter)[/bold blue]")
+        watcher.run_forever()
+    except KeyboardInterrupt:
+        console.print("[bold green]Surveillance arrêtée.[/bold green]")
+    except Exception as e:
+        console.print(f"[red]Erreur: {e}[/red]")
+
+@cli.command()
+@click.option('--workers', '-w', type=int, help='Nombre de processus (défaut: nombre de CPU)')
+@click.option('--force', is_flag=True, help='Ré-extraire même les fichiers inchangés')
+def extract(workers, force):
+    """📖 Extraire le texte et les métadonnées des PDF locaux"""
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+    from rich.table import Table
+    from reference_search import ReferenceSearch
+    
+    try:
+        searcher = ReferenceSearch()
+        local_manager = searcher.local_manager
+        if not local_manager.get_cached_files():
+            local_manager.scan()
+        files = local_manager.get_cached_files()
+        
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            console=console,
+        ) as progress:
+            task = progress.add_task("Extraction du contenu des PDF...", total=None)
+            
+            def report(stats):
+                progress.update(task, description=f"Extraction: {stats['files']} fichiers, {stats['pages']} pages")
+            
+            stats = searcher.content_cache.extract(files, workers=workers, force=force, progress=report)
+        
+        # Réindexer les références dont le contenu a changé
+        changed = set(stats['changed'])
+        searcher.reindex_files('local', [f for f in files if f['path'] in changed])
+        searcher.update_duplicates()
+        
+        table = Table(title="Extraction du contenu")
+        table.add_column("Mesure", style="cyan")
+        table.add_column("Valeur", style="magenta")
+        table.add_row("Fichiers extraits", str(stats['files']))
+        table.add_row("Inchangés (ignorés)", str(stats['skipped']))
+        table.add_row("Doublons réutilisés", str(stats['reused']))
+        table.add_row("Erreurs", str(stats['errors']))
+        table.add_row("Pages", str(stats['pages']))
+        table.add_row("Durée", f"{stats['elapsed']:.2f}s")
+        table.add_row("Débit", f"{stats['files_per_second']:.1f} fichiers/s, {stats['pages_per_second']:.1f} pages/s")
+        console.print(table)
+        
+    except Exception as e:
+        console.print(f"[red]Erreur lors de l'extraction: {e}[/red]")
+
+@cli.command()
+@click.option('--key', help='Clé de citation')
+@click.option('--doi', help='DOI')
+@click.option('--author', '-a', help='Nom de famille d\'un auteur')
+@click.option('--year', '-y', type=int, help='Année de publication')
+@click.option('--limit', '-l', default=20, help='Nombre max de résultats')
+def bibtex(key, doi, author, year, limit):
+    """📖 Chercher dans les fichiers BibTeX (clé, DOI, auteur, année)"""
+    from rich.table import Table
+    from bibtex_manager import BibTeXManager
+    try:
+        manager = BibTeXManager()
+        count = manager.sync()
+        entries = manager.find(key=key, doi=doi, author=author, year=year)
+        
+        if not entries:
+            console.print(f"[yellow]Aucune entrée trouvée parmi {count}[/yellow]")
+            return
+        
+        table = Table(title=f"📖 {len(entries)} entrée(s) BibTeX")
+        table.add_column("Clé", style="cyan")
+        table.add_column("Auteurs", style="green")
+        table.add_column("Année", style="yellow")
+        table.add_column("Titre", style="magenta")
+        table.add_column("DOI", style="blue")
+        
+        for entry in entries[:limit]:
+            table.add_row(
+                entry['key'],
+                '; '.join(entry['authors'])[:40],
+                str(entry['year'] or 'N/A'),
+                entry['title'][:50],
+                entry['doi'] or '',
+            )
+        
+        console.print(table)
+        
+    except Exception as e:
+        console.print(f"[red]Erreur lors de la recherche BibTeX: {e}[/red]")
+
+@cli.command()
+@click.argument('query', required=False)
+@click.option('--mode', '-m', type=click.Choice(['cited-by', 'references', 'around', 'cocited', 'coupled']),
+              default='cited-by', help='Documents qui citent QUERY, ses références, son voisinage, '
+                                        'co-citations ou couplage bibliographique')
+@click.option('--hops', default=1, help='Distance max du voisinage (mode around)')
+@click.option('--direction', type=click.Choice(['both', 'out', 'in']), default='both',
+              help='Sens des arêtes parcourues (mode around)')
+@click.option('--limit', '-l', default=20, help='Nombre max de résultats')
+@click.option('--rebuild', is_flag=True, help='Reconstruire tout le graphe (relire les bibliographies)')
+def citations(query, mode, hops, direction, limit, rebuild):
+    """🕸️ Graphe de citations (DOI, arXiv, titre ou auteur; après la commande extract)"""
+    from rich.table import Table
+    from bibtex_manager import BibTeXManager
+    from citation_graph import CitationGraph
+    from pdf_extractor import ContentCache
+    
+    try:
+        graph = CitationGraph()
+        entries = BibTeXManager().get_cached_files()
+        if graph.build(ContentCache(), entries, force=rebuild):
+            console.print("[green]Graphe de citations mis à jour[/green]")
+        stats = graph.stats()
+        console.print(f"[dim]{stats['nodes']} nœuds, {stats['edges']} citations, "
+                      f"{stats['documents']} documents analysés ({stats['built']})[/dim]")
+        if not query:
+            return
+        
+        seeds = graph.resolve(query)
+        if not seeds:
+            console.print(f"[yellow]Aucun nœud ne correspond à {query}[/yellow]")
+            return
+        
+        if mode == 'around':
+            rows = sorted(graph.k_hop(seeds, hops, direction).items(), key=lambda item: (item[1], item[0]))
+            column = "Distance"
+        elif mode in ('cocited', 'coupled'):
+            if len(seeds) > 1:
+                console.print(f"[yellow]{len(seeds)} nœuds correspondent à {query}: comptes cumulés sur tous "
+                              f"(précisez un DOI ou un titre pour un seul document)[/yellow]")
+            rows = (graph.co_cited if mode == 'cocited' else graph.coupled)(seeds, limit)
+            column = "En commun"
+        else:
+            related = set()
+            for seed in seeds:
+                related.update(graph.cited_by(seed) if mode == 'cited-by' else graph.references(seed))
+            rows = [(node_id, '') for node_id in sorted(related)]
+            column = ""
+        
+        table = Table(title=f"🕸️ {mode}: {query} ({len(rows)} résultat(s))")
+        table.add_column("Clé", style="cyan", max_width=30)
+        table.add_column("Titre", style="magenta", max_width=40)
+        table.add_column("Auteurs", style="green", max_width=25)
+        table.add_column("Année", style="yellow")
+        table.add_column("Local", style="blue")
+        if column:
+            table.add_column(column, justify="right")
+        
+        for node_id, value in rows[:limit]:
+            node = graph.describe(node_id)
+            row = [node['key'], node['title'][:40], node['authors'][:25], str(node['year'] or ''),
+                   '✅' if node['path'] else '']
+            table.add_row(*(row + [str(value)] if column else row))
+        
+        console.print(table)
+        graph.close()
+        
+    except Exception as e:
+        console.print(f"[red]Erreur du graphe de citations: {e}[/red]")
+
+@cli.command()
+@click.argument('query')
+@click.option('--text', 'is_text', is_flag=True, help='QUERY est un texte libre (sinon: référence la mieux classée)')
+@click.option('--source', '-s', type=click.Choice(['all', 'drive', 'github', 'local', 'bibtex']),
+              default='all', help='Source des références comparées')
+@click.option('--limit', '-l', default=10, help='Nombre max de résultats')
+@click.option('--ivf/--exact', default=None, help='Index approximatif IVF ou calcul exact (défaut: selon la taille)')
+@click.option('--rebuild', is_flag=True, help='Réajuster le modèle et recalculer tous les plongements')
+def similar(query, is_text, source, limit, ivf, rebuild):
+    """🧭 Références proches par le contenu (titre, résumé, texte extrait)"""
+    from rich.table import Table
+    from reference_search import ReferenceSearch
+    from bibtex_manager import BibTeXManager
+
+    try:
+        from semantic_index import SemanticIndex, reference_documents
+    except ImportError as e:
+        console.print(f"[red]Recherche par similarité indisponible ({e}): pip install numpy[/red]")
+        return
+
+    try:
+        searcher = ReferenceSearch()
+        sources = searcher._refresh(source)
+        index = searcher.index
+
+        semantic = SemanticIndex()
+        documents = reference_documents(index, searcher.content_cache, BibTeXManager().get_cached_files())
+        stats = semantic.update(documents, force=rebuild, ivf=ivf)
+        if stats['refit'] or stats['embedded'] or stats['removed']:
+            console.print(f"[dim]Plongements: {stats['embedded']} calculés, {stats['removed']} supprimés"
+                          f"{', modèle réajusté' if stats['refit'] else ''}[/dim]")
+
+        keys_by_doc = {doc_id: key for key, doc_id in index.keys.items()}
+        exclude = set()
+        if is_text:
+            vector = semantic.embed(query)
+            title = query
+        else:
+            matches = searcher.ranker.score(query, index.lookup(sources, None, None, None))
+            if not matches:
+                console.print(f"[yellow]Aucune référence ne correspond à {query}[/yellow]")
+                return
+            doc_id = max(matches)[1]
+            title = index.get(doc_id)['title']
+            # La référence elle-même et ses copies dans les autres sources sont exclues
+            exclude = {keys_by_doc.get(member) for member in index.cluster_of.get(doc_id, [doc_id])}
+            vector = semantic.vector(keys_by_doc[doc_id])
+
+        allowed = set(index.lookup(sources, None, None, None))
+        doc_ids = {key: doc_id for key, doc_id in index.keys.items() if doc_id in allowed}
+        found = semantic.nearest(vector, limit=limit * 4 + len(exclude), exclude=exclude)
+        results = searcher.collapse_duplicates([(score, doc_ids[key]) for key, score in found if key in doc_ids])
+        results = sorted(results, reverse=True)[:limit]
+
+        table = Table(title=f"🧭 Proches de: {title[:60]} ({len(results)} résultat(s))")
+        table.add_column("Titre", style="magenta", max_width=45)
+        table.add_column("Auteur", style="green", max_width=25)
+        table.add_column("Année", style="yellow")
+        table.add_column("Source", style="cyan")
+        table.add_column("Similarité", justify="right")
+        for score, doc_id in results:
+            ref = index.get(doc_id)
+            table.add_row(ref['title'][:45], ref['author'][:25], str(ref['year'] or ''), ref['source'],
+                          f"{score:.3f}")
+        console.print(table)
+
+    except Exception as e:
+        console.print(f"[red]Erreur de la recherche par similarité: {e}[/red]")
+
+@cli.command()
+def dedupe():
+    """🧬 Lister les doublons entre Google Drive, GitHub et fichiers locaux"""
+    from rich.table import Table
+    from reference_search import ReferenceSearch
+    try:
+        searcher = ReferenceSearch()
+        searcher.refresh_all()
+        clusters = searcher.update_duplicates()
+        
+        if not clusters:
+            console.print("[green]Aucun doublon trouvé.[/green]")
+            return
+        
+        table = Table(title=f"🧬 {len(clusters)} groupe(s) de doublons")
+        table.add_column("#", style="cyan")
+        table.add_column("Titre", style="magenta", max_width=40)
+        table.add_column("Taille", style="yellow")
+        table.add_column("Emplacements", style="blue")
+        
+        redundant_bytes = 0
+        for number, cluster in enumerate(clusters, 1):
+            result = searcher.materialize(0, cluster[0])
+            redundant_bytes += result['size'] * (len(cluster) - 1)
+            table.add_row(
+                str(number),
+                result['title'],
+                f"{result['size'] / 1024 / 1024:.1f} Mo",
+                '\n'.join(f"{copy['source']}: {copy['path']}" for copy in result['locations'])
+            )
+        
+        console.print(table)
+        console.print(f"[bold]Copies redondantes:[/bold] {sum(len(c) - 1 for c in clusters)} "
+                      f"({redundant_bytes / 1024 / 1024:.1f} Mo)")
+        console.print(f"[dim]Empreintes calculées: {searcher.hash_cache.computed} "
+                      f"(les autres proviennent du cache)[/dim]")
+        
+    except Exception as e:
+        console.print(f"[red]Erreur lors de la détection des doublons: {e}[/red]")
+
+@cli.command()
+@click.option('--socket', 'socket_path', type=click.Path(), help='Socket Unix (défaut: CACHE_DIR/query.sock)')
+@click.option('--port', type=int, help='Écouter en HTTP sur 127.0.0.1:PORT plutôt que sur une socket Unix')
+def serve(socket_path, port):
+    """🛰️ Garder l'index en mémoire et répondre aux recherches (JSON)"""
+    import signal
+    from metrics import metrics
+    from query_server import QueryServer
+    from reference_search import ReferenceSearch
+    
+    # Mesures exposées en continu sur GET /metrics (format Prometheus)
+    metrics.enable()
+    # Les sources expirées sont resynchronisées en arrière-plan, sans retarder les réponses
+    searcher = ReferenceSearch(background_refresh=True)
+    # Charger toutes les sources une première fois: les requêtes suivantes partent d'un index chaud
+    searcher.refresh_all()
+    
+    server = QueryServer(searcher, socket_path=socket_path, port=port)
+    try:
+        address = server.start()
+    except RuntimeError as e:
+        console.print(f"[red]{e}[/red]")
+        sys.exit(1)
+    # SIGTERM (arrêt par un gestionnaire de services) nettoie comme Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    where = address['path'] if address['transport'] == 'unix' else f"http://{address['host']}:{address['port']}"
+    console.print(f"[bold blue]🛰️ Serveur de requêtes sur {where} "
+                  f"({searcher.index.count()} références, Ctrl+C pour arrêter)[/bold blue]")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        console.print("[yellow]Serveur arrêté[/yellow]")
+
 @cli.command()
 def status():
     """📊 Statut des références"""
+    from rich.table import Table
+    from bibtex_manager import BibTeXManager
+    from github_manager import GitHubManager
+    from google_drive_manager import GoogleDriveManager
+    from local_files_manager import LocalFilesManager
     console.print("[bold blue]📊 Statut du système de références[/bold blue]")
     
     try:
-        # Compter les références par source
+        # Compter les références par source (lecture du cache partagé, sans charger les manifestes)
         drive_manager = GoogleDriveManager()
         github_manager = GitHubManager()
         local_manager = LocalFilesManager()
+        bibtex_manager = BibTeXManager()
         
         table = Table(title="Statistiques des références")
         table.add_column("Source", style="cyan")
@@ -185,7 +735,8 @@ def status():
         try:
             drive_count = drive_manager.count()
             drive_sync = drive_manager.last_sync()
-            table.add_row("Google Drive", str(drive_count), drive_sync, "✅ OK")
+            drive_status = "⏳ Expiré" if drive_manager.is_stale() else "✅ OK"
+            table.add_row("Google Drive", str(drive_count), drive_sync, drive_status)
         except Exception as e:
             table.add_row("Google Drive", "0", "Jamais", f"❌ {str(e)[:20]}")
         
@@ -193,7 +744,8 @@ def status():
         try:
             github_count = github_manager.count()
             github_sync = github_manager.last_sync()
-            table.add_row("GitHub", str(github_count), github_sync, "✅ OK")
+            github_status = "⏳ Expiré" if github_manager.is_stale() else "✅ OK"
+            table.add_row("GitHub", str(github_count), github_sync, github_status)
         except Exception as e:
             table.add_row("GitHub", "0", "Jamais", f"❌ {str(e)[:20]}")
         
@@ -201,16 +753,34 @@ def status():
         try:
             local_count = local_manager.count()
             local_sync = local_manager.last_scan()
-            table.add_row("Local", str(local_count), local_sync, "✅ OK")
+            local_status = "⏳ Expiré" if local_manager.is_stale() else "✅ OK"
+            table.add_row("Local", str(local_count), local_sync, local_status)
         except Exception as e:
             table.add_row("Local", "0", "Jamais", f"❌ {str(e)[:20]}")
         
+        # BibTeX
+        try:
+            bibtex_count = bibtex_manager.count()
+            bibtex_sync = bibtex_manager.last_sync()
+            bibtex_status = "⏳ Expiré" if bibtex_manager.is_stale() else "✅ OK"
+            table.add_row("BibTeX", str(bibtex_count), bibtex_sync, bibtex_status)
+        except Exception as e:
+            table.add_row("BibTeX", "0", "Jamais", f"❌ {str(e)[:20]}")
+        
         console.print(table)
         
         # Informations système
         console.print(f"\n[bold]Chemin du projet:[/bold] {Path.cwd()}")
         console.print(f"[bold]Configuration:[/bold] config/.env")
-        console.print(f"[bold]Cache:[/bold] data/cache/")
+        cache = local_manager.cache
+        cache_size = cache.db_file.stat().st_size / 1024 / 1024 if cache.db_file.exists() else 0
+        console.print(f"[bold]Cache:[/bold] {cache.cache_dir}/ ({cache_size:.1f} Mo, {cache.db_file.name})")
+        
+        from query_cache import QueryCache
+        queries = QueryCache(cache.cache_dir).stats()
+        console.print(f"[bold]Cache de requêtes:[/bold] {queries['entries']}/{queries['size']} pages, "
+                      f"{queries['hits']} succès, {queries['misses']} échecs "
+                      f"({queries['hit_rate']:.0%} de succès)")
         
     except Exception as e:
         console.print(f"[red]Erreur lors de l'affichage du statut: {e}[/red]")
@@ -218,6 +788,7 @@ def status():
 @cli.command()
 def config():
     """⚙️ Afficher la configuration"""
+    from rich.table import Table
     console.print("[bold blue]⚙️ Configuration actuelle[/bold blue]")
     
     config_table = Table(title="Variables d'environnement")
@@ -226,9 +797,17 @@ def config():
     
     env_vars = [
         "GOOGLE_DRIVE_FOLDER_ID",
+        "GOOGLE_DRIVE_API_URL",
+        "GOOGLE_CREDENTIALS_FILE",
         "GITHUB_REPO", 
+        "GITHUB_BRANCH",
+        "GITHUB_API_URL",
         "LOCAL_REFS_PATH",
+        "BIBTEX_PATHS",
         "CACHE_DIR",
+        "CACHE_MAX_BYTES",
+        "QUERY_CACHE_SIZE",
+        "FILENAME_CACHE_SIZE",
         "LOG_LEVEL"
     ]
     
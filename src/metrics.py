@@ -0,0 +1,197 @@
+"""
+Mesures du temps passé dans chaque étape (synchronisation, conversion, filtrage, tri)
+
+Les étapes sont délimitées par des spans (`with span('filter'):`) ou par le
+décorateur `timed`. Tant que les mesures ne sont pas activées (option
+--profile, export --metrics-out, commande serve), un span ne coûte qu'un test:
+rien n'est enregistré. Une fois activées, chaque étape cumule son nombre
+d'appels, sa durée totale et sa durée maximale; les exceptions qui traversent
+un span sont comptées. Les mesures s'exportent en JSON ou au format texte de
+Prometheus.
+"""
+
+import json
+import os
+import threading
+import time
+from functools import wraps
+from pathlib import Path
+
+PROMETHEUS_PREFIX = 'refs'
+
+
+class _Span:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.record(self.name, time.perf_counter() - self.start)
+        if exc_type is not None:
+            self.metrics.increment(f"errors.{self.name}")
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.started_at = None
+        self._lock = threading.Lock()
+        self.stages = {}    # étape -> [appels, durée totale, durée max] (secondes)
+        self.counters = {}  # nom -> valeur
+
+    def enable(self):
+        if self.started_at is None:
+            self.started_at = time.perf_counter()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+            self.counters.clear()
+            self.started_at = time.perf_counter() if self.enabled else None
+
+    def span(self, name):
+        """Contexte mesurant une étape (sans effet si les mesures sont désactivées)"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, elapsed):
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                self.stages[name] = [1, elapsed, elapsed]
+            else:
+                stage[0] += 1
+                stage[1] += elapsed
+                if elapsed > stage[2]:
+                    stage[2] = elapsed
+
+    def increment(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def elapsed(self):
+        """Temps écoulé depuis l'activation (secondes)"""
+        return time.perf_counter() - self.started_at if self.started_at is not None else 0.0
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+
+    def snapshot(self):
+        """Mesures courantes, étapes triées par durée totale décroissante"""
+        with self._lock:
+            stages = {name: list(values) for name, values in self.stages.items()}
+            counters = dict(self.counters)
+        return {
+            'elapsed_s': round(self.elapsed(), 6),
+            'stages': {
+                name: {
+                    'calls': calls,
+                    'total_ms': round(total * 1000, 3),
+                    'mean_ms': round(total * 1000 / calls, 3),
+                    'max_ms': round(longest * 1000, 3),
+                }
+                for name, (calls, total, longest) in sorted(stages.items(), key=lambda item: -item[1][1])
+            },
+            'counters': counters,
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2, ensure_ascii=False)
+
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX):
+        """Mesures au format texte d'exposition de Prometheus"""
+        with self._lock:
+            stages = sorted(self.stages.items())
+            counters = sorted(self.counters.items())
+
+        lines = [
+            f"# HELP {prefix}_stage_seconds Durée cumulée des étapes",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for name, (calls, total, _) in stages:
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{_escape(name)}"}} {total:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{_escape(name)}"}} {calls}')
+        lines += [
+            f"# HELP {prefix}_stage_seconds_max Durée maximale d'un appel",
+            f"# TYPE {prefix}_stage_seconds_max gauge",
+        ]
+        for name, (_, _, longest) in stages:
+            lines.append(f'{prefix}_stage_seconds_max{{stage="{_escape(name)}"}} {longest:.6f}')
+        lines += [
+            f"# HELP {prefix}_events_total Compteurs (erreurs par étape, requêtes...)",
+            f"# TYPE {prefix}_events_total counter",
+        ]
+        for name, value in counters:
+            lines.append(f'{prefix}_events_total{{name="{_escape(name)}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path):
+        """Écrire les mesures dans un fichier (.prom: Prometheus, sinon JSON), de manière atomique"""
+        path = Path(path)
+        data = self.to_prometheus() if path.suffix in ('.prom', '.txt') else self.to_json() + '\n'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = path.with_name(path.name + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_file, path)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Registre du processus
+metrics = Metrics()
+
+
+def span(name):
+    return metrics.span(name)
+
+
+def timed(name):
+    """Décorateur mesurant chaque appel d'une fonction comme l'étape `name`"""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return function(*args, **kwargs)
+            with _Span(metrics, name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Test simple
+if __name__ == "__main__":
+    metrics.enable()
+    with span('demo'):
+        time.sleep(0.01)
+    print(metrics.to_prometheus())
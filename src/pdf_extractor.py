@@ -0,0 +1,345 @@
+"""
+Extraction du texte et des métadonnées des PDF locaux
+
+Chaque PDF est analysé dans un pool de processus (mémoire bornée par worker):
+dictionnaire /Info, métadonnées XMP, texte des flux de contenu (Tj/TJ, flux
+FlateDecode) et DOI. Les résultats sont rangés dans un cache de contenu indexé
+par l'empreinte SHA-1 du fichier; un manifeste (chemin, taille, mtime) permet de
+ne ni relire ni ré-empreinter les fichiers inchangés.
+
+L'extraction de texte est volontairement simple (pas de dépendance externe):
+les PDF dont les polices utilisent des encodages CID donnent peu de texte, mais
+les métadonnées /Info et XMP restent exploitables.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+from multiprocessing import Pool
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+EXTRACTOR_VERSION = 2
+
+MAX_READ_BYTES = 64 * 1024 * 1024     # Au-delà, seul le début du fichier est lu
+MAX_TEXT_CHARS = 2 * 1024 * 1024      # Texte conservé par document
+WORKER_MEMORY_LIMIT = 1024 * 1024 * 1024
+
+STREAM_PATTERN = re.compile(rb'<<(.{0,2000}?)>>\s*stream\r?\n', re.S)
+TEXT_OPERATOR_PATTERN = re.compile(rb'(\((?:\\.|[^\\)])*\)|\[(?:[^\]]*)\])\s*(?:Tj|TJ|\'|")')
+LITERAL_PATTERN = re.compile(rb'\((?:\\.|[^\\)])*\)')
+PAGE_PATTERN = re.compile(rb'/Type\s*/Page\b')
+INFO_PATTERN = re.compile(rb'/(Title|Author|CreationDate|Subject|Keywords)\s*(\((?:\\.|[^\\)])*\)|<[0-9A-Fa-f\s]*>)')
+DOI_PATTERN = re.compile(r'\b(10\.\d{4,9}/[-._;()/:A-Za-z0-9]+[A-Za-z0-9])')
+YEAR_PATTERN = re.compile(r'\b(19|20)\d{2}\b')
+CREATION_YEAR_PATTERN = re.compile(r'^\s*(?:D:)?((?:19|20)\d{2})')  # Date PDF: D:AAAAMMJJHHmmSS
+XMP_TITLE_PATTERN = re.compile(r'<dc:title>.*?<rdf:li[^>]*>(.*?)</rdf:li>', re.S)
+XMP_CREATOR_PATTERN = re.compile(r'<dc:creator>(.*?)</dc:creator>', re.S)
+XMP_LI_PATTERN = re.compile(r'<rdf:li[^>]*>(.*?)</rdf:li>', re.S)
+XMP_DOI_PATTERN = re.compile(r'<(?:prism:doi|dc:identifier)>(?:doi:)?(10\.[^<]+)</')
+
+ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f',
+           b'(': b'(', b')': b')', b'\\': b'\\'}
+
+
+def _decode_literal(raw):
+    """Décoder une chaîne PDF littérale '(...)' ou hexadécimale '<...>'"""
+    if raw.startswith(b'<'):
+        digits = re.sub(rb'\s', b'', raw[1:-1]).decode('ascii')
+        if len(digits) % 2:
+            digits += '0'  # Chiffre final manquant: 0 implicite (norme PDF)
+        data = bytes.fromhex(digits)
+    else:
+        body = raw[1:-1]
+        data = bytearray()
+        i = 0
+        while i < len(body):
+            c = body[i:i + 1]
+            if c == b'\\' and i + 1 < len(body):
+                nxt = body[i + 1:i + 2]
+                if nxt in ESCAPES:
+                    data += ESCAPES[nxt]
+                    i += 2
+                    continue
+                octal = re.match(rb'[0-7]{1,3}', body[i + 1:i + 4])
+                if octal:
+                    data.append(int(octal.group(), 8) & 0xFF)
+                    i += 1 + len(octal.group())
+                    continue
+                i += 1
+                continue
+            data += c
+            i += 1
+        data = bytes(data)
+
+    if data.startswith(b'\xfe\xff'):
+        return data[2:].decode('utf-16-be', errors='ignore')
+    return data.decode('latin-1')
+
+
+def _iter_streams(raw):
+    """Contenu décodé des flux (FlateDecode ou non compressés)"""
+    for match in STREAM_PATTERN.finditer(raw):
+        header = match.group(1)
+        start = match.end()
+        end = raw.find(b'endstream', start)
+        if end < 0:
+            break
+        data = raw[start:end]
+        if b'/FlateDecode' in header:
+            try:
+                data = zlib.decompressobj().decompress(data, MAX_TEXT_CHARS * 4)
+            except zlib.error:
+                continue
+        elif b'/Filter' in header:
+            continue  # Autres filtres (images, DCT...): pas de texte exploitable
+        yield header, data
+
+
+def _text_from_content(data):
+    """Texte approximatif d'un flux de contenu (opérateurs Tj, TJ, ', \")"""
+    parts = []
+    for match in TEXT_OPERATOR_PATTERN.finditer(data):
+        operand = match.group(1)
+        if operand.startswith(b'['):
+            parts.append(''.join(_decode_literal(s) for s in LITERAL_PATTERN.findall(operand)))
+        else:
+            parts.append(_decode_literal(operand))
+    return ' '.join(parts)
+
+
+def extract_pdf(path, max_bytes=MAX_READ_BYTES):
+    """Extraire métadonnées et texte d'un PDF (retourne un dict sérialisable)"""
+    with open(path, 'rb') as f:
+        raw = f.read(max_bytes)
+
+    info = {}
+    for key, value in INFO_PATTERN.findall(raw):
+        info.setdefault(key.decode('ascii'), _decode_literal(value).strip())
+
+    text_parts = []
+    xmp = ''
+    length = 0
+    for header, data in _iter_streams(raw):
+        if b'/Metadata' in header or b'/XML' in header:
+            xmp = data.decode('utf-8', errors='ignore')
+            continue
+        if length >= MAX_TEXT_CHARS:
+            continue
+        text = _text_from_content(data)
+        if text.strip():
+            text_parts.append(text)
+            length += len(text)
+
+    text = re.sub(r'\s+', ' ', ' '.join(text_parts))[:MAX_TEXT_CHARS]
+
+    title = info.get('Title') or ''
+    authors = [a.strip() for a in re.split(r';|,\s*(?=[A-Z])| and ', info.get('Author', '')) if a.strip()]
+    if xmp:
+        xmp_title = XMP_TITLE_PATTERN.search(xmp)
+        if xmp_title and not title:
+            title = xmp_title.group(1).strip()
+        xmp_creator = XMP_CREATOR_PATTERN.search(xmp)
+        if xmp_creator and not authors:
+            authors = [a.strip() for a in XMP_LI_PATTERN.findall(xmp_creator.group(1)) if a.strip()]
+
+    doi_match = XMP_DOI_PATTERN.search(xmp) if xmp else None
+    if not doi_match:
+        doi_match = DOI_PATTERN.search(text) or DOI_PATTERN.search(raw[:1024 * 1024].decode('latin-1'))
+    doi = doi_match.group(1).rstrip('.') if doi_match else None
+
+    year = None
+    creation = info.get('CreationDate', '')
+    year_match = YEAR_PATTERN.search(text[:5000])
+    if year_match:
+        year = int(year_match.group())
+    else:
+        creation_match = CREATION_YEAR_PATTERN.search(creation)
+        if creation_match:
+            year = int(creation_match.group(1))
+
+    return {
+        'title': title,
+        'authors': authors,
+        'doi': doi,
+        'year': year,
+        'pages': len(PAGE_PATTERN.findall(raw)),
+        'text': text,
+        'truncated': os.path.getsize(path) > max_bytes,
+    }
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """Empreinte SHA-1 du contenu d'un fichier (lecture par blocs)"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Empreintes déjà extraites, transmises à chaque worker à son démarrage
+_known_digests = frozenset()
+
+
+def _init_worker(limit, known_digests):
+    """Borner la mémoire d'un worker (Unix uniquement) et lui transmettre les empreintes connues"""
+    global _known_digests
+    _known_digests = known_digests
+    if resource is not None and limit:
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ValueError, OSError):
+            pass
+
+
+def _extract_job(job):
+    """Tâche exécutée dans un worker: empreinte (si besoin) puis extraction
+
+    Un fichier déplacé ou copié garde son empreinte: son contenu déjà extrait
+    est réutilisé (contenu None, sans erreur).
+    """
+    path, known_hash, force = job
+    try:
+        digest = known_hash or file_hash(path)
+        if digest in _known_digests and not force:
+            return path, digest, None, None
+        return path, digest, extract_pdf(path), None
+    except MemoryError:
+        return path, known_hash, None, "mémoire insuffisante"
+    except Exception as e:
+        return path, known_hash, None, str(e)
+
+
+class ContentCache:
+    """Cache du contenu extrait, indexé par empreinte de fichier"""
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir or os.getenv('CACHE_DIR', 'data/cache'))
+        self.content_dir = self.cache_dir / 'content'
+        self.manifest_file = self.cache_dir / 'content_manifest.json'
+        self._manifest = None  # Chargé au premier accès
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            self._manifest = self._load()
+        return self._manifest
+
+    def _load(self):
+        if self.manifest_file.exists():
+            try:
+                with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                if manifest.get('version') == EXTRACTOR_VERSION:
+                    return manifest
+            except Exception as e:
+                print(f"Erreur lecture du cache de contenu: {e}")
+        # paths: chemin -> [taille, mtime_ns, empreinte]; documents: empreinte -> métadonnées
+        return {'version': EXTRACTOR_VERSION, 'paths': {}, 'documents': {}}
+
+    def save(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.manifest_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        os.replace(tmp_file, self.manifest_file)
+
+    def known_hash(self, path, size, mtime_ns):
+        """Empreinte déjà calculée si le fichier n'a pas changé depuis"""
+        entry = self.manifest['paths'].get(path)
+        if entry and entry[0] == size and entry[1] == mtime_ns:
+            return entry[2]
+        return None
+
+    def lookup(self, path, size=None, mtime_ns=None):
+        """Métadonnées extraites d'un fichier (None si absent ou périmé)"""
+        entry = self.manifest['paths'].get(path)
+        if not entry:
+            return None
+        if (size is not None and entry[0] != size) or (mtime_ns is not None and entry[1] != mtime_ns):
+            return None
+        return self.manifest['documents'].get(entry[2])
+
+    def text(self, digest):
+        """Texte complet extrait d'un document"""
+        text_file = self.content_dir / f"{digest}.txt"
+        if text_file.exists():
+            return text_file.read_text(encoding='utf-8')
+        return ''
+
+    def store(self, path, size, mtime_ns, digest, content):
+        self.manifest['paths'][path] = [size, mtime_ns, digest]
+        if content is None:
+            return
+        self.content_dir.mkdir(parents=True, exist_ok=True)
+        text = content.pop('text', '')
+        (self.content_dir / f"{digest}.txt").write_text(text, encoding='utf-8')
+        content['chars'] = len(text)
+        self.manifest['documents'][digest] = content
+
+    def extract(self, files, workers=None, force=False, memory_limit=WORKER_MEMORY_LIMIT, progress=None):
+        """Extraire le contenu des fichiers PDF qui ont changé
+
+        `files` est une liste d'infos fichiers (path, size, mtime_ns). Retourne
+        un rapport: fichiers traités/ignorés/en erreur, pages, débit, et les
+        chemins dont le contenu a changé.
+        """
+        started = time.monotonic()
+        jobs = []
+        stats = {'files': 0, 'reused': 0, 'skipped': 0, 'errors': 0, 'pages': 0, 'changed': []}
+        signatures = {}
+
+        for file_info in files:
+            path = file_info['path']
+            if not path.lower().endswith('.pdf'):
+                continue
+            size, mtime_ns = file_info.get('size'), file_info.get('mtime_ns')
+            signatures[path] = (size, mtime_ns)
+            digest = self.known_hash(path, size, mtime_ns)
+            if digest and digest in self.manifest['documents'] and not force:
+                stats['skipped'] += 1
+                continue
+            jobs.append((path, digest, force))
+
+        if jobs:
+            known_digests = frozenset(self.manifest['documents'])
+            with Pool(processes=workers, initializer=_init_worker, initargs=(memory_limit, known_digests),
+                      maxtasksperchild=50) as pool:
+                for path, digest, content, error in pool.imap_unordered(_extract_job, jobs, chunksize=4):
+                    size, mtime_ns = signatures[path]
+                    if error:
+                        stats['errors'] += 1
+                        print(f"Erreur extraction de {path}: {error}")
+                        continue
+                    if content is None:
+                        stats['reused'] += 1
+                    else:
+                        stats['files'] += 1
+                        stats['pages'] += content['pages']
+                    self.store(path, size, mtime_ns, digest, content)
+                    stats['changed'].append(path)
+                    if progress:
+                        progress(stats)
+
+        self.save()
+        elapsed = max(time.monotonic() - started, 1e-9)
+        stats['elapsed'] = elapsed
+        stats['files_per_second'] = stats['files'] / elapsed
+        stats['pages_per_second'] = stats['pages'] / elapsed
+        return stats
+
+
+# Test simple
+if __name__ == "__main__":
+    import sys
+    for pdf in sys.argv[1:]:
+        content = extract_pdf(pdf)
+        print(pdf, {k: v for k, v in content.items() if k != 'text'}, content['text'][:200])
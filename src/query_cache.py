@@ -0,0 +1,218 @@
+"""
+Cache des résultats de recherche, invalidé par les générations des sources
+
+Une page de résultats est rangée sous une clé normalisée (sources, mot-clé,
+auteur, année, type, pagination, classement, facettes), avec la génération de chaque source
+interrogée au moment du calcul. Elle n'est resservie que si aucune de ces
+générations n'a changé: une synchronisation qui modifie une source invalide
+exactement les requêtes qui la lisent, et seulement elles.
+
+Deux niveaux, comme pour les listes de fichiers: un LRU en mémoire (utile au
+serveur de requêtes) devant une base SQLite (CACHE_DIR/queries.db) partagée
+entre les processus et bornée à QUERY_CACHE_SIZE entrées, les moins récemment
+lues étant évincées. QUERY_CACHE_SIZE=0 désactive le cache. Les compteurs de
+succès et d'échecs sont conservés dans la base (commande status).
+
+Une lecture n'écrit rien dans la base: les succès, les échecs et les dates
+de lecture sont cumulés en mémoire et écrits en une transaction au plus
+toutes les FLUSH_INTERVAL secondes, avant chaque écriture de page et à la
+sortie du processus.
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+QUERY_CACHE_VERSION = 2
+DEFAULT_SIZE = 1000
+MEMORY_ENTRIES = 256
+FLUSH_INTERVAL = 30.0
+
+
+def query_key(sources, keyword=None, author=None, year=None, limit=None, offset=0, cursor=None,
+              ranking='classic', dedupe=True, doc_type=None, facets=False):
+    """Clé d'une recherche; deux requêtes de même clé ont forcément les mêmes résultats"""
+    normalized = [
+        QUERY_CACHE_VERSION,
+        sorted(sources),
+        keyword.lower() if keyword else None,  # Les correspondances ignorent la casse
+        author.lower() if author else None,
+        str(year).strip() if year else None,
+        limit,
+        offset or 0,
+        cursor or None,
+        ranking,
+        bool(dedupe),
+        doc_type.strip().lower() if doc_type else None,
+        bool(facets),
+    ]
+    return hashlib.sha1(json.dumps(normalized, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class QueryCache:
+    def __init__(self, cache_dir=None, size=None, memory_entries=MEMORY_ENTRIES):
+        self.cache_dir = Path(cache_dir or os.getenv('CACHE_DIR', 'data/cache'))
+        self.db_file = self.cache_dir / 'queries.db'
+        self.size = int(size if size is not None else os.getenv('QUERY_CACHE_SIZE', DEFAULT_SIZE))
+        self.memory_entries = min(memory_entries, self.size)
+
+        # clé -> (générations, page en JSON), du moins au plus récemment lu
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()  # Une connexion SQLite par thread
+
+        # Lectures pas encore écrites dans la base
+        self._counters = {'hits': 0, 'misses': 0}
+        self._accessed = {}  # clé -> date de la dernière lecture
+        self._flushed_at = time.monotonic()
+        if self.enabled:
+            atexit.register(self.flush)
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(str(self.db_file), timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS queries (
+                    key TEXT PRIMARY KEY,
+                    generations TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    accessed_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS queries_accessed ON queries (accessed_at);
+                CREATE TABLE IF NOT EXISTS counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+            """)
+            self._local.connection = connection
+        return connection
+
+    def _count(self, name, key=None):
+        """Compter une lecture (et sa date), écrite dans la base au prochain flush"""
+        with self._lock:
+            self._counters[name] += 1
+            if key is not None:
+                self._accessed[key] = time.time()
+            due = time.monotonic() - self._flushed_at >= FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Écrire les compteurs et les dates de lecture cumulés, en une transaction"""
+        with self._lock:
+            counters = [(name, value) for name, value in self._counters.items() if value]
+            accessed = [(stamp, key) for key, stamp in self._accessed.items()]
+            self._counters = {'hits': 0, 'misses': 0}
+            self._accessed = {}
+            self._flushed_at = time.monotonic()
+        if not counters and not accessed:
+            return
+        try:
+            connection = self._connection()
+            with connection:
+                connection.execute('BEGIN')
+                connection.executemany('UPDATE queries SET accessed_at = ? WHERE key = ?', accessed)
+                connection.executemany(
+                    'INSERT INTO counters VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+                    counters)
+        except (sqlite3.Error, OSError) as e:
+            print(f"Erreur écriture des compteurs du cache de requêtes: {e}")
+
+    # ------------------------------------------------------------------
+    # Lecture / écriture
+    # ------------------------------------------------------------------
+
+    def get(self, key, generations):
+        """Page mise en cache pour cette clé et ces générations (None sinon)"""
+        if not self.enabled:
+            return None
+        stamp = json.dumps(generations, sort_keys=True)
+
+        with self._lock:
+            entry = self._memory.get(key)
+            data = None
+            if entry is not None and entry[0] == stamp:
+                self._memory.move_to_end(key)
+                data = entry[1]
+            elif entry is not None:
+                del self._memory[key]
+
+        if data is None:
+            row = self._connection().execute('SELECT generations, data FROM queries WHERE key = ?', (key,)).fetchone()
+            if row is None or row[0] != stamp:
+                # Entrée périmée (une source a changé): remplacée par le put qui suit, ou évincée
+                self._count('misses')
+                return None
+            data = row[1]
+            self._remember(key, stamp, data)
+
+        self._count('hits', key)
+        return json.loads(data)
+
+    def put(self, key, generations, page):
+        """Enregistrer une page, puis évincer les entrées les moins récemment lues"""
+        if not self.enabled:
+            return
+        stamp = json.dumps(generations, sort_keys=True)
+        data = json.dumps(page, ensure_ascii=False)
+        self.flush()  # Dates de lecture à jour avant l'éviction
+        connection = self._connection()
+        connection.execute('INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?)', (key, stamp, data, time.time()))
+        connection.execute(
+            'DELETE FROM queries WHERE key IN (SELECT key FROM queries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+            (self.size,))
+        self._remember(key, stamp, data)
+
+    def _remember(self, key, stamp, data):
+        if not self.memory_entries:
+            return
+        with self._lock:
+            self._memory[key] = (stamp, data)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def clear(self):
+        """Oublier toutes les pages (index modifié sans changement de génération, ex: extraction)"""
+        with self._lock:
+            self._memory.clear()
+            self._accessed.clear()
+        if self.enabled and self.db_file.exists():
+            self._connection().execute('DELETE FROM queries')
+
+    def stats(self):
+        """Nombre d'entrées et compteurs de succès/échecs (tous processus confondus)"""
+        stats = {'entries': 0, 'size': self.size, 'hits': 0, 'misses': 0}
+        self.flush()
+        if self.db_file.exists():
+            connection = self._connection()
+            stats['entries'] = connection.execute('SELECT COUNT(*) FROM queries').fetchone()[0]
+            stats.update(connection.execute('SELECT name, value FROM counters').fetchall())
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+# Test simple
+if __name__ == "__main__":
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = QueryCache(tmp, size=2)
+        key = query_key(['local'], 'Géométrie')
+        cache.put(key, {'local': 1}, {'results': [], 'total': 0, 'next_cursor': None})
+        print(cache.get(key, {'local': 1}), cache.get(key, {'local': 2}), cache.stats())
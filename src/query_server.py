@@ -0,0 +1,280 @@
+"""
+Serveur de requêtes - index gardé chaud en mémoire entre les recherches
+
+Chaque appel de la commande `search` reconstruit sinon un ReferenceSearch:
+managers, caches et index relus depuis le disque. La commande `serve` garde
+une seule instance en mémoire et répond en JSON, sur une socket Unix (par
+défaut CACHE_DIR/query.sock) ou en HTTP sur 127.0.0.1. L'adresse du serveur
+est écrite dans CACHE_DIR/server.json: la commande `search` l'utilise
+automatiquement quand il répond, et se rabat sinon sur une recherche locale.
+L'index est relu avant une requête si un autre processus l'a réécrit
+(extract, import, dedupe). Un seul serveur par dossier de cache.
+
+Requêtes: POST /search (paramètres de search_page en JSON), GET /health,
+GET /metrics (temps par étape, format texte de Prometheus).
+"""
+
+import http.client
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+SEARCH_PARAMETERS = ('sources', 'keyword', 'author', 'year', 'limit', 'offset', 'cursor', 'ranking', 'dedupe',
+                     'doc_type', 'facets')
+
+
+def _cache_dir(cache_dir=None):
+    return Path(cache_dir or os.getenv('CACHE_DIR', 'data/cache'))
+
+
+def address_file(cache_dir=None):
+    return _cache_dir(cache_dir) / 'server.json'
+
+
+class _QueryHandler(BaseHTTPRequestHandler):
+    server_version = 'RefsQueryServer/1.0'
+
+    def log_message(self, format, *args):
+        pass  # Pas de journal par requête (les clients d'éditeur en envoient beaucoup)
+
+    def _respond(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._respond(200, self.server.app.health())
+        elif self.path == '/metrics':
+            from metrics import metrics
+            data = metrics.to_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._respond(404, {'error': f"Chemin inconnu: {self.path}"})
+
+    def do_POST(self):
+        if self.path != '/search':
+            self._respond(404, {'error': f"Chemin inconnu: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            params = json.loads(self.rfile.read(length) or b'{}')
+            self._respond(200, self.server.app.search(params))
+        except ValueError as e:
+            self._respond(400, {'error': str(e)})
+        except Exception as e:
+            self._respond(500, {'error': str(e)})
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class QueryServer:
+    def __init__(self, searcher, socket_path=None, port=None, host='127.0.0.1', cache_dir=None):
+        self.searcher = searcher
+        self.cache_dir = _cache_dir(cache_dir)
+        self.socket_path = None if port else Path(socket_path or self.cache_dir / 'query.sock')
+        self.port = port
+        self.host = host
+        self.started_at = time.time()
+        self.queries = 0
+        self._lock = threading.Lock()  # L'index n'est modifié que par une requête à la fois
+        self._server = None
+
+    def search(self, params):
+        unknown = set(params) - set(SEARCH_PARAMETERS)
+        if unknown:
+            raise ValueError(f"Paramètres inconnus: {', '.join(sorted(unknown))}")
+        with self._lock:
+            self.queries += 1
+            return self.searcher.search_page(**params)
+
+    def health(self):
+        return {
+            'status': 'ok',
+            'pid': os.getpid(),
+            'uptime': round(time.time() - self.started_at, 1),
+            'queries': self.queries,
+            'documents': self.searcher.index.count(),
+        }
+
+    def address(self):
+        if self.socket_path:
+            return {'transport': 'unix', 'path': str(self.socket_path), 'pid': os.getpid()}
+        return {'transport': 'http', 'host': self.host, 'port': self._server.server_address[1], 'pid': os.getpid()}
+
+    def start(self):
+        """Ouvrir la socket et publier l'adresse du serveur
+
+        Refuse de démarrer (RuntimeError) si un serveur répond déjà à
+        l'adresse publiée ou sur la socket: seule une socket morte est remplacée.
+        """
+        running = server_health(self.cache_dir)
+        if running is not None:
+            raise RuntimeError(f"Un serveur de requêtes répond déjà (pid {running.get('pid')})")
+        if self.socket_path:
+            self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+            if self.socket_path.exists():
+                if _socket_answers(self.socket_path):
+                    raise RuntimeError(f"Un serveur de requêtes écoute déjà sur {self.socket_path}")
+                self.socket_path.unlink()  # Socket laissée par un serveur arrêté
+            self._server = _UnixHTTPServer(str(self.socket_path), _QueryHandler)
+        else:
+            self._server = ThreadingHTTPServer((self.host, self.port), _QueryHandler)
+            self._server.daemon_threads = True
+        self._server.app = self
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = address_file(self.cache_dir).with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.address(), f)
+        os.replace(tmp_file, address_file(self.cache_dir))
+        return self.address()
+
+    def serve_forever(self):
+        try:
+            self._server.serve_forever()
+        finally:
+            self.stop()
+
+    def shutdown(self):
+        """Arrêter serve_forever depuis un autre thread"""
+        if self._server is not None:
+            self._server.shutdown()
+
+    def stop(self):
+        """Fermer la socket et retirer l'adresse publiée"""
+        if self._server is None:
+            return
+        self._server.server_close()
+        self._server = None
+        try:
+            with open(address_file(self.cache_dir), 'r', encoding='utf-8') as f:
+                if json.load(f).get('pid') == os.getpid():
+                    address_file(self.cache_dir).unlink()
+        except (OSError, ValueError):
+            pass
+        if self.socket_path and self.socket_path.exists():
+            self.socket_path.unlink()
+
+
+# ----------------------------------------------------------------------
+# Client
+# ----------------------------------------------------------------------
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+def _socket_answers(path, timeout=1):
+    """Vrai si un processus accepte les connexions sur la socket Unix `path`"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(path))
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def _connect(cache_dir=None, timeout=10):
+    """Connexion au serveur publié (None si aucun serveur n'est annoncé)"""
+    try:
+        with open(address_file(cache_dir), 'r', encoding='utf-8') as f:
+            address = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if address.get('transport') == 'unix':
+        return _UnixHTTPConnection(address['path'], timeout)
+    return http.client.HTTPConnection(address['host'], address['port'], timeout=timeout)
+
+
+def _request(method, path, body=None, cache_dir=None, timeout=10):
+    connection = _connect(cache_dir, timeout)
+    if connection is None:
+        return None
+    try:
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        connection.request(method, path, body=data, headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        payload = json.loads(response.read() or b'{}')
+    except (OSError, http.client.HTTPException, ValueError):
+        return None  # Serveur arrêté ou injoignable: recherche locale
+    finally:
+        connection.close()
+
+    if response.status != 200:
+        raise ValueError(payload.get('error', f"Erreur du serveur ({response.status})"))
+    return payload
+
+
+def remote_search(cache_dir=None, timeout=60, **params):
+    """Page de résultats calculée par le serveur (None si aucun serveur ne répond)"""
+    return _request('POST', '/search', params, cache_dir, timeout)
+
+
+def server_health(cache_dir=None, timeout=2):
+    return _request('GET', '/health', cache_dir=cache_dir, timeout=timeout)
+
+
+# Latence à froid (un processus par recherche) contre latence à chaud (serveur)
+if __name__ == "__main__":
+    import statistics
+    import subprocess
+    import sys
+
+    main_script = str(Path(__file__).with_name('main.py'))
+    runs = int(os.getenv('BENCH_RUNS', '10'))
+    query = ['search', '--keyword', os.getenv('BENCH_KEYWORD', 'geometry'), '--limit', '10']
+
+    def timed(command):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        return time.perf_counter() - start
+
+    cold = [timed([sys.executable, main_script] + query + ['--no-server']) for _ in range(runs)]
+
+    server = subprocess.Popen([sys.executable, main_script, 'serve'],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(100):
+            if server_health():
+                break
+            time.sleep(0.1)
+        warm_cli = [timed([sys.executable, main_script] + query) for _ in range(runs)]
+        warm_query = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            remote_search(keyword=query[2], limit=10)
+            warm_query.append(time.perf_counter() - start)
+    finally:
+        server.terminate()
+        server.wait()
+
+    for label, samples in (('CLI sans serveur', cold), ('CLI avec serveur', warm_cli),
+                           ('Requête directe au serveur', warm_query)):
+        print(f"{label:28} médiane {statistics.median(samples) * 1000:8.1f} ms  "
+              f"min {min(samples) * 1000:8.1f} ms")
@@ -0,0 +1,218 @@
+"""
+Classement plein texte: normalisation, BM25 et tolérance aux fautes de frappe
+
+Les textes sont mis en minuscules et débarrassés de leurs accents (les noms de
+fichiers sont souvent en français), puis découpés en tokens. Le score BM25 est
+calculé terme par terme sur les postings de l'index (champs titre et auteur),
+donc proportionnellement aux documents qui contiennent les termes de la
+requête. Chaque terme est étendu aux termes qu'il préfixe et, s'il est absent
+du vocabulaire, aux termes proches (distance d'édition 1 ou 2, via un index de
+trigrammes), avec un poids réduit.
+"""
+
+import heapq
+import math
+import re
+import unicodedata
+
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+# Caractères que la décomposition Unicode ne sépare pas
+LIGATURES = str.maketrans({'œ': 'oe', 'Œ': 'oe', 'æ': 'ae', 'Æ': 'ae', 'ß': 'ss'})
+
+# Paramètres BM25 et poids des champs
+K1 = 1.2
+B = 0.75
+FIELD_WEIGHTS = {'t': 1.0, 'a': 0.8}
+
+# Poids des termes étendus par rapport au terme exact
+PREFIX_WEIGHT = 0.5
+FUZZY_WEIGHTS = {1: 0.6, 2: 0.35}
+MAX_EXPANSIONS = 20
+MAX_FUZZY_CHECKS = 200
+
+
+def fold_accents(text):
+    """Minuscules sans accents: 'Géométrie Kählérienne' -> 'geometrie kahlerienne'"""
+    text = str(text)
+    if text.isascii():
+        return text.lower()
+    text = text.translate(LIGATURES)
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    """Découper un texte en tokens normalisés (sans accents, minuscules, alphanumériques)"""
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(fold_accents(text))
+
+
+def max_distance(token):
+    """Distance d'édition tolérée selon la longueur du token"""
+    if len(token) >= 8:
+        return 2
+    if len(token) >= 4:
+        return 1
+    return 0
+
+
+def bounded_levenshtein(a, b, limit):
+    """Distance d'édition entre a et b, ou limit + 1 si elle dépasse limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, cb in enumerate(b, 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            current.append(value)
+            row_min = min(row_min, value)
+        if row_min > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyVocabulary:
+    """Index de trigrammes sur les tokens titre/auteur, tenu à jour terme par terme
+
+    Les listes sont séparées par longueur de token: seuls les tokens dont la
+    longueur est compatible avec la distance tolérée sont examinés. L'index
+    n'est reconstruit en entier que lorsque le vocabulaire de l'index est
+    remplacé (chargement, vidage); sinon chaque terme ajouté ou supprimé met
+    à jour ses seuls trigrammes.
+    """
+
+    FIELDS = ('t:', 'a:')
+
+    def __init__(self):
+        self.epoch = None
+        self.grams = {}   # (trigramme, longueur) -> tokens
+        self.tokens = {}  # token -> nombre de champs (titre, auteur) qui le contiennent
+        self._watched = None
+
+    def refresh(self, index):
+        if self._watched is not index:
+            index.watch_vocabulary(self.update)
+            self._watched = index
+            self.epoch = None
+        if self.epoch == index.vocabulary_epoch:
+            return
+        self.tokens = {}
+        self.grams = {}
+        for term in index.postings:
+            self.update(term, True, building=True)
+        self.epoch = index.vocabulary_epoch
+
+    def update(self, term, added, building=False):
+        """Prendre en compte un terme ajouté ou supprimé de l'index"""
+        if (self.epoch is None and not building) or term[:2] not in self.FIELDS:
+            return
+        token = term[2:]
+        count = self.tokens.get(token, 0)
+        if added:
+            self.tokens[token] = count + 1
+            if count:
+                return
+            for gram in trigrams(token):
+                self.grams.setdefault((gram, len(token)), set()).add(token)
+        elif count > 1:
+            self.tokens[token] = count - 1
+        elif count:
+            del self.tokens[token]
+            for gram in trigrams(token):
+                key = (gram, len(token))
+                tokens = self.grams.get(key)
+                if tokens is not None:
+                    tokens.discard(token)
+                    if not tokens:
+                        del self.grams[key]
+
+    def neighbours(self, token):
+        """Tokens du vocabulaire à distance d'édition ≤ max_distance(token)"""
+        limit = max_distance(token)
+        if not limit:
+            return []
+
+        # Chaque édition détruit au plus 3 trigrammes
+        grams = trigrams(token)
+        shared = {}
+        for length in range(len(token) - limit, len(token) + limit + 1):
+            for gram in grams:
+                for candidate in self.grams.get((gram, length), ()):
+                    shared[candidate] = shared.get(candidate, 0) + 1
+
+        # Vérifier en priorité les candidats partageant le plus de trigrammes
+        needed = len(grams) - 3 * limit
+        candidates = [(count, candidate) for candidate, count in shared.items()
+                      if count >= needed and candidate != token]
+        matches = []
+        for count, candidate in heapq.nlargest(MAX_FUZZY_CHECKS, candidates):
+            distance = bounded_levenshtein(token, candidate, limit)
+            if distance <= limit:
+                matches.append((candidate, distance))
+        return matches
+
+
+class BM25Ranker:
+    def __init__(self, index):
+        self.index = index
+        self.vocabulary = FuzzyVocabulary()
+
+    def expand(self, token):
+        """Termes (token, poids) associés à un token de requête"""
+        self.vocabulary.refresh(self.index)
+        expansions = {}
+        if token in self.vocabulary.tokens:
+            expansions[token] = 1.0
+        else:
+            # Terme inconnu: probablement une faute de frappe
+            for candidate, distance in self.vocabulary.neighbours(token):
+                expansions[candidate] = max(expansions.get(candidate, 0), FUZZY_WEIGHTS[distance])
+
+        if len(token) >= 3:
+            for field in FIELD_WEIGHTS:
+                for term in self.index.prefix_terms(field, token, limit=MAX_EXPANSIONS):
+                    candidate = term[2:]
+                    if candidate != token:
+                        expansions[candidate] = max(expansions.get(candidate, 0), PREFIX_WEIGHT)
+
+        return sorted(expansions.items(), key=lambda item: -item[1])[:MAX_EXPANSIONS]
+
+    def score(self, query, allowed):
+        """Scores BM25 (score, doc_id) des documents de `allowed` qui contiennent un terme de la requête"""
+        index = self.index
+        store = index.store
+        total_docs = max(len(store), 1)
+        lengths = {'t': store.title_lengths, 'a': store.author_lengths}
+        average = {field: max(store.average_length(field), 1.0) for field in FIELD_WEIGHTS}
+
+        scores = {}
+        for token in tokenize(query):
+            for term, weight in self.expand(token):
+                for field, field_weight in FIELD_WEIGHTS.items():
+                    postings = index.postings.get(f"{field}:{term}")
+                    if not postings:
+                        continue
+
+                    df = len(postings)
+                    idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+                    term_weight = idf * weight * field_weight * (K1 + 1)
+                    field_lengths = lengths[field]
+                    norm = K1 * (1 - B)
+                    slope = K1 * B / average[field]
+
+                    # Champs courts: fréquence du terme binaire (tf = 1)
+                    for doc_id in postings & allowed:
+                        scores[doc_id] = scores.get(doc_id, 0.0) + term_weight / (1 + norm + slope * field_lengths[doc_id])
+
+        return [(round(score, 6), doc_id) for doc_id, score in scores.items()]
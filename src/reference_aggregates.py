@@ -0,0 +1,77 @@
+"""
+Agrégats matérialisés sur l'index (comptes par source, année, auteur, type)
+
+Les compteurs sont tenus à jour à chaque ajout ou suppression de document dans
+l'index, source par source. Les statistiques se lisent donc en O(nombre de
+groupes), sans parcourir ni trier les références.
+"""
+
+from collections import Counter
+
+DIMENSIONS = ('source', 'year', 'author', 'type')
+
+
+class ReferenceAggregates:
+    def __init__(self):
+        # source -> dimension -> Counter(valeur -> nombre de références)
+        self.counts = {}
+
+    def _source_counts(self, source):
+        counts = self.counts.get(source)
+        if counts is None:
+            counts = self.counts[source] = {dimension: Counter() for dimension in DIMENSIONS}
+        return counts
+
+    def add(self, source, reference):
+        counts = self._source_counts(source)
+        for dimension, value in self._values(reference):
+            counts[dimension][value] += 1
+
+    def remove(self, source, reference):
+        counts = self._source_counts(source)
+        for dimension, value in self._values(reference):
+            counter = counts[dimension]
+            counter[value] -= 1
+            if counter[value] <= 0:
+                del counter[value]
+
+    @staticmethod
+    def _values(reference):
+        return (
+            ('source', reference.get('source') or ''),
+            ('year', reference.get('year') or 0),
+            ('author', reference.get('author') or ''),
+            ('type', reference.get('type') or ''),
+        )
+
+    def merged(self, sources, dimension):
+        """Compteur d'une dimension, fusionné sur plusieurs sources"""
+        total = Counter()
+        for source in sources:
+            counts = self.counts.get(source)
+            if counts:
+                total.update(counts[dimension])
+        return total
+
+    def total(self, sources):
+        return sum(sum(self.counts[source]['source'].values()) for source in sources if source in self.counts)
+
+    # ------------------------------------------------------------------
+    # Persistance
+    # ------------------------------------------------------------------
+
+    def to_dict(self):
+        return {
+            source: {dimension: list(counter.items()) for dimension, counter in counts.items()}
+            for source, counts in self.counts.items()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        aggregates = cls()
+        for source, counts in data.items():
+            aggregates.counts[source] = {
+                dimension: Counter(dict(counts[dimension]))
+                for dimension in DIMENSIONS
+            }
+        return aggregates
@@ -2,8 +2,12 @@
 Module de recherche unifiée dans toutes les sources de références
 """
 
+import base64
+import heapq
+import itertools
+import json
 import os
-import re
+import threading
 from datetime import datetime
 from pathlib import Path
 
@@ -12,14 +16,49 @@ try:
     from google_drive_manager import GoogleDriveManager
     from github_manager import GitHubManager  
     from local_files_manager import LocalFilesManager
+    from bibtex_manager import BibTeXManager, link_pdf
 except ImportError as e:
     print(f"Erreur d'import dans reference_search: {e}")
 
+from content_hashes import ContentHashCache, find_duplicates
+from facet_index import parse_year_range
+from filename_parser import FilenameParseCache
+from metrics import metrics, span, timed
+from pdf_extractor import ContentCache
+from query_cache import QueryCache, query_key
+from ranking import BM25Ranker, fold_accents
+from search_index import SearchIndex, index_file
+from source_cache import file_stamp
+from source_fanout import fan_out
+
+RANKINGS = ('classic', 'bm25')
+
+# Copie retenue comme référence canonique d'un groupe de doublons
+SOURCE_PRIORITY = {'Local': 0, 'Google Drive': 1, 'GitHub': 2}
+
+def encode_cursor(sort_key):
+    """Curseur opaque de pagination à partir d'une clé de tri"""
+    return base64.urlsafe_b64encode(json.dumps(sort_key, ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Clé de tri encodée dans un curseur"""
+    try:
+        return tuple(json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')))
+    except Exception:
+        raise ValueError(f"Curseur invalide: {cursor}")
+
+
 class ReferenceSearch:
-    def __init__(self):
+    def __init__(self, background_refresh=False):
         self.drive_manager = None
         self.github_manager = None
         self.local_manager = None
+        self.bibtex_manager = None
+        
+        # Empreintes des fichiers locaux (détection des doublons entre sources),
+        # partagées avec le manager local qui oublie les fichiers supprimés
+        self.hash_cache = ContentHashCache()
         
         # Initialiser les managers disponibles
         try:
@@ -33,41 +72,180 @@ class ReferenceSearch:
             print(f"GitHub non disponible: {e}")
         
         try:
-            self.local_manager = LocalFilesManager()
+            self.local_manager = LocalFilesManager(hash_cache=self.hash_cache)
         except Exception as e:
             print(f"Gestionnaire local non disponible: {e}")
+        
+        try:
+            self.bibtex_manager = BibTeXManager()
+        except Exception as e:
+            print(f"BibTeX non disponible: {e}")
+        
+        # Index inversé persistant, mis à jour à chaque synchronisation (chargé au premier accès:
+        # une recherche servie par le cache de requêtes ne le lit pas)
+        self._index = None
+        self._ranker = None
+        # Pages de résultats déjà calculées, valables tant que leurs sources n'ont pas changé
+        self.query_cache = QueryCache()
+        # Analyses des noms de fichiers, partagées entre les processus
+        self.filename_cache = FilenameParseCache()
+        # Contenu extrait des PDF locaux (chargé à la première conversion)
+        self.content_cache = ContentCache()
+        # PDF locaux par nom et par DOI, pour relier les entrées BibTeX
+        self._pdf_links = None
+        self._pdf_links_stamp = None
+        # Processus longs (serve): les sources expirées sont resynchronisées dans un thread
+        self.background_refresh = background_refresh
+        self._background = {}
+        self._background_lock = threading.Lock()
+    
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = SearchIndex()
+        return self._index
     
-    def search(self, sources='all', keyword=None, author=None, year=None, limit=50):
+    @property
+    def ranker(self):
+        if self._ranker is None:
+            self._ranker = BM25Ranker(self.index)
+        return self._ranker
+    
+    def search(self, sources='all', keyword=None, author=None, year=None, limit=50, offset=0, cursor=None,
+               ranking='classic', dedupe=True, doc_type=None):
         """Recherche unifiée dans toutes les sources"""
-        results = []
+        return self.search_page(sources, keyword, author, year, limit, offset, cursor, ranking, dedupe,
+                                doc_type)['results']
+    
+    @timed('search')
+    def search_page(self, sources='all', keyword=None, author=None, year=None, limit=50, offset=0, cursor=None,
+                    ranking='classic', dedupe=True, doc_type=None, facets=False):
+        """Recherche paginée: retourne les résultats, le total et le curseur de la page suivante
+
+        `cursor` (issu d'une page précédente) reprend juste après le dernier
+        résultat affiché; `offset` saute un nombre de résultats. Seuls les
+        `offset + limit` meilleurs résultats sont sélectionnés (tas), sans
+        trier l'ensemble des correspondances.
         
-        # Déterminer les sources à rechercher
-        search_sources = self._determine_sources(sources)
+        `ranking='bm25'` classe le mot-clé par BM25 (accents ignorés, fautes
+        de frappe tolérées); `'classic'` garde le score par sous-chaînes.
+        
+        Avec `dedupe`, les copies d'un même fichier (Drive, GitHub, local)
+        forment un seul résultat, avec la liste de ses emplacements.
+        
+        `year` accepte un intervalle ('2015-2020', '2015-', '-2020') et
+        `doc_type` filtre par type (pdf, article...). Avec `facets`, la page
+        contient les comptes par source, type, année et auteur de l'ensemble
+        des résultats.
+        """
+        if ranking not in RANKINGS:
+            raise ValueError(f"Classement inconnu: {ranking}")
+
+        # Page déjà calculée pour ces générations de sources (sauf source à resynchroniser)
+        key = None
+        if self.query_cache.enabled:
+            search_sources = self._determine_sources(sources)
+            key = query_key(search_sources, keyword, author, year, limit, offset, cursor, ranking, dedupe,
+                            doc_type, facets)
+            if not any(self._is_stale(source) for source in search_sources):
+                with span('query_cache'):
+                    page = self.query_cache.get(key, self._generations(search_sources))
+                if page is not None:
+                    metrics.increment('query_cache.hits')
+                    return page
+            metrics.increment('query_cache.misses')
+        
+        # Les sources lentes ou en erreur gardent leur dernier état indexé
+        search_sources = self._refresh(sources)
+        
+        if ranking == 'bm25' and keyword:
+            # Auteur et année filtrent, le mot-clé classe
+            with span('lookup'):
+                allowed = self.index.lookup(search_sources, None, author, year, doc_type)
+            with span('bm25'):
+                filtered_results = self.ranker.score(keyword, allowed)
+        else:
+            # Seuls les documents présents dans les postings correspondants sont lus
+            with span('lookup'):
+                doc_ids = self.index.lookup(search_sources, keyword, author, year, doc_type)
+            
+            # Filtrer et trier sur les colonnes; seuls les résultats retenus deviennent des dicts
+            filtered_results = self._filter_results(doc_ids, keyword, author, year)
+        if dedupe:
+            filtered_results = self.collapse_duplicates(filtered_results)
+        total = len(filtered_results)
         
-        for source in search_sources:
-            try:
-                source_results = self._search_in_source(source, keyword, author, year)
-                results.extend(source_results)
-            except Exception as e:
-                print(f"Erreur lors de la recherche dans {source}: {e}")
+        after = decode_cursor(cursor) if cursor else None
+        sorted_results = self._sort_results(filtered_results, limit=offset + limit + 1, after=after)
+        page = sorted_results[offset:offset + limit]
+        
+        next_cursor = None
+        if len(sorted_results) > offset + limit and page:
+            next_cursor = encode_cursor(self._sort_key(*page[-1]))
+        
+        with span('materialize'):
+            results = [self.materialize(score, doc_id, dedupe) for score, doc_id in page]
+        page = {
+            'results': results,
+            'total': total,
+            'next_cursor': next_cursor,
+        }
+        if facets:
+            with span('facets'):
+                page['facets'] = self.index.facets.counts((doc_id for _, doc_id in filtered_results),
+                                                          self.index.store)
+        if key is not None:
+            generations = self._generations(search_sources)
+            if None not in generations.values():
+                self.query_cache.put(key, generations, page)
+        return page
+    
+    def iter_search(self, sources='all', keyword=None, author=None, year=None, ranking='classic', dedupe=True,
+                    ordered=True, limit=None, doc_type=None):
+        """Recherche en flux: générateur de résultats, matérialisés un par un
+
+        Aucun dict n'est construit à l'avance: la mémoire ne dépend pas du
+        nombre de résultats lus. Avec `ordered`, l'ordre est celui de
+        search_page, ce qui demande de trier les couples (score, doc_id) des
+        correspondances; sans `ordered`, les résultats sortent dans l'ordre de
+        l'index au fil du filtrage (seules les copies de doublons sont gardées
+        jusqu'à la fin pour retenir la copie prioritaire).
+        """
+        if ranking not in RANKINGS:
+            raise ValueError(f"Classement inconnu: {ranking}")
+        
+        search_sources = self._refresh(sources)
+        
+        if ranking == 'bm25' and keyword:
+            allowed = self.index.lookup(search_sources, None, author, year, doc_type)
+            matches = self.ranker.score(keyword, allowed)
+        else:
+            doc_ids = self.index.lookup(search_sources, keyword, author, year, doc_type)
+            matches = self._iter_filtered(doc_ids, keyword, author, year)
+        if dedupe:
+            matches = self._iter_collapsed(matches)
         
-        # Filtrer et trier les résultats
-        filtered_results = self._filter_results(results, keyword, author, year)
-        sorted_results = self._sort_results(filtered_results)
+        if ordered:
+            matches = self._sort_results(matches, limit=limit)
+        elif limit is not None:
+            matches = itertools.islice(matches, limit)
         
-        return sorted_results[:limit]
+        for score, doc_id in matches:
+            yield self.materialize(score, doc_id, dedupe)
     
     def _determine_sources(self, sources):
         """Déterminer quelles sources rechercher"""
         available_sources = []
         
         if sources == 'all':
-            if self.drive_manager:
+            if self.drive_manager and getattr(self.drive_manager, 'folder_id', True):
                 available_sources.append('drive')
-            if self.github_manager:
+            if self.github_manager and getattr(self.github_manager, 'repo', True):
                 available_sources.append('github')
             if self.local_manager:
                 available_sources.append('local')
+            if self.bibtex_manager and self.bibtex_manager.bib_paths:
+                available_sources.append('bibtex')
         else:
             if sources == 'drive' and self.drive_manager:
                 available_sources.append('drive')
@@ -75,54 +253,304 @@ class ReferenceSearch:
                 available_sources.append('github')
             elif sources == 'local' and self.local_manager:
                 available_sources.append('local')
+            elif sources == 'bibtex' and self.bibtex_manager:
+                available_sources.append('bibtex')
         
         return available_sources
     
+    def _get_manager(self, source):
+        """Manager associé à une source"""
+        return {
+            'drive': self.drive_manager,
+            'github': self.github_manager,
+            'local': self.local_manager,
+            'bibtex': self.bibtex_manager,
+        }.get(source)
+    
+    def _source_stamp(self, source):
+        """Marqueur de la dernière synchronisation d'une source (None si inconnu)"""
+        manager = self._get_manager(source)
+        try:
+            if hasattr(manager, 'generation'):
+                return manager.generation()
+            if source == 'local':
+                return manager.last_scan()
+            return manager.last_sync()
+        except Exception:
+            return None
+    
+    def _generations(self, search_sources):
+        """Générations des sources interrogées (clé de validité du cache de requêtes)
+
+        La version du fichier de l'index en fait partie: une extraction ou un
+        calcul de doublons dans un autre processus change les pages sans
+        changer les générations des sources.
+        """
+        generations = {source: self._source_stamp(source) for source in search_sources}
+        generations['index'] = file_stamp(self._index.index_file if self._index else index_file())
+        return generations
+    
+    def _is_stale(self, source):
+        manager = self._get_manager(source)
+        return hasattr(manager, 'is_stale') and manager.is_stale()
+    
+    def refresh_sources(self, search_sources, timeout=None):
+        """Rafraîchir les sources en parallèle, en produisant (source, erreur) dès que chacune termine
+
+        L'index est d'abord relu s'il a été réécrit par un autre processus
+        (extract, import, dedupe); les changements des sources sont ensuite
+        appliqués et sauvegardés sous verrou.
+        """
+        self.index.reload_if_changed()
+        tasks = {source: (lambda source=source: self._load_source(source)) for source in search_sources}
+        
+        changes = []
+        for source, loaded, error in fan_out(tasks, timeout=timeout):
+            if error is None and loaded is not None:
+                changes.append((source, loaded))
+            yield source, error
+        
+        # L'index n'est modifié que depuis le thread appelant.
+        # Les doublons ne sont pas recalculés ici (empreintes de fichiers entiers):
+        # la recherche garde les groupes du dernier update_duplicates
+        if changes:
+            with self.index.locked():
+                for source, (kind, results, removed, stamp) in changes:
+                    if self.index.is_fresh(source, stamp):
+                        continue  # Déjà appliqué par un autre processus
+                    with span(f"index.{kind}.{source}"):
+                        if kind == 'delta':
+                            self.index.apply_delta(source, results, [f"{source}:{key}" for key in removed],
+                                                   stamp=stamp)
+                        else:
+                            self.index.update_source(source, results, stamp=stamp)
+                with span('index.save'):
+                    self.index.save()
+        self.filename_cache.save()
+    
+    def prune_filename_cache(self):
+        """Oublier les analyses de noms de fichiers absents de toutes les sources
+
+        Retourne le nombre de noms oubliés.
+        """
+        names = set()
+        for source in self._determine_sources('all'):
+            if source == 'bibtex':
+                continue  # Les entrées BibTeX n'ont pas de nom de fichier à analyser
+            names.update(f.get('name', '') for f in self._get_manager(source).get_cached_files() or [])
+        return self.filename_cache.prune(names)
+    
+    def update_duplicates(self):
+        """Recalculer les doublons si l'index a changé depuis le dernier calcul (sync, dedupe, extract)
+
+        Les documents ajoutés depuis ne sont regroupés qu'au calcul suivant;
+        un document supprimé ou modifié quitte aussitôt son groupe.
+        """
+        with self.index.locked():
+            if self.index.duplicates_stale():
+                self.deduplicate()
+                with span('index.save'):
+                    self.index.save()
+        return self.index.duplicates
+    
+    @timed('deduplicate')
+    def deduplicate(self):
+        """Recalculer les groupes de doublons de l'index (taille, puis empreintes)"""
+        try:
+            clusters = find_duplicates(self.index.dedupe_candidates(), self.hash_cache)
+            changed = sorted(map(sorted, clusters)) != sorted(map(sorted, self.index.duplicates))
+            self.index.set_duplicates(clusters, self.index.revision)
+            self.hash_cache.save()
+            if changed:
+                # Les générations des sources n'ont pas changé: les pages en cache ne le verraient pas
+                self.query_cache.clear()
+        except Exception as e:
+            print(f"Erreur détection des doublons: {e}")
+        return self.index.duplicates
+    
+    @timed('collapse_duplicates')
+    def collapse_duplicates(self, results):
+        """Un seul (score, doc_id) par groupe de copies: meilleur score, copie prioritaire"""
+        if not self.index.cluster_of:
+            return results
+        return list(self._iter_collapsed(results))
+    
+    def _iter_collapsed(self, results):
+        """Version générateur: les résultats sans copie passent tels quels, les groupes sortent à la fin"""
+        cluster_of = self.index.cluster_of
+        groups = {}
+        for score, doc_id in results:
+            cluster = cluster_of.get(doc_id)
+            if cluster is None:
+                yield score, doc_id
+            else:
+                groups.setdefault(cluster[0], []).append((score, doc_id))
+        
+        for members in groups.values():
+            canonical = min(members, key=lambda item: (self._source_priority(item[1]), item[1]))[1]
+            yield max(score for score, _ in members), canonical
+    
+    def _source_priority(self, doc_id):
+        store = self.index.store
+        return SOURCE_PRIORITY.get(store.pool[store.sources[doc_id]], len(SOURCE_PRIORITY))
+    
+    def materialize(self, score, doc_id, dedupe=True):
+        """Résultat au format dict unifié, avec les emplacements de ses copies"""
+        result = self.index.get(doc_id, score)
+        cluster = self.index.cluster_of.get(doc_id) if dedupe else None
+        if cluster:
+            result['locations'] = [
+                {'source': copy['source'], 'path': copy['path']}
+                for copy in (self.index.get(member) for member in
+                             sorted(cluster, key=lambda member: (self._source_priority(member), member)))
+            ]
+        return result
+    
+    def _load_source(self, source):
+        """Charger une source si elle a changé (None si l'index est à jour)
+
+        Si le manager sait fournir le delta depuis l'état indexé, seuls les
+        fichiers ajoutés ou modifiés sont convertis. La recherche ne
+        synchronise jamais: elle sert le dernier état publié (par sync, add,
+        import ou un autre processus). Avec `background_refresh`, une source
+        expirée est resynchronisée dans un thread; la recherche suivante voit
+        la nouvelle génération.
+        """
+        manager = self._get_manager(source)
+        if self.background_refresh and self._is_stale(source):
+            self.refresh_in_background(source)
+        
+        stamp = self._source_stamp(source)
+        if self.index.is_fresh(source, stamp):
+            return None
+        
+        indexed_stamp = self.index.stamps.get(source)
+        if indexed_stamp is not None and hasattr(manager, 'get_changes'):
+            changes = manager.get_changes(indexed_stamp)
+            if changes is not None:
+                files, removed = changes
+                with span(f"convert_delta.{source}"):
+                    results = [r for r in (self._convert_file(source, f) for f in files) if r]
+                return 'delta', results, removed, stamp
+        
+        with span(f"search_in_source.{source}"):
+            results = self._search_in_source(source, None, None, None)
+        # Le marqueur peut avoir changé si une synchronisation vient d'avoir lieu
+        return 'full', results, [], self._source_stamp(source)
+    
+    def refresh_in_background(self, source):
+        """Resynchroniser une source dans un thread (un seul à la fois par source); retourne le thread"""
+        with self._background_lock:
+            thread = self._background.get(source)
+            if thread is None or not thread.is_alive():
+                thread = threading.Thread(target=self._background_sync, args=(source,),
+                                          name=f"sync-{source}", daemon=True)
+                self._background[source] = thread
+                thread.start()
+            return thread
+    
+    def _background_sync(self, source):
+        # Manager distinct: celui de la recherche n'est lu que par le thread appelant,
+        # il relit le manifeste quand la nouvelle génération est publiée
+        try:
+            manager = type(self._get_manager(source))()
+            if source == 'local':
+                manager.scan()
+            else:
+                manager.sync()
+        except Exception as e:
+            metrics.increment(f"errors.background_sync.{source}")
+            print(f"Erreur synchronisation en arrière-plan de {source}: {e}")
+    
+    def reindex_files(self, source, files):
+        """Réindexer des fichiers précis d'une source (ex: après extraction du contenu)"""
+        results = [r for r in (self._convert_file(source, f) for f in files) if r]
+        with self.index.locked():
+            counts = self.index.apply_delta(source, results)
+            self.index.save()
+        # Les générations n'ont pas changé: les pages en cache ne le verraient pas
+        self.query_cache.clear()
+        return counts
+    
+    def import_files(self, items, link=False, workers=None, batch_size=None, extract=True, progress=None):
+        """Importer des fichiers dans le dossier local, puis extraire et indexer chaque lot
+
+        Les copies et empreintes (threads) continuent pendant que le lot
+        précédent est extrait (processus) et indexé. Retourne le rapport de
+        l'import, complété par le nombre de pages extraites.
+        """
+        from local_files_manager import IMPORT_BATCH, IMPORT_WORKERS
+
+        manager = self.local_manager
+        if manager.refs_path.is_dir():
+            self._refresh('local')  # Index à jour avant d'y ajouter les lots
+
+        stats = {'total': len(items), 'imported': 0, 'existing': 0, 'duplicates': 0, 'errors': [], 'bytes': 0}
+        pages = 0
+        results = []
+        for files, stats in manager.import_references(items, link=link, workers=workers or IMPORT_WORKERS,
+                                                      batch_size=batch_size or IMPORT_BATCH,
+                                                      hash_cache=self.hash_cache, progress=progress):
+            if extract:
+                with span('import.extract'):
+                    pages += self.content_cache.extract(files)['pages']
+            with span('import.convert'):
+                results += [r for r in (self._convert_local_file(f) for f in files) if r]
+
+        # Une seule mise à jour de l'index, sous verrou (serve, extract peuvent l'écrire aussi)
+        with span('import.index'), self.index.locked():
+            self.index.apply_delta('local', results, stamp=manager.generation())
+            self.index.save()
+        self.hash_cache.save()
+        self.filename_cache.save()
+        stats['pages'] = pages
+        return stats
+
+    def _convert_file(self, source, file_info):
+        """Convertir un fichier d'une source en format unifié"""
+        if source == 'drive':
+            return self._convert_drive_file(file_info)
+        if source == 'github':
+            return self._convert_github_file(file_info)
+        if source == 'bibtex':
+            return self._convert_bibtex_file(file_info)
+        return self._convert_local_file(file_info)
+    
     def _search_in_source(self, source, keyword, author, year):
-        """Rechercher dans une source spécifique"""
+        """Références d'une source depuis sa dernière synchronisation (aucune si jamais synchronisée)"""
         results = []
         
         if source == 'drive' and self.drive_manager:
-            # Récupérer les fichiers du cache Drive
-            files = self.drive_manager.get_cached_files()
-            if not files:
-                # Si pas de cache, synchroniser d'abord
-                self.drive_manager.sync()
-                files = self.drive_manager.get_cached_files()
-            
-            for file_info in files:
+            # Fichiers du cache Drive
+            for file_info in self.drive_manager.get_cached_files():
                 result = self._convert_drive_file(file_info)
                 if result:
                     results.append(result)
         
         elif source == 'github' and self.github_manager:
-            # Récupérer les fichiers du cache GitHub
-            files = self.github_manager.get_cached_files()
-            if not files:
-                # Si pas de cache, synchroniser d'abord
-                self.github_manager.sync()
-                files = self.github_manager.get_cached_files()
-            
-            for file_info in files:
+            # Fichiers du cache GitHub
+            for file_info in self.github_manager.get_cached_files():
                 result = self._convert_github_file(file_info)
                 if result:
                     results.append(result)
         
         elif source == 'local' and self.local_manager:
-            # Récupérer les fichiers du cache local
-            files = self.local_manager.get_cached_files()
-            if not files:
-                # Si pas de cache, scanner d'abord
-                self.local_manager.scan()
-                files = self.local_manager.get_cached_files()
-            
-            for file_info in files:
+            # Fichiers du dernier scan local
+            for file_info in self.local_manager.get_cached_files():
                 result = self._convert_local_file(file_info)
                 if result:
                     results.append(result)
         
+        elif source == 'bibtex' and self.bibtex_manager:
+            # Entrées indexées depuis la dernière analyse des .bib
+            for entry in self.bibtex_manager.get_cached_files():
+                result = self._convert_bibtex_file(entry)
+                if result:
+                    results.append(result)
+        
         return results
     
+    @timed('convert.drive')
     def _convert_drive_file(self, file_info):
         """Convertir un fichier Drive en format unifié"""
         try:
@@ -140,12 +568,15 @@ class ReferenceSearch:
                 'size': file_info.get('size', 0),
                 'modified': file_info.get('modified', ''),
                 'type': 'pdf',
+                'hash': f"md5:{file_info['md5Checksum']}" if file_info.get('md5Checksum') else '',
                 'score': 0  # Score de pertinence, sera calculé plus tard
             }
         except Exception as e:
+            metrics.increment('errors.convert.drive')
             print(f"Erreur conversion fichier Drive: {e}")
             return None
     
+    @timed('convert.github')
     def _convert_github_file(self, file_info):
         """Convertir un fichier GitHub en format unifié"""
         try:
@@ -153,7 +584,7 @@ class ReferenceSearch:
             author, year = self._extract_metadata_from_filename(name)
             
             return {
-                'id': file_info.get('sha', ''),
+                'id': file_info.get('path', ''),
                 'title': self._clean_title(name),
                 'author': author,
                 'year': year,
@@ -162,21 +593,40 @@ class ReferenceSearch:
                 'size': file_info.get('size', 0),
                 'modified': '',  # GitHub ne fournit pas facilement cette info
                 'type': Path(name).suffix.lower()[1:] if Path(name).suffix else 'unknown',
+                'hash': f"git:{file_info['sha']}" if file_info.get('sha') else '',
                 'score': 0
             }
         except Exception as e:
+            metrics.increment('errors.convert.github')
             print(f"Erreur conversion fichier GitHub: {e}")
             return None
     
+    @timed('convert.local')
     def _convert_local_file(self, file_info):
         """Convertir un fichier local en format unifié"""
         try:
             name = file_info.get('name', '')
             author, year = self._extract_metadata_from_filename(name)
+            title = self._clean_title(name)
+            
+            # Métadonnées extraites du PDF (commande extract). Le titre /Info est souvent
+            # générique ("Microsoft Word - draft.doc") et l'année devinée dans le texte ou
+            # tirée de CreationDate: ils ne servent que si le nom de fichier n'a pas d'année,
+            # c'est-à-dire ne suit pas la convention Auteur_Année_Titre.
+            content = self.content_cache.lookup(file_info.get('path', ''), file_info.get('size'),
+                                                file_info.get('mtime_ns'))
+            if content:
+                if year is None:
+                    title = content.get('title') or title
+                    year = content.get('year')
+                if content.get('authors'):
+                    author = '; '.join(content['authors'])
+                    if 'mayrand' in author.lower():
+                        author = 'Mayrand, Maxence'
             
             return {
                 'id': file_info.get('id', ''),
-                'title': self._clean_title(name),
+                'title': title,
                 'author': author,
                 'year': year,
                 'source': 'Local',
@@ -187,84 +637,115 @@ class ReferenceSearch:
                 'score': 0
             }
         except Exception as e:
+            metrics.increment('errors.convert.local')
             print(f"Erreur conversion fichier local: {e}")
             return None
     
-    def _extract_metadata_from_filename(self, filename):
-        """Extraire auteur et année du nom de fichier"""
-        author = 'Inconnu'
-        year = None
-        
+    @timed('convert.bibtex')
+    def _convert_bibtex_file(self, entry):
+        """Convertir une entrée BibTeX en format unifié (chemin du PDF local si trouvé)"""
         try:
-            # Nettoyer le nom de fichier
-            name = Path(filename).stem
-            
-            # Patterns pour extraire l'année (4 chiffres)
-            year_pattern = r'\b(19|20)\d{2}\b'
-            year_match = re.search(year_pattern, name)
-            if year_match:
-                year = int(year_match.group())
+            author = '; '.join(entry.get('authors') or []) or 'Inconnu'
+            if 'mayrand' in author.lower():
+                author = 'Mayrand, Maxence'
             
-            # Patterns pour extraire l'auteur (supposé être au début)
-            # Chercher des patterns comme "Smith_2020", "John-Smith_2020", etc.
-            author_pattern = r'^([A-Za-z][A-Za-z\-_\s]+?)(?:_|\s|-)(?:19|20)\d{2}'
-            author_match = re.search(author_pattern, name)
-            if author_match:
-                author = author_match.group(1).replace('_', ' ').replace('-', ' ').strip()
-            else:
-                # Fallback: prendre les premiers mots avant un nombre ou underscore
-                words = re.split(r'[_\-\s]+', name)
-                if words:
-                    author = words[0]
+            files_by_stem, files_by_doi = self._get_pdf_links()
+            pdf_path = link_pdf(entry, files_by_stem, files_by_doi)
             
-            # Patterns spéciaux pour "Mayrand" (superviseur)
-            if 'mayrand' in name.lower():
-                author = 'Mayrand, Maxence'
-        
+            return {
+                'id': entry.get('id') or entry.get('key', ''),
+                'title': entry.get('title') or entry.get('key', ''),
+                'author': author,
+                'year': entry.get('year'),
+                'source': 'BibTeX',
+                'path': pdf_path or f"{entry.get('bib', '')}#{entry.get('key', '')}",
+                'size': 0,
+                'modified': '',
+                'type': entry.get('type') or 'unknown',
+                'score': 0
+            }
         except Exception as e:
-            print(f"Erreur extraction métadonnées: {e}")
+            metrics.increment('errors.convert.bibtex')
+            print(f"Erreur conversion entrée BibTeX: {e}")
+            return None
+    
+    def _get_pdf_links(self):
+        """PDF locaux par nom (sans extension) et par DOI extrait, recalculés si le dossier a changé"""
+        files = []
+        stamp = None
+        if self.local_manager:
+            stamp = (self.local_manager.generation(), len(self.content_cache.manifest['documents']))
+            if stamp == self._pdf_links_stamp:
+                return self._pdf_links
+            files = self.local_manager.get_cached_files()
         
+        files_by_stem = {}
+        files_by_doi = {}
+        for file_info in files:
+            if file_info.get('extension') != '.pdf':
+                continue
+            files_by_stem.setdefault(Path(file_info['name']).stem.lower(), file_info['path'])
+            content = self.content_cache.lookup(file_info['path'], file_info.get('size'), file_info.get('mtime_ns'))
+            if content and content.get('doi'):
+                files_by_doi.setdefault(content['doi'].lower(), file_info['path'])
+        
+        self._pdf_links = (files_by_stem, files_by_doi)
+        self._pdf_links_stamp = stamp
+        return self._pdf_links
+    
+    def _extract_metadata_from_filename(self, filename):
+        """Extraire auteur et année du nom de fichier"""
+        author, year, _ = self.filename_cache.parse(filename)
         return author, year
     
     def _clean_title(self, filename):
         """Nettoyer le titre (enlever extension, caractères spéciaux)"""
-        try:
-            title = Path(filename).stem
-            # Remplacer underscores et tirets par espaces
-            title = re.sub(r'[_\-]+', ' ', title)
-            # Enlever les patterns d'année
-            title = re.sub(r'\b(19|20)\d{2}\b', '', title)
-            # Nettoyer les espaces multiples
-            title = re.sub(r'\s+', ' ', title).strip()
-            return title if title else filename
-        except:
-            return filename
-    
-    def _filter_results(self, results, keyword, author, year):
-        """Filtrer les résultats selon les critères"""
-        filtered = []
-        
-        for result in results:
+        return self.filename_cache.parse(filename)[2]
+    
+    @timed('filter')
+    def _filter_results(self, doc_ids, keyword, author, year):
+        """Filtrer les résultats selon les critères
+
+        Travaille directement sur les colonnes du store et retourne des
+        couples (score, doc_id).
+        """
+        return list(self._iter_filtered(doc_ids, keyword, author, year))
+    
+    def _iter_filtered(self, doc_ids, keyword, author, year):
+        """Couples (score, doc_id) produits au fil du parcours des candidats"""
+        store = self.index.store
+        titles_lower = store.titles_lower
+        authors = store.authors
+        authors_lower = store.pool.lower
+        years = store.years
+        
+        # Les colonnes sont en minuscules sans accents: 'Géométrie' trouve 'geometrie' et inversement
+        keyword_lower = fold_accents(keyword) if keyword else None
+        author_lower = fold_accents(author) if author else None
+        year_range = parse_year_range(year) if year else None
+        
+        for doc_id in doc_ids:
+            result_author = authors_lower[authors[doc_id]]
+            
             # Calculer le score de pertinence
             score = 0
             
             # Filtre par mot-clé
-            if keyword:
-                keyword_lower = keyword.lower()
-                if keyword_lower in result['title'].lower():
+            if keyword_lower:
+                if keyword_lower in titles_lower[doc_id]:
                     score += 10
-                if keyword_lower in result['author'].lower():
+                if keyword_lower in result_author:
                     score += 5
                 # Si aucune correspondance, on garde quand même mais avec score faible
                 if score == 0:
-                    if any(keyword_lower in str(v).lower() for v in result.values() if v):
+                    if keyword_lower in store.haystack(doc_id):
                         score += 1
             else:
                 score += 1  # Pas de filtre mot-clé
             
             # Filtre par auteur
-            if author:
-                if author.lower() in result['author'].lower():
+            if author_lower:
+                if author_lower in result_author:
                     score += 15
                 elif score == 0:
                     continue  # Exclure si l'auteur ne correspond pas
@@ -273,89 +754,91 @@ class ReferenceSearch:
             
             # Filtre par année
             if year:
-                try:
-                    if result['year'] == int(year):
-                        score += 10
-                    elif score == 0:
-                        continue  # Exclure si l'année ne correspond pas
-                except:
-                    pass
+                if year_range is None:
+                    pass  # Année illisible: critère ignoré
+                elif year_range[0] <= years[doc_id] <= year_range[1]:
+                    score += 10
+                elif score == 0:
+                    continue  # Exclure si l'année ne correspond pas
             else:
                 score += 1  # Pas de filtre année
             
             # Bonus pour certaines sources ou types
-            if 'mayrand' in result['author'].lower():
+            if 'mayrand' in result_author:
                 score += 5  # Bonus pour le superviseur
             
-            result['score'] = score
-            
             if score > 0:
-                filtered.append(result)
+                yield score, doc_id
+    
+    def _sort_key(self, score, doc_id):
+        """Clé de tri d'un résultat (chaînes en minuscules précalculées dans le store)"""
+        store = self.index.store
+        lower = store.pool.lower
+        return (
+            score,                             # Score principal
+            store.years[doc_id],               # Année (plus récent = mieux)
+            lower[store.authors[doc_id]],      # Auteur alphabétique
+            store.titles_lower[doc_id],        # Titre alphabétique
+            lower[store.sources[doc_id]],      # Départage stable pour la pagination
+            store.ids[doc_id],
+        )
+    
+    @timed('sort')
+    def _sort_results(self, results, limit=None, after=None):
+        """Trier les résultats par pertinence
+
+        Avec `limit`, seuls les `limit` premiers sont sélectionnés (heapq);
+        avec `after`, seuls les résultats classés après cette clé sont gardés.
+        """
+        keyed = ((self._sort_key(score, doc_id), score, doc_id) for score, doc_id in results)
+        if after is not None:
+            keyed = (item for item in keyed if item[0] < after)
         
-        return filtered
+        if limit is None:
+            ordered = sorted(keyed, reverse=True)
+        else:
+            ordered = heapq.nlargest(limit, keyed)
+        return [(score, doc_id) for _, score, doc_id in ordered]
     
-    def _sort_results(self, results):
-        """Trier les résultats par pertinence"""
-        return sorted(results, key=lambda x: (
-            x['score'],                    # Score principal
-            x['year'] or 0,               # Année (plus récent = mieux)  
-            x['author'].lower(),          # Auteur alphabétique
-            x['title'].lower()            # Titre alphabétique
-        ), reverse=True)
+    def _refresh(self, sources):
+        """Rafraîchir les sources demandées et les retourner"""
+        search_sources = self._determine_sources(sources)
+        with span('refresh'):
+            for source, error in self.refresh_sources(search_sources):
+                if error:
+                    metrics.increment(f"errors.refresh.{source}")
+                    print(f"Erreur lors de la recherche dans {source}: {error}")
+        return search_sources
+    
+    def refresh_all(self):
+        """Rafraîchir toutes les sources disponibles et les retourner"""
+        return self._refresh('all')
     
     def get_all_authors(self):
         """Obtenir la liste de tous les auteurs"""
-        authors = set()
-        
-        # Rechercher dans toutes les sources
-        results = self.search(sources='all', limit=1000)
-        
-        for result in results:
-            if result['author'] and result['author'] != 'Inconnu':
-                authors.add(result['author'])
+        authors = set(self.index.aggregates.merged(self.refresh_all(), 'author'))
+        authors.discard('')
+        authors.discard('Inconnu')
         
-        return sorted(list(authors))
+        return sorted(authors)
     
     def get_all_years(self):
         """Obtenir la liste de toutes les années"""
-        years = set()
+        years = set(self.index.aggregates.merged(self.refresh_all(), 'year'))
+        years.discard(0)
         
-        # Rechercher dans toutes les sources
-        results = self.search(sources='all', limit=1000)
-        
-        for result in results:
-            if result['year']:
-                years.add(result['year'])
-        
-        return sorted(list(years), reverse=True)
+        return sorted(years, reverse=True)
     
+    @timed('get_stats')
     def get_stats(self):
-        """Obtenir les statistiques globales"""
-        results = self.search(sources='all', limit=1000)
-        
-        stats = {
-            'total_references': len(results),
-            'by_source': {},
-            'by_year': {},
-            'by_author': {},
-            'by_type': {}
-        }
-        
-        for result in results:
-            # Par source
-            source = result['source']
-            stats['by_source'][source] = stats['by_source'].get(source, 0) + 1
-            
-            # Par année
-            year = result['year'] or 'Inconnue'
-            stats['by_year'][year] = stats['by_year'].get(year, 0) + 1
-            
-            # Par auteur
-            author = result['author'] or 'Inconnu'
-            stats['by_author'][author] = stats['by_author'].get(author, 0) + 1
-            
-            # Par type
-            file_type = result['type'] or 'unknown'
-            stats['by_type'][file_type] = stats['by_type'].get(file_type, 0) + 1
+        """Obtenir les statistiques globales (agrégats maintenus par l'index)"""
+        sources = self.refresh_all()
+        aggregates = self.index.aggregates
         
-        return stats
\ No newline at end of file
+        return {
+            'total_references': aggregates.total(sources),
+            'by_source': dict(aggregates.merged(sources, 'source')),
+            'by_year': {(k or 'Inconnue'): v for k, v in aggregates.merged(sources, 'year').items()},
+            'by_author': {(k or 'Inconnu'): v for k, v in aggregates.merged(sources, 'author').items()},
+            'by_type': {(k or 'unknown'): v for k, v in aggregates.merged(sources, 'type').items()},
+        }
@@ -0,0 +1,275 @@
+"""
+Stockage compact des références en colonnes
+
+Chaque champ d'une référence est rangé dans une colonne (array typé ou liste),
+indexée par un numéro de ligne. Les chaînes très répétées (auteur, source, type)
+sont internées dans un pool et stockées sous forme d'entiers; les versions en
+minuscules sans accents (fold_accents, comme les tokens de l'index) utilisées
+pour le filtrage et le tri sont calculées une seule fois.
+Les lignes supprimées sont réutilisées par les ajouts suivants.
+"""
+
+from array import array
+from itertools import compress
+
+from ranking import fold_accents, tokenize
+
+# Table bytes.translate: 1 pour une ligne libre, 0 pour une ligne active
+_FREE = bytes([1] + [0] * 255)
+
+
+class StringPool:
+    """Table de chaînes internées (une chaîne -> un entier)"""
+
+    def __init__(self, values=None):
+        self.values = []
+        self.lower = []
+        self.ids = {}
+        for value in values or []:
+            self.intern(value)
+
+    def intern(self, value):
+        value = value or ''
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = len(self.values)
+            self.ids[value] = string_id
+            self.values.append(value)
+            self.lower.append(fold_accents(value))
+        return string_id
+
+    def __getitem__(self, string_id):
+        return self.values[string_id]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class ReferenceStore:
+    def __init__(self):
+        self.pool = StringPool()
+
+        self.ids = []                # identifiant dans la source
+        self.titles = []
+        self.titles_lower = []       # clé de tri/filtrage précalculée (sans accents)
+        self.paths = []
+        self.modified = []
+        self.hashes = []             # empreinte fournie par la source ("md5:..." / "git:...")
+        self.authors = array('I')    # id dans le pool
+        self.sources = array('I')    # id dans le pool
+        self.types = array('I')      # id dans le pool
+        self.years = array('H')      # 0 = année inconnue
+        self.sizes = array('q')
+        self.title_lengths = array('H')   # nombre de tokens (BM25)
+        self.author_lengths = array('H')
+        self.alive = bytearray()
+
+        self.free_rows = []
+        self.size = 0
+        self.length_totals = {'t': 0, 'a': 0}
+
+    def __len__(self):
+        return self.size
+
+    def add(self, reference):
+        """Ajouter une référence et retourner son numéro de ligne"""
+        title = reference.get('title') or ''
+        values = (
+            str(reference.get('id') or ''),
+            title,
+            fold_accents(title),
+            reference.get('path') or '',
+            reference.get('modified') or '',
+            reference.get('hash') or '',
+            self.pool.intern(reference.get('author')),
+            self.pool.intern(reference.get('source')),
+            self.pool.intern(reference.get('type')),
+            int(reference.get('year') or 0),
+            int(reference.get('size') or 0),
+            min(len(tokenize(title)), 65535),
+            min(len(tokenize(reference.get('author'))), 65535),
+        )
+        columns = (self.ids, self.titles, self.titles_lower, self.paths, self.modified, self.hashes,
+                   self.authors, self.sources, self.types, self.years, self.sizes,
+                   self.title_lengths, self.author_lengths)
+
+        if self.free_rows:
+            row = self.free_rows.pop()
+            for column, value in zip(columns, values):
+                column[row] = value
+            self.alive[row] = 1
+        else:
+            row = len(self.ids)
+            for column, value in zip(columns, values):
+                column.append(value)
+            self.alive.append(1)
+
+        self.size += 1
+        self.length_totals['t'] += values[-2]
+        self.length_totals['a'] += values[-1]
+        return row
+
+    def remove(self, row):
+        """Libérer une ligne (les chaînes sont relâchées, la ligne sera réutilisée)"""
+        if not self.alive[row]:
+            return
+        self.alive[row] = 0
+        self.length_totals['t'] -= self.title_lengths[row]
+        self.length_totals['a'] -= self.author_lengths[row]
+        self.ids[row] = self.titles[row] = self.titles_lower[row] = ''
+        self.paths[row] = self.modified[row] = self.hashes[row] = ''
+        self.free_rows.append(row)
+        self.size -= 1
+
+    def rows(self):
+        """Numéros de toutes les lignes actives"""
+        return list(compress(range(len(self.alive)), self.alive))
+
+    def get(self, row, score=0):
+        """Matérialiser une ligne au format dict unifié"""
+        pool = self.pool
+        return {
+            'id': self.ids[row],
+            'title': self.titles[row],
+            'author': pool[self.authors[row]],
+            'year': self.years[row] or None,
+            'source': pool[self.sources[row]],
+            'path': self.paths[row],
+            'size': self.sizes[row],
+            'modified': self.modified[row],
+            'type': pool[self.types[row]],
+            'score': score,
+        }
+
+    def average_length(self, field):
+        """Longueur moyenne (en tokens) du champ titre 't' ou auteur 'a'"""
+        return self.length_totals[field] / self.size if self.size else 0.0
+
+    def author_lower(self, row):
+        return self.pool.lower[self.authors[row]]
+
+    def haystack(self, row):
+        """Tous les champs non vides en minuscules sans accents (recherche de dernier recours)"""
+        reference = self.get(row)
+        return fold_accents(' '.join(str(v) for v in reference.values() if v))
+
+    # ------------------------------------------------------------------
+    # Persistance
+    # ------------------------------------------------------------------
+
+    def to_dict(self):
+        return {
+            'pool': self.pool.values,
+            'ids': self.ids,
+            'titles': self.titles,
+            'paths': self.paths,
+            'modified': self.modified,
+            'hashes': self.hashes,
+            'authors': self.authors.tolist(),
+            'sources': self.sources.tolist(),
+            'types': self.types.tolist(),
+            'years': self.years.tolist(),
+            'sizes': self.sizes.tolist(),
+            'title_lengths': self.title_lengths.tolist(),
+            'author_lengths': self.author_lengths.tolist(),
+            'alive': list(self.alive),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        store = cls()
+        store.pool = StringPool(data['pool'])
+        store.ids = data['ids']
+        store.titles = data['titles']
+        store.titles_lower = [fold_accents(title) for title in store.titles]
+        store.paths = data['paths']
+        store.modified = data['modified']
+        store.hashes = data['hashes']
+        store.authors = array('I', data['authors'])
+        store.sources = array('I', data['sources'])
+        store.types = array('I', data['types'])
+        store.years = array('H', data['years'])
+        store.sizes = array('q', data['sizes'])
+        store.title_lengths = array('H', data['title_lengths'])
+        store.author_lengths = array('H', data['author_lengths'])
+        store.alive = bytearray(data['alive'])
+        # Passes sur des colonnes entières: compress et translate bouclent en C
+        store.free_rows = list(compress(range(len(store.alive)), store.alive.translate(_FREE)))
+        store.size = len(store.alive) - len(store.free_rows)
+        store.length_totals = {
+            't': sum(compress(store.title_lengths, store.alive)),
+            'a': sum(compress(store.author_lengths, store.alive)),
+        }
+        return store
+
+
+# Comparaison mémoire / débit avec des dicts par référence
+if __name__ == "__main__":
+    import random
+    import sys
+    import time
+    import tracemalloc
+
+    authors = [f"Author{i}" for i in range(2000)] + ['Mayrand, Maxence']
+    words = ['symplectic', 'reduction', 'hyperkahler', 'quiver', 'moment', 'map', 'geometry', 'quotient', 'stack']
+
+    def make_reference(i):
+        title = ' '.join(random.choice(words) for _ in range(4)) + f" {i}"
+        return {
+            'id': str(i), 'title': title, 'author': random.choice(authors),
+            'year': random.randint(1950, 2024), 'source': random.choice(['Google Drive', 'GitHub', 'Local']),
+            'path': f"/refs/{title.replace(' ', '_')}.pdf", 'size': random.randint(10 ** 4, 10 ** 7),
+            'modified': '2024-01-01 00:00:00', 'type': 'pdf', 'score': 0,
+        }
+
+    def dict_filter_sort(references, keyword, author):
+        results = []
+        for reference in references:
+            score = 0
+            if keyword.lower() in reference['title'].lower():
+                score += 10
+            if author.lower() in reference['author'].lower():
+                score += 15
+            reference['score'] = score
+            if score:
+                results.append(reference)
+        return sorted(results, key=lambda x: (x['score'], x['year'] or 0, x['author'].lower(), x['title'].lower()), reverse=True)
+
+    def store_filter_sort(store, keyword, author):
+        keyword, author = keyword.lower(), author.lower()
+        titles_lower, authors, lower, years = store.titles_lower, store.authors, store.pool.lower, store.years
+        scored = []
+        for row in store.rows():
+            score = (10 if keyword in titles_lower[row] else 0) + (15 if author in lower[authors[row]] else 0)
+            if score:
+                scored.append((score, years[row], lower[authors[row]], titles_lower[row], row))
+        scored.sort(reverse=True)
+        return scored
+
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    for n in sizes:
+        random.seed(n)
+        tracemalloc.start()
+        references = [make_reference(i) for i in range(n)]
+        dict_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        # Même jeu de données, regénéré pour ne pas partager les chaînes des dicts
+        random.seed(n)
+        tracemalloc.start()
+        store = ReferenceStore()
+        for i in range(n):
+            store.add(make_reference(i))
+        store_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        started = time.perf_counter()
+        dict_filter_sort(references, 'moment', 'author1')
+        dict_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        store_filter_sort(store, 'moment', 'author1')
+        store_time = time.perf_counter() - started
+
+        print(f"{n:>9} refs | dicts: {dict_memory / 2 ** 20:7.1f} Mo {n / dict_time:>10,.0f} refs/s"
+              f" | colonnes: {store_memory / 2 ** 20:7.1f} Mo {n / store_time:>10,.0f} refs/s")
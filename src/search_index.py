@@ -0,0 +1,462 @@
+"""
+Index inversé persistant pour la recherche de références
+
+L'index associe chaque token (titre, auteur, année, nom de fichier) à la liste
+des documents qui le contiennent. Il est sauvegardé dans le dossier de cache et
+mis à jour de manière incrémentale, source par source, à chaque synchronisation.
+"""
+
+import json
+import os
+import zlib
+from bisect import bisect_left, insort
+from contextlib import contextmanager
+from pathlib import Path
+
+from facet_index import FacetIndex, iter_rows, parse_year_range, popcount
+from ranking import tokenize
+from reference_aggregates import ReferenceAggregates
+from reference_store import ReferenceStore
+from source_cache import file_stamp, manifest_lock
+
+INDEX_VERSION = 6
+
+# Préfixes des champs indexés
+FIELD_TITLE = 't'
+FIELD_AUTHOR = 'a'
+FIELD_YEAR = 'y'
+FIELD_FILENAME = 'f'
+FIELD_SOURCE = 's'
+
+# Champs interrogés par un mot-clé libre
+KEYWORD_FIELDS = (FIELD_TITLE, FIELD_AUTHOR, FIELD_FILENAME)
+
+# Longueur minimale d'un token pour la recherche de repli à l'intérieur des termes
+MIN_INFIX_LENGTH = 3
+
+
+def index_file(cache_dir=None):
+    """Fichier de l'index (sa date sert à valider les pages en cache sans le charger)"""
+    return Path(cache_dir or os.getenv('CACHE_DIR', 'data/cache')) / 'search_index.json'
+
+
+class SearchIndex:
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir or os.getenv('CACHE_DIR', 'data/cache'))
+        self.index_file = index_file(self.cache_dir)
+
+        self.store = ReferenceStore()  # doc_id = numéro de ligne du store
+        self.keys = {}          # clé "source:id" -> doc_id
+        self.fingerprints = {}  # doc_id -> empreinte (crc32) pour détecter les changements
+        self.postings = {}      # "champ:token" -> set(doc_id)
+        self.stamps = {}        # source -> marqueur de la dernière synchronisation
+        self.aggregates = ReferenceAggregates()
+        self.facets = FacetIndex()  # Bitmaps source/type/année (reconstruits au chargement)
+        self.revision = 0       # incrémenté à chaque ajout/suppression de document
+        self.duplicates = []    # groupes de doc_id d'un même contenu
+        self.duplicates_revision = None
+        self.cluster_of = {}    # doc_id -> groupe de copies
+
+        self._vocabulary = None  # Termes triés, calculés à la demande puis tenus à jour
+        self.vocabulary_epoch = 0   # incrémenté quand le vocabulaire est entièrement remplacé
+        self._vocabulary_listeners = []  # appelés (terme, ajouté) à chaque terme ajouté ou supprimé
+        self._dirty = False
+        self._file_stamp = None  # Version du fichier chargée ou écrite par ce processus
+
+        self.load()
+
+    # ------------------------------------------------------------------
+    # Persistance
+    # ------------------------------------------------------------------
+
+    def load(self):
+        """Charger l'index depuis le disque"""
+        self._file_stamp = file_stamp(self.index_file)
+        if self._file_stamp is None:
+            return False
+
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+
+            if data.get('version') != INDEX_VERSION:
+                # Règles d'indexation modifiées: on repartira d'un index vide
+                return False
+
+            self.store = ReferenceStore.from_dict(data['store'])
+            self.keys = data['keys']
+            self.fingerprints = {int(k): v for k, v in data['fingerprints'].items()}
+            self.postings = {term: set(ids) for term, ids in data['postings'].items()}
+            self.stamps = data['stamps']
+            self.aggregates = ReferenceAggregates.from_dict(data['aggregates'])
+            self.facets = FacetIndex.from_store(self.store, self.keys)
+            self.revision = data['revision']
+            self.set_duplicates(data['duplicates'], data['duplicates_revision'])
+            self._invalidate_vocabulary()
+            self._dirty = False
+            return True
+        except Exception as e:
+            print(f"Erreur chargement de l'index de recherche: {e}")
+            self.clear()
+            return False
+
+    def save(self):
+        """Sauvegarder l'index (écriture atomique, seulement si modifié)"""
+        if not self._dirty:
+            return
+
+        data = {
+            'version': INDEX_VERSION,
+            'store': self.store.to_dict(),
+            'keys': self.keys,
+            'fingerprints': self.fingerprints,
+            'postings': {term: sorted(ids) for term, ids in self.postings.items()},
+            'stamps': self.stamps,
+            'aggregates': self.aggregates.to_dict(),
+            'revision': self.revision,
+            'duplicates': self.duplicates,
+            'duplicates_revision': self.duplicates_revision,
+        }
+
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.index_file.with_suffix('.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_file, self.index_file)
+            self._file_stamp = file_stamp(self.index_file)
+            self._dirty = False
+        except Exception as e:
+            print(f"Erreur sauvegarde de l'index de recherche: {e}")
+
+    def changed_on_disk(self):
+        """Vrai si un autre processus a réécrit l'index depuis son chargement (extract, import, dedupe)"""
+        stamp = file_stamp(self.index_file)
+        return stamp is not None and stamp != self._file_stamp
+
+    def reload_if_changed(self):
+        """Relire l'index s'il a été réécrit par un autre processus; True s'il a été relu"""
+        return self.changed_on_disk() and self.load()
+
+    @contextmanager
+    def locked(self):
+        """Modification de l'index sous verrou, depuis sa dernière version sur le disque
+
+        Les modifications faites sous le verrou doivent être sauvegardées avant
+        d'en sortir: relu par un autre processus, l'index ne perd ainsi ni les
+        métadonnées extraites ni les groupes de doublons des autres.
+        """
+        with manifest_lock(self.index_file):
+            self.reload_if_changed()
+            yield self
+
+    def clear(self):
+        """Vider complètement l'index"""
+        self.store = ReferenceStore()
+        self.keys = {}
+        self.fingerprints = {}
+        self.postings = {}
+        self.stamps = {}
+        self.aggregates = ReferenceAggregates()
+        self.facets = FacetIndex()
+        self.revision += 1
+        self.set_duplicates([], None)
+        self._invalidate_vocabulary()
+        self._dirty = True
+
+    # ------------------------------------------------------------------
+    # Mise à jour incrémentale
+    # ------------------------------------------------------------------
+
+    def is_fresh(self, source, stamp):
+        """Vrai si la source a déjà été indexée avec ce marqueur de synchronisation"""
+        return stamp is not None and self.stamps.get(source) == stamp
+
+    def update_source(self, source, references, stamp=None):
+        """Aligner l'index sur la liste complète des références d'une source
+
+        Seuls les documents ajoutés, modifiés ou supprimés touchent aux postings.
+        Retourne le tuple (ajoutés, modifiés, supprimés).
+        """
+        seen = set()
+        upserts = []
+        for reference in references:
+            key = self._doc_key(source, reference)
+            seen.add(key)
+            upserts.append(reference)
+
+        prefix = f"{source}:"
+        removed_keys = [key for key in self.keys if key.startswith(prefix) and key not in seen]
+
+        return self.apply_delta(source, upserts, removed_keys, stamp)
+
+    def apply_delta(self, source, upserts=(), removed_keys=(), stamp=None):
+        """Appliquer un delta (références ajoutées/modifiées, clés supprimées)"""
+        added = changed = removed = 0
+
+        for key in removed_keys:
+            if self._remove(key):
+                removed += 1
+
+        for reference in upserts:
+            key = self._doc_key(source, reference)
+            fingerprint = self._fingerprint(reference)
+            doc_id = self.keys.get(key)
+
+            if doc_id is not None:
+                if self.fingerprints.get(doc_id) == fingerprint:
+                    continue
+                self._remove(key)
+                changed += 1
+            else:
+                added += 1
+
+            self._add(source, key, reference, fingerprint)
+
+        if stamp is not None and self.stamps.get(source) != stamp:
+            self.stamps[source] = stamp
+            self._dirty = True
+
+        return added, changed, removed
+
+    def remove_keys(self, source, keys):
+        """Supprimer des documents à partir de leur identifiant dans la source"""
+        return self.apply_delta(source, removed_keys=[f"{source}:{key}" for key in keys])[2]
+
+    def _doc_key(self, source, reference):
+        return f"{source}:{reference.get('id') or reference.get('path', '')}"
+
+    def _fingerprint(self, reference):
+        return zlib.crc32(json.dumps(
+            [reference.get(field) for field in ('title', 'author', 'year', 'path', 'size', 'modified', 'type', 'hash')],
+            ensure_ascii=False, default=str
+        ).encode('utf-8'))
+
+    def _terms(self, source, reference):
+        """Calculer les termes indexés d'une référence"""
+        terms = {f"{FIELD_SOURCE}:{source}"}
+        terms.update(f"{FIELD_TITLE}:{t}" for t in tokenize(reference.get('title')))
+        terms.update(f"{FIELD_AUTHOR}:{t}" for t in tokenize(reference.get('author')))
+        if reference.get('year'):
+            terms.add(f"{FIELD_YEAR}:{reference['year']}")
+
+        # Champs dérivés du nom de fichier (chemin ou lien)
+        filename = Path(str(reference.get('path') or '')).name
+        terms.update(f"{FIELD_FILENAME}:{t}" for t in tokenize(Path(filename).stem))
+        return terms
+
+    def _add(self, source, key, reference, fingerprint):
+        doc_id = self.store.add(reference)
+        self.keys[key] = doc_id
+        self.fingerprints[doc_id] = fingerprint
+        document = self.store.get(doc_id)
+        self.aggregates.add(source, document)
+        self.facets.add(doc_id, source, document)
+
+        for term in self._terms(source, reference):
+            postings = self.postings.get(term)
+            if postings is None:
+                self.postings[term] = {doc_id}
+                self._term_added(term)
+            else:
+                postings.add(doc_id)
+
+        self.revision += 1
+        self._dirty = True
+
+    def _remove(self, key):
+        doc_id = self.keys.pop(key, None)
+        if doc_id is None:
+            return False
+
+        document = self.store.get(doc_id)
+        self.store.remove(doc_id)
+        self.fingerprints.pop(doc_id, None)
+        self._leave_cluster(doc_id)
+        source = key.split(':', 1)[0]
+        self.aggregates.remove(source, document)
+        self.facets.remove(doc_id, source, document)
+
+        for term in self._terms(source, document):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.discard(doc_id)
+            if not postings:
+                del self.postings[term]
+                self._term_removed(term)
+
+        self.revision += 1
+        self._dirty = True
+        return True
+
+    # ------------------------------------------------------------------
+    # Doublons
+    # ------------------------------------------------------------------
+
+    def duplicates_stale(self):
+        """Vrai si des documents ont changé depuis le dernier calcul des doublons"""
+        return self.duplicates_revision != self.revision
+
+    def set_duplicates(self, clusters, revision=None):
+        """Enregistrer les groupes de copies calculés pour une révision de l'index"""
+        self.duplicates = [list(cluster) for cluster in clusters]
+        self.duplicates_revision = revision
+        self.cluster_of = {doc_id: cluster for cluster in self.duplicates for doc_id in cluster}
+        self._dirty = True
+
+    def _leave_cluster(self, doc_id):
+        """Retirer un document supprimé de son groupe (sa ligne peut être réutilisée)"""
+        cluster = self.cluster_of.pop(doc_id, None)
+        if cluster is None:
+            return
+        cluster.remove(doc_id)
+        if len(cluster) < 2:
+            for member in cluster:
+                del self.cluster_of[member]
+            self.duplicates = [c for c in self.duplicates if c is not cluster]
+
+    def dedupe_candidates(self):
+        """(doc_id, taille, empreinte connue, chemin local) de chaque document"""
+        store = self.store
+        return [
+            (doc_id, store.sizes[doc_id], store.hashes[doc_id],
+             store.paths[doc_id] if key.startswith('local:') else None)
+            for key, doc_id in self.keys.items()
+        ]
+
+    # ------------------------------------------------------------------
+    # Interrogation
+    # ------------------------------------------------------------------
+
+    def _invalidate_vocabulary(self):
+        """Vocabulaire entièrement remplacé (chargement, vidage): il sera retrié à la demande"""
+        self._vocabulary = None
+        self.vocabulary_epoch += 1
+
+    def watch_vocabulary(self, listener):
+        """Appeler listener(terme, ajouté) à chaque terme ajouté ou supprimé (hors remplacement complet)"""
+        self._vocabulary_listeners.append(listener)
+
+    def _term_added(self, term):
+        if self._vocabulary is not None:
+            insort(self._vocabulary, term)
+        for listener in self._vocabulary_listeners:
+            listener(term, True)
+
+    def _term_removed(self, term):
+        if self._vocabulary is not None:
+            position = bisect_left(self._vocabulary, term)
+            if position < len(self._vocabulary) and self._vocabulary[position] == term:
+                del self._vocabulary[position]
+        for listener in self._vocabulary_listeners:
+            listener(term, False)
+
+    def _sorted_vocabulary(self):
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        return self._vocabulary
+
+    def prefix_terms(self, field, token, limit=None):
+        """Termes d'un champ commençant par `token` (recherche dichotomique)"""
+        vocabulary = self._sorted_vocabulary()
+        prefix = f"{field}:{token}"
+        terms = []
+
+        position = bisect_left(vocabulary, prefix)
+        while position < len(vocabulary) and vocabulary[position].startswith(prefix):
+            terms.append(vocabulary[position])
+            if limit and len(terms) >= limit:
+                break
+            position += 1
+
+        return terms
+
+    def _prefix_postings(self, field, token):
+        """Union des postings des termes commençant par `token` dans un champ"""
+        matches = set()
+        for term in self.prefix_terms(field, token):
+            matches |= self.postings[term]
+        return matches
+
+    def infix_terms(self, field, token):
+        """Termes d'un champ contenant `token` (parcours du vocabulaire du champ)"""
+        vocabulary = self._sorted_vocabulary()
+        start = bisect_left(vocabulary, f"{field}:")
+        end = bisect_left(vocabulary, f"{field};")  # ';' suit ':' dans l'ordre des caractères
+        return [term for term in vocabulary[start:end] if token in term[2:]]
+
+    def _token_postings(self, fields, token):
+        """Documents dont un token d'un des champs commence par `token`
+
+        À défaut, ceux dont un token le contient ("ayrand" -> "mayrand"): le
+        vocabulaire est alors parcouru, mais pas les documents.
+        """
+        matches = set()
+        for field in fields:
+            matches |= self._prefix_postings(field, token)
+        if not matches and len(token) >= MIN_INFIX_LENGTH:
+            for field in fields:
+                for term in self.infix_terms(field, token):
+                    matches |= self.postings[term]
+        return matches
+
+    def lookup(self, sources, keyword=None, author=None, year=None, doc_type=None):
+        """Retourner les doc_id correspondant aux critères
+
+        Sources, type et année (ou intervalle '2015-2020') sont des ET entre
+        bitmaps de facettes. Les mots-clés et auteurs sont comparés token par
+        token: chaque token de la requête doit préfixer au moins un token du
+        document, ou à défaut y être contenu ("ayrand" trouve "Mayrand").
+
+        Contrairement à l'ancien parcours linéaire, un mot-clé ne porte que
+        sur le titre, l'auteur et le nom de fichier (ni la source, ni le type,
+        ni le chemin complet), et ses tokens se combinent par ET quel que soit
+        leur ordre ("moment map" trouve aussi "map of the moment").
+        """
+        allowed = self.facets.union('source', sources)
+        bounds = parse_year_range(year) if year else None
+        if bounds:  # Année illisible: critère ignoré, comme dans le filtre classique
+            allowed &= self.facets.year_range(*bounds)
+        if doc_type:
+            allowed &= self.facets.bitmap('type', doc_type.strip().lower())
+
+        candidates = None
+        token_fields = [((FIELD_AUTHOR,), token) for token in tokenize(author)] if author else []
+        if keyword:
+            token_fields += [(KEYWORD_FIELDS, token) for token in tokenize(keyword)]
+        for fields, token in token_fields:
+            if not allowed or candidates == set():
+                break
+            matches = self._token_postings(fields, token)
+            candidates = matches if candidates is None else candidates & matches
+
+        size = popcount(allowed)
+        if size == len(self.keys):
+            # Aucun filtre effectif (toutes les sources, ni année ni type)
+            return set(self.keys.values()) if candidates is None else candidates
+        if candidates is None or size <= len(candidates):
+            rows = set(iter_rows(allowed))
+            return rows if candidates is None else rows & candidates
+        allowed_bytes = allowed.to_bytes(len(self.store.alive) // 8 + 1, 'little')
+        return {doc_id for doc_id in candidates if allowed_bytes[doc_id >> 3] >> (doc_id & 7) & 1}
+
+    def get(self, doc_id, score=0):
+        """Référence indexée au format dict unifié"""
+        return self.store.get(doc_id, score)
+
+    def count(self, source=None):
+        """Nombre de documents indexés (pour une source ou au total)"""
+        if source is None:
+            return len(self.store)
+        return len(self.postings.get(f"{FIELD_SOURCE}:{source}", ()))
+
+
+# Test simple
+if __name__ == "__main__":
+    index = SearchIndex(cache_dir='/tmp/refs-index-test')
+    index.update_source('local', [
+        {'id': '1', 'title': 'Symplectic reduction', 'author': 'Mayrand', 'year': 2020, 'path': 'Mayrand_2020_Symplectic_reduction.pdf'},
+        {'id': '2', 'title': 'Hyperkahler quotients', 'author': 'Hitchin', 'year': 1987, 'path': 'Hitchin_1987_Hyperkahler_quotients.pdf'},
+    ], stamp='test')
+    print(sorted(index.lookup(['local'], keyword='sympl')))
@@ -0,0 +1,486 @@
+"""
+Recherche par similarité: plongements TF-IDF/SVD calculés hors ligne, sur CPU
+
+Chaque référence est décrite par son titre, ses auteurs, son résumé (BibTeX)
+et le texte extrait du PDF (commande extract). Un modèle TF-IDF est ajusté sur
+la bibliothèque puis réduit par SVD tronquée (randomisée, NumPy seul): chaque
+référence devient un vecteur float32 normalisé, rangé dans une matrice sur
+disque lue par memmap. Seules les références nouvelles ou modifiées sont
+recalculées; le modèle n'est réajusté que lorsque la bibliothèque a doublé
+depuis le dernier ajustement (ou avec --rebuild).
+
+La recherche calcule les cosinus par blocs de lignes (produit matriciel) et
+garde les k meilleurs. Au-delà de IVF_MIN_VECTORS références, un index IVF
+(k-means sphérique) limite le calcul aux listes des centroïdes les plus
+proches de la requête.
+"""
+
+import hashlib
+import json
+import math
+import os
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from ranking import tokenize
+
+SEMANTIC_VERSION = 1
+DIMENSIONS = 128
+MAX_VOCABULARY = 50000
+MIN_DOCUMENT_FREQUENCY = 2
+MAX_TEXT_CHARS = 20000      # Texte extrait pris en compte par document
+FIT_SAMPLE = 20000          # Documents utilisés pour ajuster le modèle
+REFIT_GROWTH = 2.0          # Réajuster quand la bibliothèque a doublé
+EMBED_BATCH = 1024
+SCORE_BATCH = 65536         # Lignes de la matrice lues par produit matriciel
+IVF_MIN_VECTORS = 50000
+IVF_PROBES = 8
+IVF_RETRAIN_GROWTH = 1.5
+MIN_SIMILARITY = 0.05       # En dessous: bruit numérique, aucun terme en commun
+
+STOPWORDS = frozenset("""
+the and for with from that this are was were which into onto over under between their there these those
+our its not but can has have had all any also such than then them they thus where when while each both
+les des une pour par dans sur avec sans sont est aux que qui ses son leur leurs cette ces entre plus
+""".split())
+
+
+def _terms(text):
+    return Counter(t for t in tokenize(text) if len(t) > 2 and not t.isdigit() and t not in STOPWORDS)
+
+
+def _csr_dot(indptr, indices, data, matrix, block=1024):
+    """Produit (matrice creuse CSR) x (matrice dense), par blocs d'environ `block` valeurs"""
+    rows = len(indptr) - 1
+    result = np.zeros((rows, matrix.shape[1]), dtype=np.float32)
+    start = 0
+    while start < rows:
+        end = max(start + 1, int(np.searchsorted(indptr, indptr[start] + block, side='right')) - 1)
+        end = min(end, rows)
+        lo, hi = indptr[start], indptr[end]
+        if lo < hi:
+            products = data[lo:hi, None] * matrix[indices[lo:hi]]
+            local = indptr[start:end + 1] - lo
+            nonempty = np.nonzero(np.diff(local))[0]
+            result[start + nonempty] = np.add.reduceat(products, local[nonempty], axis=0)
+        start = end
+    return result
+
+
+def _csr_transpose(indptr, indices, data, columns):
+    """Transposée d'une matrice CSR (tri par comptage des colonnes)"""
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    order = np.argsort(indices, kind='stable')
+    t_indptr = np.zeros(columns + 1, dtype=np.int64)
+    np.cumsum(np.bincount(indices, minlength=columns), out=t_indptr[1:])
+    return t_indptr, rows[order], data[order]
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (vectors / norms).astype(np.float32)
+
+
+class TfidfSvdModel:
+    """Vocabulaire, IDF et projection SVD (termes x dimensions)"""
+
+    def __init__(self, terms=(), idf=None, components=None):
+        self.terms = list(terms)
+        self.vocabulary = {term: i for i, term in enumerate(self.terms)}
+        self.idf = idf
+        self.components = components
+
+    @property
+    def dimensions(self):
+        return self.components.shape[1]
+
+    def _matrix(self, term_counts):
+        """TF-IDF (tf logarithmique, lignes normalisées) au format CSR"""
+        indptr, indices, data = [0], [], []
+        vocabulary = self.vocabulary
+        for terms in term_counts:
+            counts = [(vocabulary[t], n) for t, n in terms.items() if t in vocabulary]
+            weights = [(1 + math.log(n)) * self.idf[i] for i, n in counts]
+            norm = math.sqrt(sum(w * w for w in weights)) or 1.0
+            indices.extend(i for i, _ in counts)
+            data.extend(w / norm for w in weights)
+            indptr.append(len(indices))
+        return np.array(indptr, dtype=np.int64), np.array(indices, dtype=np.int64), np.array(data, dtype=np.float32)
+
+    @classmethod
+    def fit(cls, texts, dimensions=DIMENSIONS, seed=0):
+        """Ajuster le vocabulaire et la SVD tronquée randomisée sur des textes"""
+        term_counts = [_terms(text) for text in texts]
+        frequencies = Counter()
+        for terms in term_counts:
+            frequencies.update(terms.keys())
+        minimum = MIN_DOCUMENT_FREQUENCY if len(texts) >= 20 else 1
+        terms = [t for t, n in frequencies.most_common(MAX_VOCABULARY) if n >= minimum]
+        if not terms:
+            return None
+
+        idf = np.array([math.log((1 + len(texts)) / (1 + frequencies[t])) + 1 for t in terms], dtype=np.float32)
+        model = cls(terms, idf)
+        matrix = model._matrix(term_counts)
+        del term_counts
+        transposed = _csr_transpose(*matrix, len(terms))
+
+        # Halko et al.: espace image approché par projection aléatoire et itérations de puissance
+        rank = min(dimensions, len(terms), len(texts))
+        rng = np.random.default_rng(seed)
+        omega = rng.standard_normal((len(terms), rank + 10)).astype(np.float32)
+        q, _ = np.linalg.qr(_csr_dot(*matrix, omega))
+        for _ in range(2):
+            z, _ = np.linalg.qr(_csr_dot(*transposed, q))
+            q, _ = np.linalg.qr(_csr_dot(*matrix, z))
+        b = _csr_dot(*transposed, q).T
+        _, _, vt = np.linalg.svd(b, full_matrices=False)
+        model.components = np.ascontiguousarray(vt[:rank].T, dtype=np.float32)
+        return model
+
+    def transform(self, texts):
+        """Vecteurs normalisés (float32) de plusieurs textes"""
+        indptr, indices, data = self._matrix(_terms(text) for text in texts)
+        return _normalize(_csr_dot(indptr, indices, data, self.components))
+
+    def save(self, path):
+        tmp_file = path.with_name(path.name + '.tmp.npz')
+        np.savez(tmp_file, terms=np.array(self.terms, dtype=str), idf=self.idf, components=self.components)
+        os.replace(tmp_file, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['terms'].tolist(), data['idf'], data['components'])
+
+
+class SemanticIndex:
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir or os.getenv('CACHE_DIR', 'data/cache'))
+        self.semantic_dir = self.cache_dir / 'semantic'
+        self.meta_file = self.semantic_dir / 'meta.json'
+        self.model_file = self.semantic_dir / 'model.npz'
+        self.vectors_file = self.semantic_dir / 'vectors.f32'
+        self.ivf_file = self.semantic_dir / 'ivf.npz'
+
+        self.meta = self._load_meta()
+        self._model = None
+        self._vectors = None
+        self._ivf = None
+        self._row_keys = None
+
+    # ------------------------------------------------------------------
+    # Persistance
+    # ------------------------------------------------------------------
+
+    def _empty_meta(self):
+        # rows: clé de l'index -> [ligne, empreinte]; free: lignes libérées
+        return {'version': SEMANTIC_VERSION, 'dimensions': 0, 'capacity': 0, 'fitted_documents': 0,
+                'rows': {}, 'free': [], 'ivf_trained': 0}
+
+    def _load_meta(self):
+        try:
+            with open(self.meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('version') == SEMANTIC_VERSION and self.model_file.exists():
+                return meta
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Erreur lecture de l'index sémantique: {e}")
+        return self._empty_meta()
+
+    def _save_meta(self):
+        tmp_file = self.meta_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_file, self.meta_file)
+
+    @property
+    def model(self):
+        if self._model is None and self.model_file.exists() and self.meta['dimensions']:
+            self._model = TfidfSvdModel.load(self.model_file)
+        return self._model
+
+    @property
+    def vectors(self):
+        """Matrice des plongements (memmap, lignes x dimensions)"""
+        if self._vectors is None and self.meta['capacity']:
+            self._vectors = np.memmap(self.vectors_file, dtype=np.float32, mode='r+',
+                                      shape=(self.meta['capacity'], self.meta['dimensions']))
+        return self._vectors
+
+    def _reserve(self, count):
+        """Agrandir la matrice sur disque pour `count` lignes (capacité doublée)"""
+        capacity = self.meta['capacity']
+        if count <= capacity:
+            return
+        self._vectors = None
+        capacity = max(count, capacity * 2, 1024)
+        with open(self.vectors_file, 'ab') as f:
+            f.truncate(capacity * self.meta['dimensions'] * 4)
+        self.meta['capacity'] = capacity
+
+    # ------------------------------------------------------------------
+    # Mise à jour incrémentale
+    # ------------------------------------------------------------------
+
+    def update(self, documents, force=False, ivf=None):
+        """Calculer les plongements manquants
+
+        `documents` est une liste de (clé, empreinte, fonction retournant le
+        texte): le texte n'est lu que pour les documents nouveaux ou modifiés.
+        `ivf` force (True) ou désactive (False) l'index approximatif; None:
+        automatique selon la taille. Retourne un rapport.
+        """
+        self.semantic_dir.mkdir(parents=True, exist_ok=True)
+        stats = {'documents': len(documents), 'embedded': 0, 'removed': 0, 'refit': False}
+        fitted = self.meta['fitted_documents']
+
+        if force or self.model is None or (len(documents) >= 20 and len(documents) >= fitted * REFIT_GROWTH):
+            self._refit(documents)
+            stats['refit'] = True
+
+        self._row_keys = None
+        rows = self.meta['rows']
+        current = {key for key, _, _ in documents}
+        for key in [key for key in rows if key not in current]:
+            row = rows.pop(key)[0]
+            self.meta['free'].append(row)
+            if self.vectors is not None:
+                self.vectors[row] = 0
+            stats['removed'] += 1
+
+        pending = [(key, fingerprint, text) for key, fingerprint, text in documents
+                   if key not in rows or rows[key][1] != fingerprint]
+        if pending and self.model is not None:
+            used = len(rows) + len(self.meta['free'])
+            self._reserve(used + max(0, len(pending) - len(self.meta['free'])))
+            for start in range(0, len(pending), EMBED_BATCH):
+                batch = pending[start:start + EMBED_BATCH]
+                vectors = self.model.transform([text() for _, _, text in batch])
+                for (key, fingerprint, _), vector in zip(batch, vectors):
+                    if key in rows:
+                        row = rows[key][0]
+                    elif self.meta['free']:
+                        row = self.meta['free'].pop()
+                    else:
+                        row = used
+                        used += 1
+                    self.vectors[row] = vector
+                    rows[key] = [row, fingerprint]
+                    self._assign(row, vector)
+                stats['embedded'] += len(batch)
+            self.vectors.flush()
+
+        self._update_ivf(ivf, stats['refit'])
+        self._save_meta()
+        return stats
+
+    def _refit(self, documents):
+        """Réajuster le modèle sur un échantillon puis repartir d'une matrice vide"""
+        sample = documents
+        if len(documents) > FIT_SAMPLE:
+            step = len(documents) / FIT_SAMPLE
+            sample = [documents[int(i * step)] for i in range(FIT_SAMPLE)]
+        model = TfidfSvdModel.fit([text() for _, _, text in sample])
+
+        self._vectors = None
+        self._ivf = None
+        for path in (self.vectors_file, self.ivf_file):
+            if path.exists():
+                path.unlink()
+        self.meta = self._empty_meta()
+        if model is None:
+            return
+        model.save(self.model_file)
+        self._model = model
+        self.meta['dimensions'] = model.dimensions
+        self.meta['fitted_documents'] = len(documents)
+
+    # ------------------------------------------------------------------
+    # Index IVF
+    # ------------------------------------------------------------------
+
+    @property
+    def ivf(self):
+        if self._ivf is None and self.ivf_file.exists():
+            with np.load(self.ivf_file) as data:
+                self._ivf = {'centroids': data['centroids'], 'assignments': data['assignments']}
+        return self._ivf
+
+    def _assign(self, row, vector):
+        ivf = self.ivf
+        if ivf is None:
+            return
+        if row >= len(ivf['assignments']):
+            grown = np.full(self.meta['capacity'], -1, dtype=np.int32)
+            grown[:len(ivf['assignments'])] = ivf['assignments']
+            ivf['assignments'] = grown
+        ivf['assignments'][row] = int(np.argmax(ivf['centroids'] @ vector))
+        ivf.pop('lists', None)
+
+    def _lists(self):
+        """Listes inversées: lignes triées par centroïde et bornes de chaque liste"""
+        ivf = self.ivf
+        if 'lists' not in ivf:
+            order = np.argsort(ivf['assignments'], kind='stable')
+            bounds = np.searchsorted(ivf['assignments'][order], np.arange(len(ivf['centroids']) + 1))
+            ivf['lists'] = (order, bounds)
+        return ivf['lists']
+
+    def _update_ivf(self, ivf, refit):
+        count = len(self.meta['rows'])
+        wanted = ivf if ivf is not None else count >= IVF_MIN_VECTORS
+        if not wanted or not count:
+            if self.ivf_file.exists():
+                self.ivf_file.unlink()
+            self._ivf = None
+            self.meta['ivf_trained'] = 0
+            return
+
+        trained = self.meta['ivf_trained']
+        if self.ivf is None or refit or count >= trained * IVF_RETRAIN_GROWTH or count * IVF_RETRAIN_GROWTH <= trained:
+            self._train_ivf()
+        else:
+            free = self.meta['free']
+            if free:
+                self.ivf['assignments'][free] = -1
+                self.ivf.pop('lists', None)
+        tmp_file = self.ivf_file.with_name('ivf.tmp.npz')
+        np.savez(tmp_file, centroids=self._ivf['centroids'], assignments=self._ivf['assignments'])
+        os.replace(tmp_file, self.ivf_file)
+
+    def _train_ivf(self, iterations=10, seed=0):
+        """k-means sphérique (√n listes) sur un échantillon des plongements"""
+        rows = np.array(sorted(row for row, _ in self.meta['rows'].values()), dtype=np.int64)
+        lists = max(1, int(math.sqrt(len(rows))))
+        rng = np.random.default_rng(seed)
+        sample = self.vectors[np.sort(rng.choice(rows, size=min(len(rows), lists * 64), replace=False))]
+        centroids = sample[rng.choice(len(sample), size=lists, replace=False)].copy()
+        for _ in range(iterations):
+            nearest = np.argmax(sample @ centroids.T, axis=1)
+            for cluster in range(lists):
+                members = sample[nearest == cluster]
+                if len(members):
+                    centroids[cluster] = members.sum(axis=0)
+            centroids = _normalize(centroids)
+
+        assignments = np.full(self.meta['capacity'], -1, dtype=np.int32)
+        for start in range(0, len(rows), SCORE_BATCH):
+            batch = rows[start:start + SCORE_BATCH]
+            assignments[batch] = np.argmax(self.vectors[batch] @ centroids.T, axis=1)
+        self._ivf = {'centroids': centroids, 'assignments': assignments}
+        self.meta['ivf_trained'] = len(rows)
+
+    # ------------------------------------------------------------------
+    # Requêtes
+    # ------------------------------------------------------------------
+
+    def embed(self, text):
+        if self.model is None:
+            return None
+        return self.model.transform([text])[0]
+
+    def vector(self, key):
+        entry = self.meta['rows'].get(key)
+        if entry is None or self.vectors is None:
+            return None
+        return np.array(self.vectors[entry[0]])
+
+    def nearest(self, query, limit=10, exclude=(), probes=IVF_PROBES, min_score=MIN_SIMILARITY):
+        """[(clé, cosinus)] des `limit` plongements les plus proches d'un vecteur, cosinus >= `min_score`"""
+        if self.vectors is None or query is None or not np.any(query):
+            return []
+        excluded = {self.meta['rows'][key][0] for key in exclude if key in self.meta['rows']}
+        wanted = limit + len(excluded)
+        used = len(self.meta['rows']) + len(self.meta['free'])
+        best_rows, best_scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        if self.ivf is not None:
+            order, bounds = self._lists()
+            probed = np.argsort(-(self.ivf['centroids'] @ query))[:probes]
+            candidates = np.sort(np.concatenate([order[bounds[c]:bounds[c + 1]] for c in probed]))
+            batches = (candidates[start:start + SCORE_BATCH] for start in range(0, len(candidates), SCORE_BATCH))
+        else:
+            batches = (np.arange(start, min(start + SCORE_BATCH, used)) for start in range(0, used, SCORE_BATCH))
+
+        for batch in batches:
+            scores = self.vectors[batch] @ query if self.ivf is not None else \
+                self.vectors[batch[0]:batch[-1] + 1] @ query
+            if len(scores) > wanted:
+                top = np.argpartition(-scores, wanted)[:wanted]
+                batch, scores = batch[top], scores[top]
+            best_rows = np.concatenate([best_rows, batch])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_scores) > wanted:
+                top = np.argpartition(-best_scores, wanted)[:wanted]
+                best_rows, best_scores = best_rows[top], best_scores[top]
+
+        results = []
+        keys_by_row = self._keys_by_row()
+        for position in np.argsort(-best_scores):
+            if best_scores[position] < min_score:
+                break
+            row = int(best_rows[position])
+            if row in keys_by_row and row not in excluded:
+                results.append((keys_by_row[row], float(best_scores[position])))
+        return results[:limit]
+
+    def _keys_by_row(self):
+        if self._row_keys is None:
+            self._row_keys = {row: key for key, (row, _) in self.meta['rows'].items()}
+        return self._row_keys
+
+
+def reference_documents(index, content_cache, bibtex_entries=()):
+    """(clé, empreinte, texte) de chaque référence indexée, le texte étant lu à la demande
+
+    Le texte réunit titre, auteurs, résumé BibTeX et texte extrait du PDF;
+    l'empreinte change si l'un d'eux change.
+    """
+    abstracts = {entry['key']: entry.get('abstract') or '' for entry in bibtex_entries}
+    paths = content_cache.manifest['paths']
+    documents = []
+    for key, doc_id in index.keys.items():
+        reference = index.get(doc_id)
+        digest = paths.get(reference['path'], [None, None, None])[2] if key.startswith('local:') else None
+        abstract = abstracts.get(reference['id'], '') if key.startswith('bibtex:') else ''
+        fingerprint = hashlib.sha1(json.dumps(
+            [index.fingerprints.get(doc_id), digest, abstract]).encode('utf-8')).hexdigest()[:16]
+
+        def text(reference=reference, digest=digest, abstract=abstract):
+            content = content_cache.text(digest)[:MAX_TEXT_CHARS] if digest else ''
+            return ' '.join((reference['title'], reference['author'], abstract, content))
+
+        documents.append((key, fingerprint, text))
+    return documents
+
+
+# Test simple: recherche exacte contre IVF sur des vecteurs aléatoires
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    count = int(os.getenv('SEMANTIC_VECTORS', '200000'))
+    with tempfile.TemporaryDirectory() as tmp:
+        semantic = SemanticIndex(tmp)
+        semantic.semantic_dir.mkdir(parents=True)
+        semantic.meta['dimensions'] = DIMENSIONS
+        semantic._reserve(count)
+        rng = np.random.default_rng(0)
+        for start in range(0, count, SCORE_BATCH):
+            end = min(start + SCORE_BATCH, count)
+            semantic.vectors[start:end] = _normalize(rng.standard_normal((end - start, DIMENSIONS)))
+        semantic.meta['rows'] = {f"doc:{row}": [row, ''] for row in range(count)}
+        query = semantic.vector('doc:42') + 0.1 * rng.standard_normal(DIMENSIONS).astype(np.float32)
+
+        for label, use_ivf in (('exact', False), ('ivf', True)):
+            semantic._update_ivf(use_ivf, refit=False)
+            semantic.nearest(_normalize(query[None])[0], limit=10)
+            start = time.perf_counter()
+            found = semantic.nearest(_normalize(query[None])[0], limit=10)
+            print(f"{label:6} {(time.perf_counter() - start) * 1000:8.2f} ms  premier: {found[0]}")
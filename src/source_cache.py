@@ -0,0 +1,294 @@
+"""
+Cache partagé des listes de fichiers de toutes les sources
+
+Deux niveaux: un cache LRU en mémoire (dans le processus) devant une base
+SQLite en mode WAL (CACHE_DIR/sources.db), partagée entre les processus.
+Chaque synchronisation publie une nouvelle version de la liste d'une source:
+les lignes sont écrites puis le pointeur de version est basculé dans la même
+transaction, et les lectures se font dans une transaction. Un lecteur voit
+donc soit l'ancienne liste complète, soit la nouvelle, jamais un mélange.
+
+La table `snapshots` garde, par source, le nombre de fichiers, la génération
+et la date de synchronisation: count() et last_sync() ne lisent qu'une ligne.
+Chaque source a une durée de validité (CACHE_TTL_<SOURCE>, en secondes) au-delà
+de laquelle elle doit être resynchronisée, et la base est bornée en taille
+(CACHE_MAX_BYTES): les sources les moins récemment lues sont évincées.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: pas de verrou entre processus
+    fcntl = None
+
+SCHEMA_VERSION = 1
+CHUNK_FILES = 1000  # Fichiers par ligne SQLite
+
+DEFAULT_TTLS = {'local': 300, 'bibtex': 300, 'drive': 3600, 'github': 3600}
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_MEMORY_FILES = 500000
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def published_since(snapshot, generation, last_sync):
+    """Vrai si l'état publié est plus récent qu'un manifeste chargé en mémoire
+
+    Un autre processus (sync, add, import) a pu publier une nouvelle
+    génération ou une synchronisation plus récente depuis le chargement.
+    """
+    if snapshot is None:
+        return False
+    return (snapshot['generation'] or 0, snapshot['last_sync'] or '') > (generation or 0, last_sync or '')
+
+
+def file_stamp(path):
+    """(mtime_ns, taille) d'un fichier, None s'il n'existe pas"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+@contextmanager
+def manifest_lock(manifest_file):
+    """Verrou exclusif autour d'une lecture-modification-écriture d'un manifeste
+
+    Verrou flock sur un fichier voisin (manifeste.lock): il sérialise les
+    processus (serve, sync, add, import) comme les threads d'un même processus.
+    """
+    manifest_file = Path(manifest_file)
+    manifest_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(f"{manifest_file}.lock", 'a') as lock:
+        if fcntl:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def get_source_cache(cache_dir=None):
+    """Cache partagé par tous les managers d'un même dossier de cache"""
+    path = Path(cache_dir or os.getenv('CACHE_DIR', 'data/cache')).resolve()
+    with _instances_lock:
+        cache = _instances.get(path)
+        if cache is None:
+            cache = _instances[path] = SourceCache(path)
+        return cache
+
+
+class SourceCache:
+    def __init__(self, cache_dir=None, max_bytes=None, memory_files=None):
+        self.cache_dir = Path(cache_dir or os.getenv('CACHE_DIR', 'data/cache'))
+        self.db_file = self.cache_dir / 'sources.db'
+        self.max_bytes = int(max_bytes or os.getenv('CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        self.memory_files = int(memory_files or os.getenv('CACHE_MEMORY_FILES', DEFAULT_MEMORY_FILES))
+
+        # (source, origine, version) -> liste de fichiers, du moins au plus récemment lu
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()  # Une connexion SQLite par thread
+
+        self.hits = 0
+        self.misses = 0
+
+    def ttl(self, source):
+        return float(os.getenv(f"CACHE_TTL_{source.upper()}", DEFAULT_TTLS.get(source, 600)))
+
+    # ------------------------------------------------------------------
+    # SQLite
+    # ------------------------------------------------------------------
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(str(self.db_file), timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    source TEXT PRIMARY KEY,
+                    origin TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    generation INTEGER,
+                    count INTEGER NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    last_sync TEXT,
+                    synced_at REAL,
+                    accessed_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS files (
+                    source TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    chunk INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (source, version, chunk)
+                );
+            """)
+            if connection.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                connection.executescript(f"""
+                    DELETE FROM snapshots;
+                    DELETE FROM files;
+                    PRAGMA user_version = {SCHEMA_VERSION};
+                """)
+            self._local.connection = connection
+        return connection
+
+    def snapshot(self, source, origin=None):
+        """État publié d'une source (None si absent ou publié pour une autre origine)"""
+        row = self._connection().execute(
+            'SELECT origin, version, generation, count, bytes, last_sync, synced_at FROM snapshots WHERE source = ?',
+            (source,)).fetchone()
+        if row is None or (origin is not None and row[0] != origin):
+            return None
+        return {
+            'origin': row[0], 'version': row[1], 'generation': row[2], 'count': row[3],
+            'bytes': row[4], 'last_sync': row[5], 'synced_at': row[6],
+        }
+
+    def publish(self, source, origin, generation, last_sync, files, synced=True):
+        """Publier la liste des fichiers d'une source (bascule atomique)
+
+        `files` peut être une fonction: elle n'est appelée que si la génération
+        a changé. Sinon seule la date de synchronisation est mise à jour.
+        """
+        now = time.time()
+        current = self.snapshot(source, origin)
+        connection = self._connection()
+
+        if current and current['generation'] == generation:
+            connection.execute(
+                'UPDATE snapshots SET last_sync = ?, synced_at = CASE WHEN ? THEN ? ELSE synced_at END WHERE source = ?',
+                (last_sync, synced, now, source))
+            return False
+
+        if callable(files):
+            files = files()
+        chunks = [json.dumps(files[start:start + CHUNK_FILES], ensure_ascii=False)
+                  for start in range(0, len(files), CHUNK_FILES)]
+        size = sum(len(chunk) for chunk in chunks)
+
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT version FROM snapshots WHERE source = ?', (source,)).fetchone()
+            version = (row[0] + 1) if row else 1
+            connection.executemany(
+                'INSERT INTO files (source, version, chunk, data) VALUES (?, ?, ?, ?)',
+                [(source, version, number, chunk) for number, chunk in enumerate(chunks)])
+            connection.execute(
+                'INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (source, origin, version, generation, len(files), size, last_sync,
+                 now if synced else (current['synced_at'] if current else None), now))
+            connection.execute('DELETE FROM files WHERE source = ? AND version < ?', (source, version))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+        self._remember((source, origin, version), list(files))
+        self._evict(keep=source)
+        return True
+
+    def get_files(self, source, origin=None):
+        """Liste des fichiers publiée pour une source (None si absente)"""
+        connection = self._connection()
+        connection.execute('BEGIN')
+        try:
+            row = connection.execute('SELECT origin, version FROM snapshots WHERE source = ?', (source,)).fetchone()
+            if row is None or (origin is not None and row[0] != origin):
+                return None
+            key = (source, row[0], row[1])
+
+            with self._lock:
+                files = self._memory.get(key)
+                if files is not None:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+            if files is None:
+                self.misses += 1
+                files = []
+                for (data,) in connection.execute(
+                        'SELECT data FROM files WHERE source = ? AND version = ? ORDER BY chunk', (source, row[1])):
+                    files.extend(json.loads(data))
+                self._remember(key, files)
+        finally:
+            connection.execute('COMMIT')
+
+        connection.execute('UPDATE snapshots SET accessed_at = ? WHERE source = ?', (time.time(), source))
+        return list(files)
+
+    def is_expired(self, source, origin=None):
+        """Vrai si la source n'a jamais été publiée ou si sa durée de validité est dépassée"""
+        snapshot = self.snapshot(source, origin)
+        if not snapshot or snapshot['synced_at'] is None:
+            return True
+        return time.time() - snapshot['synced_at'] > self.ttl(source)
+
+    def invalidate(self, source):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        connection.execute('DELETE FROM files WHERE source = ?', (source,))
+        connection.execute('DELETE FROM snapshots WHERE source = ?', (source,))
+        connection.execute('COMMIT')
+        with self._lock:
+            for key in [key for key in self._memory if key[0] == source]:
+                self._memory_size -= len(self._memory.pop(key))
+
+    def stats(self):
+        """État de toutes les sources publiées (une ligne par source)"""
+        rows = self._connection().execute(
+            'SELECT source, count, bytes, last_sync, synced_at FROM snapshots ORDER BY source').fetchall()
+        now = time.time()
+        return {
+            source: {
+                'count': count,
+                'bytes': size,
+                'last_sync': last_sync,
+                'expired': synced_at is None or now - synced_at > self.ttl(source),
+            }
+            for source, count, size, last_sync, synced_at in rows
+        }
+
+    # ------------------------------------------------------------------
+    # Éviction
+    # ------------------------------------------------------------------
+
+    def _remember(self, key, files):
+        """Garder une liste en mémoire, en évinçant les moins récemment lues"""
+        with self._lock:
+            if key in self._memory:
+                return
+            # Les versions précédentes de la même source sont périmées
+            for stale in [k for k in self._memory if k[0] == key[0]]:
+                self._memory_size -= len(self._memory.pop(stale))
+            self._memory[key] = files
+            self._memory_size += len(files)
+            while self._memory_size > self.memory_files and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+
+    def _evict(self, keep):
+        """Supprimer de la base les sources les moins récemment lues si elle dépasse max_bytes"""
+        rows = self._connection().execute(
+            'SELECT source, bytes FROM snapshots ORDER BY accessed_at').fetchall()
+        total = sum(size for _, size in rows)
+        for source, size in rows:
+            if total <= self.max_bytes:
+                break
+            if source != keep:
+                self.invalidate(source)
+                total -= size
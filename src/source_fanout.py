@@ -0,0 +1,71 @@
+"""
+Exécution concurrente des sources (Google Drive, GitHub, fichiers locaux)
+
+Chaque source tourne dans son propre thread; les résultats sont renvoyés au fur
+et à mesure qu'ils arrivent, de sorte que le temps total est celui de la source
+la plus lente (et non la somme des sources). Une source qui dépasse son délai
+est abandonnée: son thread (daemon) ne bloque ni les autres sources ni la
+sortie du programme.
+"""
+
+import os
+import queue
+import threading
+import time
+
+DEFAULT_SOURCE_TIMEOUT = float(os.getenv('SOURCE_TIMEOUT', '30'))
+
+
+class SourceTimeout(Exception):
+    """Une source n'a pas répondu dans le délai imparti"""
+
+
+def fan_out(tasks, timeout=None):
+    """Lancer les tâches en parallèle et produire (nom, résultat, erreur) dès qu'elles terminent
+
+    `tasks` associe un nom de source à une fonction sans argument.
+    `timeout` est soit un nombre de secondes commun, soit un dict {nom: secondes}.
+    Les sources en échec ou hors délai sont renvoyées avec leur erreur, sans
+    empêcher les autres de terminer.
+    """
+    if not tasks:
+        return
+
+    if timeout is None:
+        timeout = DEFAULT_SOURCE_TIMEOUT
+
+    results = queue.Queue()
+    start = time.monotonic()
+    deadlines = {}
+
+    def run(name, task):
+        try:
+            results.put((name, task(), None))
+        except Exception as e:
+            results.put((name, None, e))
+
+    for name, task in tasks.items():
+        source_timeout = timeout.get(name, DEFAULT_SOURCE_TIMEOUT) if isinstance(timeout, dict) else timeout
+        deadlines[name] = start + source_timeout
+        thread = threading.Thread(target=run, args=(name, task), name=f"source-{name}", daemon=True)
+        thread.start()
+
+    pending = set(tasks)
+    while pending:
+        # Attendre jusqu'à la prochaine échéance parmi les sources restantes
+        remaining = min(deadlines[name] for name in pending) - time.monotonic()
+        try:
+            name, result, error = results.get(timeout=max(remaining, 0))
+        except queue.Empty:
+            now = time.monotonic()
+            for name in sorted(pending):
+                if deadlines[name] <= now:
+                    pending.discard(name)
+                    elapsed = now - start
+                    yield name, None, SourceTimeout(f"délai dépassé après {elapsed:.1f}s")
+            continue
+
+        # Un résultat arrivé après l'abandon de la source est ignoré
+        if name in pending:
+            pending.discard(name)
+            yield name, result, error
@@ -71,4 +71,51 @@ for var in env_vars:
     else:
         print(f"❌ {var} - NON CONFIGURÉ")
 
+# Test 6: Temps de démarrage de la CLI (imports paresseux)
+print("\n⏱️ Démarrage de la CLI:")
+import subprocess
+
+STARTUP_BUDGET_MS = float(os.getenv('STARTUP_BUDGET_MS', '150'))
+# Modules lourds qui ne doivent pas être chargés par ces commandes
+HEAVY_MODULES = ('requests', 'googleapiclient', 'github', 'pandas', 'reference_search',
+                 'google_drive_manager', 'github_manager', 'local_files_manager')
+startup_checks = [
+    (['--help'], HEAVY_MODULES + ('rich',), True),
+    (['config'], HEAVY_MODULES, False),
+]
+startup_failed = False
+
+for args, forbidden, budgeted in startup_checks:
+    command = ' '.join(args)
+    try:
+        output = subprocess.run(
+            [sys.executable, '-X', 'importtime', 'src/main.py'] + args,
+            capture_output=True, text=True, timeout=60
+        ).stderr
+    except Exception as e:
+        print(f"❌ main.py {command} - {e}")
+        startup_failed = True
+        continue
+
+    # Lignes "import time: self | cumulé | module"
+    imported = {}
+    for line in output.splitlines():
+        if line.startswith('import time:') and '|' in line and 'self [us]' not in line:
+            own, _, module = line[len('import time:'):].split('|')
+            imported[module.strip()] = int(own)
+    total_ms = sum(imported.values()) / 1000
+
+    loaded = [m for m in imported if m.split('.')[0] in forbidden]
+    if loaded:
+        print(f"❌ main.py {command} - modules chargés inutilement: {', '.join(sorted(set(loaded)))}")
+        startup_failed = True
+    elif budgeted and total_ms > STARTUP_BUDGET_MS:
+        print(f"❌ main.py {command} - {total_ms:.0f} ms d'imports (budget {STARTUP_BUDGET_MS:.0f} ms)")
+        startup_failed = True
+    else:
+        print(f"✅ main.py {command} - {total_ms:.0f} ms d'imports")
+
 print("\n🎯 Test terminé!")
+
+if startup_failed:
+    sys.exit(1)
@@ -0,0 +1,21 @@
+"""
+Configuration commune des tests: les modules de src/ s'importent à plat,
+la fausse API de benchmark.py sert de serveur Drive/GitHub local
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+sys.path.insert(1, str(ROOT))
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """Dossier de cache isolé (CACHE_DIR) pour chaque test"""
+    directory = tmp_path / 'cache'
+    monkeypatch.setenv('CACHE_DIR', str(directory))
+    return directory
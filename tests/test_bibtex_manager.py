@@ -0,0 +1,41 @@
+"""
+Tests du gestionnaire BibTeX (configuration des chemins, clés en double)
+"""
+
+from bibtex_manager import BibTeXManager
+
+
+def write_bib(path, key, title):
+    path.write_text(f"@article{{{key},\n  title = {{{title}}},\n  author = {{Dupont, Jean}},\n"
+                    f"  year = {{2015}}\n}}\n", encoding='utf-8')
+
+
+def test_source_disabled_without_bibtex_paths(tmp_path, cache_dir, monkeypatch):
+    # Un .bib dans le dossier local n'est pas parcouru implicitement
+    write_bib(tmp_path / 'refs.bib', 'dupont2015', 'Géométrie')
+    monkeypatch.delenv('BIBTEX_PATHS', raising=False)
+    monkeypatch.setenv('LOCAL_REFS_PATH', str(tmp_path))
+    manager = BibTeXManager()
+    assert manager.bib_paths == []
+    assert manager.sync() == 0
+
+
+def test_duplicate_keys_in_two_files_are_kept(tmp_path, cache_dir):
+    first, second = tmp_path / 'a.bib', tmp_path / 'b.bib'
+    write_bib(first, 'dupont2015', 'Premier titre')
+    write_bib(second, 'dupont2015', 'Second titre')
+    manager = BibTeXManager(bib_paths=[str(tmp_path)])
+    assert manager.sync() == 2
+
+    entries = manager.find(key='dupont2015')
+    assert sorted(entry['title'] for entry in entries) == ['Premier titre', 'Second titre']
+    assert sorted(entry['bib'] for entry in entries) == [str(first), str(second)]
+    assert len({entry['id'] for entry in manager.get_cached_files()}) == 2
+
+    # Supprimer un des deux fichiers ne retire que son entrée
+    generation = manager.generation()
+    second.unlink()
+    assert manager.sync() == 1
+    upserts, removed = manager.get_changes(generation)
+    assert upserts == [] and removed == [f"{second}#dupont2015"]
+    assert [entry['title'] for entry in manager.find(key='dupont2015')] == ['Premier titre']
@@ -0,0 +1,59 @@
+"""
+Tests du graphe de citations (CSR en mmap, reconstruction concurrente, requêtes multi-nœuds)
+"""
+
+from array import array
+
+from citation_graph import CitationGraph, _csr
+
+# a et b citent x et y, c cite x et z, d cite z
+KEYS = ['doi:a', 'doi:b', 'doi:c', 'doi:d', 'doi:x', 'doi:y', 'doi:z']
+EDGES = [('doi:a', 'doi:x'), ('doi:a', 'doi:y'), ('doi:b', 'doi:x'), ('doi:b', 'doi:y'),
+         ('doi:c', 'doi:x'), ('doi:c', 'doi:z'), ('doi:d', 'doi:z')]
+
+
+def write_graph(cache_dir, title='Article'):
+    ids = {key: i for i, key in enumerate(KEYS)}
+    sources = array('i', [ids[source] for source, _ in EDGES])
+    targets = array('i', [ids[target] for _, target in EDGES])
+    out_offsets, out_targets = _csr(len(KEYS), sources, targets)
+    in_offsets, in_sources = _csr(len(KEYS), targets, sources)
+    nodes = {'keys': KEYS, 'titles': [f"{title} {key[4:]}" for key in KEYS], 'authors': [''] * len(KEYS),
+             'years': [0] * len(KEYS), 'paths': [''] * len(KEYS)}
+    CitationGraph(cache_dir)._write({'out_offsets': out_offsets, 'out_targets': out_targets,
+                                     'in_offsets': in_offsets, 'in_sources': in_sources}, nodes, {},
+                                    {'signature': title, 'nodes': len(KEYS), 'edges': len(EDGES), 'documents': 4})
+
+
+def test_loaded_reader_survives_rebuild(tmp_path):
+    write_graph(tmp_path, 'Ancien')
+    reader = CitationGraph(tmp_path)
+    assert reader.load()
+
+    # Reconstruction par un autre processus: l'ancienne version est supprimée
+    write_graph(tmp_path, 'Nouveau')
+    assert not (tmp_path / 'citations' / 'v1').exists()
+    assert reader.describe(reader.node_id('doi:x'))['title'] == 'Ancien x'
+    assert sorted(reader.cited_by(reader.node_id('doi:x'))) == [0, 1, 2]
+    reader.close()
+
+    assert reader.load()
+    assert reader.describe(4)['title'] == 'Nouveau x'
+    reader.close()
+
+
+def test_cocited_and_coupled_aggregate_all_seeds(tmp_path):
+    write_graph(tmp_path)
+    graph = CitationGraph(tmp_path)
+    x, y, z = (graph.node_id(key) for key in ('doi:x', 'doi:y', 'doi:z'))
+    a, b, c, d = (graph.node_id(key) for key in ('doi:a', 'doi:b', 'doi:c', 'doi:d'))
+
+    assert graph.co_cited([y]) == [(x, 2)]
+    # Seeds y et z: x est cité avec y (par a et b) et avec z (par c); les seeds sont exclus
+    assert graph.co_cited([y, z]) == [(x, 3)]
+
+    assert graph.coupled([d]) == [(c, 1)]
+    assert graph.coupled([a, d]) == [(b, 2), (c, 2)]
+    # Texte ambigu: tous les nœuds correspondants servent de départ
+    assert graph.resolve('Article') == list(range(len(KEYS)))
+    graph.close()
@@ -0,0 +1,38 @@
+"""
+Tests de l'analyse des noms de fichiers et de son cache disque
+"""
+
+from filename_parser import FilenameParseCache, parse_filename
+
+
+def test_parse_filename():
+    assert parse_filename('Mayrand 2019 Hyperkahler quotients.pdf') == ('Mayrand, Maxence', 2019, 'Mayrand Hyperkahler quotients')
+
+
+def test_cache_shared_between_instances(cache_dir):
+    cache = FilenameParseCache(cache_dir)
+    parsed = cache.parse('Smith 2015 Derived stacks.pdf')
+    cache.save()
+
+    other = FilenameParseCache(cache_dir)
+    assert other.parse('Smith 2015 Derived stacks.pdf') == parsed
+    assert not other.pending  # Lu depuis la base, pas réanalysé
+
+
+def test_cache_is_capped(cache_dir):
+    cache = FilenameParseCache(cache_dir, max_entries=3)
+    for i in range(5):
+        cache.parse(f"Author {2000 + i} Title {i}.pdf")
+        cache.save()
+
+    names = set(FilenameParseCache(cache_dir)._load())
+    assert names == {f"Author {2000 + i} Title {i}.pdf" for i in (2, 3, 4)}  # Les plus anciens évincés
+
+
+def test_prune_forgets_names_absent_from_sources(cache_dir):
+    cache = FilenameParseCache(cache_dir)
+    for name in ('kept.pdf', 'deleted.pdf'):
+        cache.parse(name)
+    assert cache.prune(['kept.pdf', 'never parsed.pdf']) == 1
+    assert set(cache.entries) == {'kept.pdf'}
+    assert set(FilenameParseCache(cache_dir)._load()) == {'kept.pdf'}
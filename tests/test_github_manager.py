@@ -0,0 +1,136 @@
+"""
+Tests de la synchronisation GitHub contre la fausse API locale (benchmark.FakeAPI)
+"""
+
+import pytest
+
+from benchmark import GITHUB_REPO, FakeAPI
+from github_manager import GitHubManager
+
+
+def blob(path, sha, size=100):
+    return {'path': path, 'type': 'blob', 'sha': sha, 'size': size}
+
+
+def tree(path, sha):
+    return {'path': path, 'type': 'tree', 'sha': sha}
+
+
+@pytest.fixture
+def repository(cache_dir):
+    """Dépôt de deux dossiers; la racine change quand un dossier change"""
+    trees = {
+        'tree-a1': [blob('Dupont 2015 Symplectique.pdf', 'blob-1'), blob('notes.txt', 'blob-2')],
+        'tree-b1': [blob('Martin 2018 Quivers.pdf', 'blob-3')],
+        'root-1': [tree('a', 'tree-a1'), tree('b', 'tree-b1'), blob('README.md', 'blob-4')],
+    }
+    library = {'drive': {}, 'github': {'root': 'root-1', 'trees': trees}}
+    with FakeAPI(library) as api:
+        yield library, api
+
+
+def manager_for(api):
+    return GitHubManager(repo=GITHUB_REPO, branch='main', api_url=api.url)
+
+
+def tree_requests(api):
+    return [path for path in api.requests if '/git/trees/' in path]
+
+
+def test_first_sync_uses_recursive_listing(repository):
+    library, api = repository
+    manager = manager_for(api)
+    assert manager.sync() == 2
+    assert sorted(f['path'] for f in manager.get_cached_files()) == ['a/Dupont 2015 Symplectique.pdf',
+                                                                     'b/Martin 2018 Quivers.pdf']
+    # Une seule requête d'arbre, les sous-arbres sont rangés dans le manifeste
+    assert tree_requests(api) == [f"/repos/{GITHUB_REPO}/git/trees/root-1?recursive=1"]
+    assert manager.manifest['trees']['tree-b1'] == [['Martin 2018 Quivers.pdf', 'blob', 'blob-3', 100]]
+
+
+def test_truncated_listing_falls_back_to_tree_walk(repository):
+    library, api = repository
+    library['github']['truncated'] = True
+    manager = manager_for(api)
+    assert manager.sync() == 2
+    assert sorted(tree_requests(api)) == sorted([
+        f"/repos/{GITHUB_REPO}/git/trees/root-1?recursive=1",
+        f"/repos/{GITHUB_REPO}/git/trees/root-1",
+        f"/repos/{GITHUB_REPO}/git/trees/tree-a1",
+        f"/repos/{GITHUB_REPO}/git/trees/tree-b1",
+    ])
+
+
+def test_unchanged_branch_answers_304(repository):
+    library, api = repository
+    manager = manager_for(api)
+    manager.sync()
+    generation = manager.generation()
+    del api.requests[:]
+
+    # Nouveau processus: l'ETag vient du manifeste enregistré
+    manager = manager_for(api)
+    assert manager.sync() == 2
+    assert manager.not_modified == 1
+    assert api.requests == [f"/repos/{GITHUB_REPO}/branches/main"]
+    assert manager.generation() == generation
+
+
+def test_delta_fetches_only_new_trees(repository):
+    library, api = repository
+    manager = manager_for(api)
+    manager.sync()
+    generation = manager.generation()
+    del api.requests[:]
+
+    # Un fichier ajouté dans a/, b/ inchangé
+    trees = library['github']['trees']
+    trees['tree-a2'] = trees['tree-a1'] + [blob('Smith 2021 Stacks.pdf', 'blob-5')]
+    trees['root-2'] = [tree('a', 'tree-a2'), tree('b', 'tree-b1'), blob('README.md', 'blob-4')]
+    library['github']['root'] = 'root-2'
+
+    manager = manager_for(api)
+    assert manager.sync() == 3
+    assert tree_requests(api) == [f"/repos/{GITHUB_REPO}/git/trees/root-2",
+                                  f"/repos/{GITHUB_REPO}/git/trees/tree-a2"]
+    upserts, removed = manager.get_changes(generation)
+    assert [f['path'] for f in upserts] == ['a/Smith 2021 Stacks.pdf'] and removed == []
+    # L'ancien arbre de a/ n'est plus atteignable
+    assert 'tree-a1' not in manager.manifest['trees']
+
+
+def test_removing_one_of_two_identical_copies(repository, tmp_path, monkeypatch):
+    library, api = repository
+    trees = library['github']['trees']
+    # Même contenu (même SHA de blob) sous deux chemins
+    trees['tree-b2'] = trees['tree-b1'] + [blob('Dupont 2015 Symplectique.pdf', 'blob-1')]
+    trees['root-2'] = [tree('a', 'tree-a1'), tree('b', 'tree-b2')]
+    library['github']['root'] = 'root-2'
+
+    for variable in ('GOOGLE_DRIVE_FOLDER_ID', 'BIBTEX_PATHS'):
+        monkeypatch.delenv(variable, raising=False)
+    monkeypatch.setenv('LOCAL_REFS_PATH', str(tmp_path / 'refs'))
+    monkeypatch.setenv('GITHUB_REPO', GITHUB_REPO)
+    monkeypatch.setenv('GITHUB_BRANCH', 'main')
+    monkeypatch.setenv('GITHUB_API_URL', api.url)
+    monkeypatch.setenv('QUERY_CACHE_SIZE', '0')
+    from reference_search import ReferenceSearch
+
+    manager = manager_for(api)
+    assert manager.sync() == 3
+    searcher = ReferenceSearch()
+    results = searcher.search(sources='github', keyword='Symplectique', dedupe=False)
+    assert sorted(r['path'].split('/blob/main/')[1] for r in results) == ['a/Dupont%202015%20Symplectique.pdf',
+                                                                           'b/Dupont%202015%20Symplectique.pdf']
+
+    # La copie de a/ disparaît, celle de b/ reste: le SHA est toujours présent
+    trees['tree-a2'] = [blob('notes.txt', 'blob-2')]
+    trees['root-3'] = [tree('a', 'tree-a2'), tree('b', 'tree-b2')]
+    library['github']['root'] = 'root-3'
+    generation = manager.generation()
+    assert manager.sync() == 2
+    upserts, removed = manager.get_changes(generation)
+    assert upserts == [] and removed == ['a/Dupont 2015 Symplectique.pdf']
+
+    results = searcher.search(sources='github', keyword='Symplectique', dedupe=False)
+    assert [r['path'].split('/blob/main/')[1] for r in results] == ['b/Dupont%202015%20Symplectique.pdf']
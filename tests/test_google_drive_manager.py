@@ -0,0 +1,107 @@
+"""
+Tests de la synchronisation Google Drive contre la fausse API locale (benchmark.FakeAPI)
+"""
+
+import pytest
+
+from benchmark import DRIVE_FOLDER, FakeAPI
+from google_drive_manager import FOLDER_MIME_TYPE, GoogleDriveManager
+
+
+def folder(folder_id, parent):
+    return {'id': folder_id, 'name': folder_id, 'mimeType': FOLDER_MIME_TYPE, 'parents': [parent]}
+
+
+def pdf(file_id, name, parent):
+    return {'id': file_id, 'name': name, 'mimeType': 'application/pdf', 'parents': [parent], 'size': '100',
+            'md5Checksum': f"md5-{file_id}", 'modifiedTime': '2024-01-01T00:00:00.000Z'}
+
+
+def change(item, removed=False):
+    """Entrée du flux de changements (seuls les champs demandés par CHANGE_FIELDS)"""
+    return {'fileId': item['id'], 'removed': removed,
+            'file': {key: item[key] for key in ('id', 'mimeType', 'parents')}}
+
+
+@pytest.fixture
+def drive(cache_dir, monkeypatch):
+    """Dossier racine avec un sous-dossier; aucun fichier d'identifiants OAuth"""
+    monkeypatch.setenv('GOOGLE_CREDENTIALS_FILE', str(cache_dir / 'absent.json'))
+    monkeypatch.setenv('GOOGLE_TOKEN_FILE', str(cache_dir / 'absent-token.json'))
+    library = {'drive': {
+        DRIVE_FOLDER: [folder('sub', DRIVE_FOLDER), pdf('f1', 'Dupont 2015 Symplectique.pdf', DRIVE_FOLDER)],
+        'sub': [pdf('f2', 'Martin 2018 Quivers.pdf', 'sub')],
+    }, 'drive_changes': []}
+    with FakeAPI(library) as api:
+        yield library, api
+
+
+def manager_for(api):
+    return GoogleDriveManager(folder_id=DRIVE_FOLDER, api_url=api.url)
+
+
+def names(manager):
+    return sorted(f['name'] for f in manager.get_cached_files())
+
+
+def test_full_listing_then_empty_changes_feed(drive):
+    library, api = drive
+    manager = manager_for(api)
+    assert manager.sync() == 2
+    assert names(manager) == ['Dupont 2015 Symplectique.pdf', 'Martin 2018 Quivers.pdf']
+    assert manager.requests_made == len(api.requests)
+    generation = manager.generation()
+    del api.requests[:]
+
+    # Nouveau processus: le curseur persisté suffit, aucun listing
+    manager = manager_for(api)
+    assert manager.sync() == 2
+    assert [path.split('?')[0] for path in api.requests] == ['/drive/v3/changes']
+    assert manager.generation() == generation
+
+
+def test_changes_feed_transfers_only_deltas(drive):
+    library, api = drive
+    manager = manager_for(api)
+    manager.sync()
+    generation = manager.generation()
+    del api.requests[:]
+
+    # Un fichier ajouté, un fichier supprimé, un dossier entrant avec son contenu
+    added = pdf('f3', 'Smith 2021 Stacks.pdf', DRIVE_FOLDER)
+    moved = folder('moved', DRIVE_FOLDER)
+    library['drive'][DRIVE_FOLDER] += [added, moved]
+    library['drive']['moved'] = [pdf('f4', 'Leroy 2010 Moduli.pdf', 'moved')]
+    removed = library['drive'][DRIVE_FOLDER].pop(1)
+    library['drive_changes'] += [change(added), change(removed, removed=True), change(moved)]
+
+    manager = manager_for(api)
+    assert manager.sync() == 3
+    assert names(manager) == ['Leroy 2010 Moduli.pdf', 'Martin 2018 Quivers.pdf', 'Smith 2021 Stacks.pdf']
+    upserts, removed_ids = manager.get_changes(generation)
+    assert sorted(f['id'] for f in upserts) == ['f3', 'f4'] and removed_ids == ['f1']
+    # Métadonnées du fichier ajouté par une requête batch, seul le dossier entrant est listé
+    paths = [path.split('?')[0] for path in api.requests]
+    assert paths.count('/batch/drive/v3') == 1 and paths.count('/drive/v3/files') == 1
+
+
+def test_folder_moved_out_drops_its_files(drive):
+    library, api = drive
+    manager = manager_for(api)
+    manager.sync()
+
+    sub = library['drive'][DRIVE_FOLDER][0]
+    library['drive_changes'].append(change(dict(sub, parents=['elsewhere'])))
+    assert manager.sync() == 1
+    assert names(manager) == ['Dupont 2015 Symplectique.pdf']
+
+
+def test_parallel_listing_counts_every_request(drive):
+    library, api = drive
+    # Assez de dossiers pour occuper tous les threads de listing
+    for i in range(40):
+        library['drive'][DRIVE_FOLDER].append(folder(f"d{i}", DRIVE_FOLDER))
+        library['drive'][f"d{i}"] = [pdf(f"g{i}", f"Auteur {i} 2000 Titre.pdf", f"d{i}")]
+    manager = manager_for(api)
+    assert manager.sync() == 42
+    assert manager.requests_made == len(api.requests)
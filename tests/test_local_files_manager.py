@@ -0,0 +1,138 @@
+"""
+Tests du gestionnaire de fichiers locaux (scan incrémental, mode surveillance, import)
+"""
+
+import os
+
+import local_files_manager
+from content_hashes import ContentHashCache, full_hashes
+from local_files_manager import LocalFilesManager, expand_import_sources
+from local_watcher import coalesce_paths
+
+
+def write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    return path
+
+
+def touch_later(path, content):
+    """Réécrire un fichier en place avec un mtime distinct (le dossier garde le sien)"""
+    stat = path.stat()
+    path.write_bytes(content)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_apply_paths_keeps_batch_changes_when_root_changes(tmp_path, cache_dir):
+    refs = tmp_path / 'refs'
+    edited = write(refs / 'sub' / 'edited.pdf', b'v1')
+    write(refs / 'kept.pdf', b'kept')
+    manager = LocalFilesManager(refs, cache_dir)
+    manager.scan()
+
+    # Même lot: un fichier modifié en place dans un sous-dossier et un ajout à la racine
+    sub_mtime = (refs / 'sub').stat().st_mtime_ns
+    touch_later(edited, b'version 2')
+    new = write(refs / 'new.pdf', b'new')
+    assert (refs / 'sub').stat().st_mtime_ns == sub_mtime
+
+    batch = coalesce_paths([str(edited), str(new), str(refs)], refs)
+    assert str(edited) in batch
+
+    assert manager.apply_paths(batch) == (1, 1, 0)
+    assert manager.manifest['files']['sub/edited.pdf'][0] == len(b'version 2')
+    assert 'new.pdf' in manager.manifest['files']
+    assert manager.delta_counts() == (1, 1, 0)
+
+
+def test_apply_paths_root_only_without_changes(tmp_path, cache_dir):
+    refs = tmp_path / 'refs'
+    write(refs / 'a.pdf', b'a')
+    manager = LocalFilesManager(refs, cache_dir)
+    manager.scan()
+    generation = manager.generation()
+
+    assert manager.apply_paths([str(refs)]) == (0, 0, 0)
+    assert manager.generation() == generation
+
+
+def test_coalesce_paths_drops_children_of_subdirectories(tmp_path):
+    directory = tmp_path / 'refs' / 'dossier'
+    directory.mkdir(parents=True)
+    child = str(directory / 'x.pdf')
+    assert coalesce_paths([str(directory), child], tmp_path / 'refs') == [str(directory)]
+
+
+def run_import(manager, sources, **kwargs):
+    imported, reports = [], []
+    for batch, _ in manager.import_references(expand_import_sources(sources), progress=reports.append, **kwargs):
+        imported += batch
+    return imported, reports[-1]
+
+
+def test_import_keeps_same_name_with_different_content(tmp_path, cache_dir):
+    refs = tmp_path / 'refs'
+    write(refs / 'paper.pdf', b'deja dans la bibliotheque')
+    dump = tmp_path / 'dump'
+    write(dump / 's1' / 'paper.pdf', b'actes 1')
+    write(dump / 's2' / 'paper.pdf', b'actes 2')
+    write(dump / 's3' / 'paper.pdf', b'deja dans la bibliotheque')
+    manager = LocalFilesManager(refs_path=str(refs))
+    manager.scan()
+
+    _, stats = run_import(manager, [str(dump)])
+    assert (stats['imported'], stats['existing'], stats['duplicates']) == (2, 1, 0)
+    contents = {path.read_bytes() for path in refs.iterdir()}
+    assert contents == {b'deja dans la bibliotheque', b'actes 1', b'actes 2'}
+    assert sorted(path.name for path in refs.iterdir()) == ['paper.pdf', 'paper_2.pdf', 'paper_3.pdf']
+    assert sorted(LocalFilesManager(refs_path=str(refs)).manifest['files']) == ['paper.pdf', 'paper_2.pdf',
+                                                                                'paper_3.pdf']
+
+    # Un second import du même dossier ne copie rien
+    _, stats = run_import(LocalFilesManager(refs_path=str(refs)), [str(dump)])
+    assert (stats['imported'], stats['existing']) == (0, 3)
+    assert len(list(refs.iterdir())) == 3
+
+
+def test_import_does_not_delete_a_file_created_by_another_writer(tmp_path, cache_dir, monkeypatch):
+    refs = tmp_path / 'refs'
+    source = write(tmp_path / 'dump' / 'paper.pdf', b'notre copie')
+
+    def concurrent_copy(source, target):
+        write(target, b'autre processus')  # Créé entre la réservation du nom et la copie
+        return original(source, target)
+
+    original = local_files_manager.copy_with_hashes
+    monkeypatch.setattr(local_files_manager, 'copy_with_hashes', concurrent_copy)
+    _, stats = run_import(LocalFilesManager(refs_path=str(refs)), [str(source)])
+
+    assert stats['imported'] == 0 and len(stats['errors']) == 1
+    assert (refs / 'paper.pdf').read_bytes() == b'autre processus'
+
+
+def test_reimport_of_a_deleted_file(tmp_path, cache_dir):
+    refs = tmp_path / 'refs'
+    source = write(tmp_path / 'dump' / 'Smith_2020_Title.pdf', b'contenu de l article')
+    hash_cache = ContentHashCache()
+    manager = LocalFilesManager(refs_path=str(refs), hash_cache=hash_cache)
+    _, stats = run_import(manager, [str(source)], hash_cache=hash_cache)
+    assert stats['imported'] == 1
+
+    (refs / 'Smith_2020_Title.pdf').unlink()
+    manager.scan()
+    assert str(refs / 'Smith_2020_Title.pdf') not in ContentHashCache().files  # Oublié aussi sur le disque
+
+    _, stats = run_import(manager, [str(source)], hash_cache=hash_cache)
+    assert (stats['imported'], stats['duplicates']) == (1, 0)
+    assert (refs / 'Smith_2020_Title.pdf').read_bytes() == b'contenu de l article'
+
+
+def test_stale_hashes_do_not_block_import(tmp_path, cache_dir):
+    # Empreinte d'un fichier supprimé par un autre outil (jamais oublié par un scan)
+    refs = tmp_path / 'refs'
+    source = write(tmp_path / 'dump' / 'paper.pdf', b'contenu')
+    hash_cache = ContentHashCache()
+    hash_cache.store(str(refs / 'ancien.pdf'), 7, 1, *full_hashes(source))
+
+    _, stats = run_import(LocalFilesManager(refs_path=str(refs)), [str(source)], hash_cache=hash_cache)
+    assert (stats['imported'], stats['duplicates']) == (1, 0)
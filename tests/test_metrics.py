@@ -0,0 +1,141 @@
+"""
+Tests des mesures par étape (spans) et de leur export JSON / Prometheus
+"""
+
+import json
+import threading
+
+import pytest
+from click.testing import CliRunner
+
+from local_files_manager import LocalFilesManager
+from metrics import Metrics, metrics
+from query_server import QueryServer, _connect, remote_search
+from reference_search import ReferenceSearch
+
+
+@pytest.fixture
+def library(tmp_path, cache_dir, monkeypatch):
+    refs = tmp_path / 'refs'
+    refs.mkdir()
+    for name in ('Dupont 2015 Geometrie symplectique.pdf', 'Martin 2018 Geometrie algebrique.pdf'):
+        (refs / name).write_bytes(name.encode('utf-8'))
+    for variable in ('GOOGLE_DRIVE_FOLDER_ID', 'GITHUB_REPO', 'BIBTEX_PATHS'):
+        monkeypatch.delenv(variable, raising=False)
+    monkeypatch.setenv('LOCAL_REFS_PATH', str(refs))
+    monkeypatch.setenv('QUERY_CACHE_SIZE', '0')
+    return refs
+
+
+@pytest.fixture
+def recording():
+    """Registre du processus activé et remis à zéro, désactivé après le test"""
+    metrics.reset()
+    metrics.enable()
+    yield metrics
+    metrics.disable()
+    metrics.reset()
+
+
+def test_disabled_spans_record_nothing():
+    registry = Metrics()
+    with registry.span('filter'):
+        pass
+    registry.increment('errors.filter')
+    assert registry.snapshot()['stages'] == {} and registry.snapshot()['counters'] == {}
+
+
+def test_spans_accumulate_calls_and_count_errors():
+    registry = Metrics()
+    registry.enable()
+    for _ in range(3):
+        with registry.span('sort'):
+            pass
+    with pytest.raises(KeyError):
+        with registry.span('filter'):
+            raise KeyError('champ')
+
+    snapshot = registry.snapshot()
+    assert snapshot['stages']['sort']['calls'] == 3
+    assert snapshot['stages']['filter']['calls'] == 1
+    assert snapshot['stages']['sort']['max_ms'] <= snapshot['stages']['sort']['total_ms']
+    assert snapshot['counters'] == {'errors.filter': 1}
+
+
+def test_prometheus_exposition_format():
+    registry = Metrics()
+    registry.enable()
+    registry.record('search_in_source.local', 0.25)
+    registry.record('search_in_source.local', 0.5)
+    registry.record('nom "bizarre"', 0.1)
+    registry.increment('errors.convert.local', 2)
+
+    lines = registry.to_prometheus().splitlines()
+    assert '# TYPE refs_stage_seconds summary' in lines
+    assert 'refs_stage_seconds_sum{stage="search_in_source.local"} 0.750000' in lines
+    assert 'refs_stage_seconds_count{stage="search_in_source.local"} 2' in lines
+    assert 'refs_stage_seconds_max{stage="search_in_source.local"} 0.500000' in lines
+    assert 'refs_stage_seconds_count{stage="nom \\"bizarre\\""} 1' in lines
+    assert 'refs_events_total{name="errors.convert.local"} 2' in lines
+    # Chaque échantillon: nom{labels} valeur
+    for line in lines:
+        if not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            assert name.startswith('refs_') and float(value) >= 0
+
+
+def test_export_by_extension(tmp_path):
+    registry = Metrics()
+    registry.enable()
+    registry.record('sort', 0.002)
+
+    registry.export(tmp_path / 'out' / 'metrics.json')
+    data = json.loads((tmp_path / 'out' / 'metrics.json').read_text(encoding='utf-8'))
+    assert data['stages']['sort'] == {'calls': 1, 'total_ms': 2.0, 'mean_ms': 2.0, 'max_ms': 2.0}
+
+    registry.export(tmp_path / 'out' / 'metrics.prom')
+    assert 'refs_stage_seconds_count{stage="sort"} 1' in (tmp_path / 'out' / 'metrics.prom').read_text(encoding='utf-8')
+    assert not list((tmp_path / 'out').glob('*.tmp'))
+
+
+def test_search_and_scan_stages_are_recorded(library, recording):
+    LocalFilesManager().scan()
+    ReferenceSearch().search('local', keyword='geometrie')
+
+    stages = recording.snapshot()['stages']
+    for stage in ('scan.local', 'search', 'lookup', 'materialize'):
+        assert stages[stage]['calls'] >= 1, stage
+
+
+def test_cli_metrics_out(library, tmp_path):
+    import main
+
+    LocalFilesManager().scan()
+    output = tmp_path / 'search.prom'
+    result = CliRunner().invoke(main.cli, ['--metrics-out', str(output), 'search', '--no-server',
+                                           '--source', 'local', '--keyword', 'geometrie'])
+    metrics.disable()
+    metrics.reset()
+    assert result.exit_code == 0, result.output
+    assert 'refs_stage_seconds_count{stage="search"} 1' in output.read_text(encoding='utf-8')
+
+
+def test_server_exposes_metrics(library, cache_dir, recording):
+    LocalFilesManager().scan()
+    server = QueryServer(ReferenceSearch(), cache_dir=cache_dir)
+    server.start()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        assert remote_search(cache_dir=cache_dir, sources='local', keyword='geometrie')['results']
+        connection = _connect(cache_dir)
+        connection.request('GET', '/metrics')
+        response = connection.getresponse()
+        body = response.read().decode('utf-8')
+        connection.close()
+    finally:
+        server.shutdown()
+        thread.join()
+    assert response.status == 200
+    assert response.getheader('Content-Type').startswith('text/plain; version=0.0.4')
+    assert 'refs_stage_seconds_count{stage="search"} 1' in body.splitlines()
@@ -0,0 +1,47 @@
+"""
+Tests de l'extraction des métadonnées PDF
+"""
+
+from pdf_extractor import ContentCache, _decode_literal, extract_pdf
+
+
+def make_pdf(path, info):
+    path.write_bytes(b'%PDF-1.4\n1 0 obj\n<< ' + info + b' >>\nendobj\n%%EOF\n')
+    return path
+
+
+def test_decode_hex_strings():
+    assert _decode_literal(b'<48656C6C6F>') == 'Hello'
+    assert _decode_literal(b'<48 65 6C\n6C 6F>') == 'Hello'
+    assert _decode_literal(b'<4865 6C6C 6F2>') == 'Hello '  # Chiffre final manquant: 0 implicite
+    assert _decode_literal(b'<FEFF00E9>') == 'é'
+
+
+def test_decode_literal_strings():
+    assert _decode_literal(rb'(G\351om\(e\)trie\n)') == 'Géom(e)trie\n'
+
+
+def test_odd_hex_title_does_not_fail_extraction(tmp_path):
+    pdf = make_pdf(tmp_path / 'odd.pdf', b'/Title <4D6F6D656E74206D61702>')
+    assert extract_pdf(pdf)['title'] == 'Moment map'
+
+
+def test_filename_metadata_takes_precedence(tmp_path, cache_dir, monkeypatch):
+    from reference_search import ReferenceSearch
+
+    info = b'/Title (Microsoft Word - draft3.doc) /Author (Jane Doe) /CreationDate (D:20230105120000)'
+    named = make_pdf(tmp_path / 'Smith 2015 Derived stacks.pdf', info)
+    unnamed = make_pdf(tmp_path / 'scan0001.pdf', info)
+    files = [{'name': p.name, 'path': str(p), 'size': p.stat().st_size, 'mtime_ns': p.stat().st_mtime_ns,
+              'extension': '.pdf'} for p in (named, unnamed)]
+
+    searcher = ReferenceSearch()
+    searcher.content_cache = ContentCache(cache_dir)
+    searcher.content_cache.extract(files, workers=1)
+    converted = [searcher._convert_local_file(f) for f in files]
+
+    # Nom Auteur_Année_Titre: titre et année du nom de fichier
+    assert (converted[0]['title'], converted[0]['year']) == ('Smith Derived stacks', 2015)
+    # Nom sans motif: titre /Info et année de CreationDate
+    assert (converted[1]['title'], converted[1]['year']) == ('Microsoft Word - draft3.doc', 2023)
+    assert converted[0]['author'] == converted[1]['author'] == 'Jane Doe'
@@ -0,0 +1,106 @@
+"""
+Tests du cache des pages de résultats (invalidation par génération, écritures différées)
+"""
+
+import pytest
+
+import query_cache
+from local_files_manager import LocalFilesManager
+from query_cache import QueryCache, query_key
+from reference_search import ReferenceSearch
+
+PAGE = {'results': [{'title': 'Géométrie symplectique'}], 'total': 1, 'next_cursor': None}
+
+
+def test_generation_change_invalidates_entry(tmp_path):
+    cache = QueryCache(tmp_path)
+    key = query_key(['bibtex', 'local'], 'Géométrie')
+    cache.put(key, {'local': 1, 'bibtex': 4}, PAGE)
+    assert cache.get(key, {'bibtex': 4, 'local': 1}) == PAGE
+
+    # Nouvelle génération d'une des sources lues: l'entrée ne sert plus, sa page est remplacée
+    assert cache.get(key, {'local': 2, 'bibtex': 4}) is None
+    assert QueryCache(tmp_path).get(key, {'local': 2, 'bibtex': 4}) is None
+    cache.put(key, {'local': 2, 'bibtex': 4}, {'results': [], 'total': 0, 'next_cursor': None})
+    assert QueryCache(tmp_path).get(key, {'local': 2, 'bibtex': 4})['total'] == 0
+    assert QueryCache(tmp_path).get(key, {'local': 1, 'bibtex': 4}) is None
+    assert cache.stats()['entries'] == 1
+
+
+def test_reads_do_not_write_to_the_database(tmp_path):
+    cache = QueryCache(tmp_path)
+    key = query_key(['local'], 'quiver')
+    cache.put(key, {'local': 1}, PAGE)
+
+    statements = []
+    cache._connection().set_trace_callback(statements.append)
+    for _ in range(20):
+        assert cache.get(key, {'local': 1}) == PAGE
+    assert cache.get(query_key(['local'], 'absent'), {'local': 1}) is None
+    assert cache.get(key, {'local': 2}) is None  # Entrée périmée: lue, pas supprimée
+    assert cache.get(key, {'local': 2}) is None
+    assert not [s for s in statements if not s.lstrip().upper().startswith('SELECT')]
+
+    # Compteurs écrits en une transaction, visibles par les autres processus
+    cache.flush()
+    stats = QueryCache(tmp_path).stats()
+    assert (stats['hits'], stats['misses']) == (20, 3)
+
+
+def test_pending_reads_flushed_after_interval(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_cache, 'FLUSH_INTERVAL', 0)
+    cache = QueryCache(tmp_path)
+    key = query_key(['local'], 'stack')
+    cache.put(key, {'local': 1}, PAGE)
+    cache.get(key, {'local': 1})
+    assert QueryCache(tmp_path).stats()['hits'] == 1
+
+
+def test_recently_read_entries_survive_eviction(tmp_path):
+    cache = QueryCache(tmp_path, size=2, memory_entries=2)
+    first, second, third = (query_key(['local'], word) for word in ('un', 'deux', 'trois'))
+    cache.put(first, {'local': 1}, PAGE)
+    cache.put(second, {'local': 1}, PAGE)
+    assert cache.get(first, {'local': 1}) == PAGE  # Lue en mémoire: date écrite avant l'éviction
+    cache.put(third, {'local': 1}, PAGE)
+
+    other = QueryCache(tmp_path, memory_entries=0)
+    assert other.get(first, {'local': 1}) == PAGE
+    assert other.get(second, {'local': 1}) is None
+
+
+@pytest.fixture
+def library(tmp_path, cache_dir, monkeypatch):
+    refs = tmp_path / 'refs'
+    refs.mkdir()
+    (refs / 'Dupont 2015 Geometrie symplectique.pdf').write_bytes(b'dupont')
+    for variable in ('GOOGLE_DRIVE_FOLDER_ID', 'GITHUB_REPO', 'BIBTEX_PATHS', 'QUERY_CACHE_SIZE'):
+        monkeypatch.delenv(variable, raising=False)
+    monkeypatch.setenv('LOCAL_REFS_PATH', str(refs))
+    LocalFilesManager().scan()
+    return refs
+
+
+def test_search_page_invalidated_by_a_new_scan(library):
+    searcher = ReferenceSearch()
+    assert searcher.search('local', keyword='geometrie')[0]['title'] == 'Dupont Geometrie symplectique'
+    assert len(searcher.search('local', keyword='geometrie')) == 1
+    assert searcher.query_cache.stats()['hits'] == 1
+
+    (library / 'Martin 2018 Geometrie algebrique.pdf').write_bytes(b'martin')
+    LocalFilesManager().scan()
+    assert len(searcher.search('local', keyword='geometrie')) == 2
+    assert searcher.query_cache.stats()['hits'] == 1
+
+
+def test_search_page_invalidated_by_new_duplicate_groups(library):
+    copy = library / 'Copie 2015 Geometrie symplectique.pdf'
+    copy.write_bytes((library / 'Dupont 2015 Geometrie symplectique.pdf').read_bytes())
+    LocalFilesManager().scan()
+    searcher = ReferenceSearch()
+    # Page calculée (et mise en cache) avant le calcul des doublons: deux résultats
+    assert searcher.search_page('local', keyword='symplectique')['total'] == 2
+
+    searcher.deduplicate()  # Même génération des sources, groupes changés
+    page = searcher.search_page('local', keyword='symplectique')
+    assert page['total'] == 1 and len(page['results'][0]['locations']) == 2
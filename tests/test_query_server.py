@@ -0,0 +1,128 @@
+"""
+Tests du serveur de requêtes: état vu par un processus long, écritures concurrentes des manifestes
+"""
+
+import socket
+import threading
+
+import pytest
+
+from local_files_manager import LocalFilesManager
+from query_server import QueryServer, address_file, remote_search, server_health
+from reference_search import ReferenceSearch
+from search_index import SearchIndex
+
+
+@pytest.fixture
+def library(tmp_path, cache_dir, monkeypatch):
+    refs = tmp_path / 'refs'
+    refs.mkdir()
+    (refs / 'Dupont 2015 Geometrie symplectique.pdf').write_bytes(b'dupont')
+    for variable in ('GOOGLE_DRIVE_FOLDER_ID', 'GITHUB_REPO', 'BIBTEX_PATHS'):
+        monkeypatch.delenv(variable, raising=False)
+    monkeypatch.setenv('LOCAL_REFS_PATH', str(refs))
+    LocalFilesManager().scan()
+    return refs
+
+
+@pytest.fixture
+def server(library, cache_dir):
+    server = QueryServer(ReferenceSearch(background_refresh=True), cache_dir=cache_dir)
+    server.start()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+
+
+def remote_titles(cache_dir, **params):
+    page = remote_search(cache_dir=cache_dir, sources='local', **params)
+    return sorted(result['title'] for result in page['results'])
+
+
+def test_server_sees_references_added_by_another_process(server, library, cache_dir, tmp_path):
+    assert remote_titles(cache_dir, keyword='geometrie') == ['Dupont Geometrie symplectique']
+
+    # Ajout par un autre processus (commande add): nouvelle génération publiée
+    source = tmp_path / 'nouveau.pdf'
+    source.write_bytes(b'martin')
+    assert LocalFilesManager().add_reference(str(source), title='Geometrie torique', author='Martin', year=2019)
+
+    # La page en cache est invalidée et l'index du serveur reçoit le delta
+    assert remote_titles(cache_dir, keyword='geometrie') == ['Dupont Geometrie symplectique',
+                                                            'Martin Geometrie torique']
+
+
+def test_server_sees_reindex_by_another_process(server, library, cache_dir, tmp_path):
+    assert remote_titles(cache_dir, keyword='geometrie') == ['Dupont Geometrie symplectique']
+
+    # Extraction dans un autre processus: titre lu dans le PDF, générations inchangées
+    other = ReferenceSearch()
+    convert = other._convert_file
+    other._convert_file = lambda source, f: dict(convert(source, f), title='Geometrie symplectique extraite')
+    other.reindex_files('local', other.local_manager.get_cached_files())
+    assert remote_titles(cache_dir, keyword='geometrie') == ['Geometrie symplectique extraite']
+
+    # Un delta de source appliqué ensuite par le serveur garde la réindexation de l'autre processus
+    source = tmp_path / 'nouveau.pdf'
+    source.write_bytes(b'martin')
+    assert LocalFilesManager().add_reference(str(source), title='Geometrie torique', author='Martin', year=2019)
+    assert remote_titles(cache_dir, keyword='geometrie') == ['Geometrie symplectique extraite',
+                                                            'Martin Geometrie torique']
+    on_disk = SearchIndex()
+    assert sorted(on_disk.get(doc_id)['title'] for doc_id in on_disk.lookup(['local'], 'geometrie')) == \
+        ['Geometrie symplectique extraite', 'Martin Geometrie torique']
+
+
+def test_second_server_refuses_to_take_over(server, cache_dir):
+    published = address_file(cache_dir).read_text(encoding='utf-8')
+    with pytest.raises(RuntimeError):
+        QueryServer(ReferenceSearch(), cache_dir=cache_dir).start()
+    with pytest.raises(RuntimeError):
+        QueryServer(ReferenceSearch(), cache_dir=cache_dir / 'ailleurs', socket_path=server.socket_path).start()
+
+    assert address_file(cache_dir).read_text(encoding='utf-8') == published
+    assert server_health(cache_dir)['pid'] == server.address()['pid']
+
+
+def test_stale_socket_is_replaced(library, cache_dir):
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(cache_dir / 'query.sock'))
+    stale.close()  # Fichier de socket laissé par un serveur arrêté sans nettoyage
+
+    server = QueryServer(ReferenceSearch(), cache_dir=cache_dir)
+    server.start()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        assert server_health(cache_dir)['status'] == 'ok'
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+def test_concurrent_manifest_updates_are_not_lost(library, tmp_path):
+    stale = LocalFilesManager()
+    stale.manifest  # Manifeste chargé avant les ajouts des autres
+
+    def add(number):
+        source = tmp_path / f"source_{number}.pdf"
+        source.write_bytes(f"contenu {number}".encode('utf-8'))
+        assert LocalFilesManager().add_reference(str(source), title=f"Titre {number}", author='Auteur', year=2000)
+
+    threads = [threading.Thread(target=add, args=(number,)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    add(8)
+    assert stale.scan() == 10
+
+    # Le manager chargé avant les ajouts repart de la dernière version sur le disque
+    assert len(LocalFilesManager().manifest['files']) == 10
+    source = tmp_path / 'dernier.pdf'
+    source.write_bytes(b'dernier')
+    assert stale.add_reference(str(source), title='Dernier', author='Auteur', year=2001)
+    assert len(LocalFilesManager().manifest['files']) == 11
@@ -0,0 +1,51 @@
+"""
+Tests du classement: normalisation, tolérance aux fautes, BM25
+"""
+
+from ranking import BM25Ranker, FuzzyVocabulary, fold_accents, tokenize
+from search_index import SearchIndex
+
+
+def test_fold_accents_and_tokenize():
+    assert fold_accents('Géométrie Kählérienne') == 'geometrie kahlerienne'
+    assert tokenize('Œuvres_complètes-2019') == ['oeuvres', 'completes', '2019']
+
+
+def test_fuzzy_vocabulary_follows_index_changes(cache_dir):
+    index = SearchIndex(cache_dir)
+    index.update_source('local', [{'id': '1', 'title': 'Symplectic reduction', 'author': 'Doe'}])
+    vocabulary = FuzzyVocabulary()
+    vocabulary.refresh(index)
+    assert [token for token, _ in vocabulary.neighbours('symplectik')] == ['symplectic']
+
+    # Ajouts et suppressions appliqués terme par terme, sans reconstruction
+    epoch = vocabulary.epoch
+    index.update_source('local', [{'id': '2', 'title': 'Hyperkahler quotients', 'author': 'Doe'}])
+    vocabulary.refresh(index)
+    assert vocabulary.epoch == epoch
+    assert 'symplectic' not in vocabulary.tokens
+    assert [token for token, _ in vocabulary.neighbours('quotiens')] == ['quotients']
+
+    rebuilt = FuzzyVocabulary()
+    rebuilt.refresh(index)
+    assert rebuilt.tokens == vocabulary.tokens
+    assert rebuilt.grams == vocabulary.grams
+
+
+def test_token_shared_by_title_and_author(cache_dir):
+    index = SearchIndex(cache_dir)
+    index.update_source('local', [{'id': '1', 'title': 'Mayrand lectures', 'author': 'Mayrand'}])
+    vocabulary = FuzzyVocabulary()
+    vocabulary.refresh(index)
+    index.update_source('local', [{'id': '1', 'title': 'Lectures', 'author': 'Mayrand'}])
+    assert vocabulary.tokens['mayrand'] == 1  # Encore présent côté auteur
+
+
+def test_bm25_typo_tolerance(cache_dir):
+    index = SearchIndex(cache_dir)
+    index.update_source('local', [
+        {'id': '1', 'title': 'Symplectic reduction', 'author': 'Doe'},
+        {'id': '2', 'title': 'Quiver varieties', 'author': 'Roe'},
+    ])
+    scores = BM25Ranker(index).score('symplectik', set(index.keys.values()))
+    assert [index.get(doc_id)['id'] for _, doc_id in scores] == ['1']
@@ -0,0 +1,94 @@
+"""
+Tests de la recherche unifiée (ReferenceSearch) sur une bibliothèque locale
+"""
+
+import pytest
+
+from local_files_manager import LocalFilesManager
+from reference_search import ReferenceSearch
+
+
+@pytest.fixture
+def library(tmp_path, cache_dir, monkeypatch):
+    """Bibliothèque locale de quelques PDF, seule source configurée"""
+    refs = tmp_path / 'refs'
+    refs.mkdir()
+    for name in ('Dupont 2015 Géométrie symplectique.pdf', 'Martin 2018 Geometrie algebrique.pdf',
+                 'Smith 2021 Quiver varieties.epub'):
+        (refs / name).write_bytes(name.encode('utf-8'))
+    for variable in ('GOOGLE_DRIVE_FOLDER_ID', 'GITHUB_REPO', 'BIBTEX_PATHS'):
+        monkeypatch.delenv(variable, raising=False)
+    monkeypatch.setenv('LOCAL_REFS_PATH', str(refs))
+    monkeypatch.setenv('QUERY_CACHE_SIZE', '0')
+    LocalFilesManager().scan()
+    return refs
+
+
+def titles(results):
+    return sorted(result['title'] for result in results)
+
+
+def test_classic_search_ignores_accents(library):
+    searcher = ReferenceSearch()
+    for keyword in ('géométrie', 'geometrie', 'GEOMÉTRIE'):
+        results = searcher.search('local', keyword=keyword)
+        assert titles(results) == ['Dupont Géométrie symplectique', 'Martin Geometrie algebrique']
+        # Le mot-clé est trouvé dans le titre (+10) dans les deux sens
+        assert all(result['score'] >= 10 for result in results)
+
+
+def test_search_does_not_hash_duplicates(library, monkeypatch):
+    copy = library / 'Copie 2015 Géométrie symplectique.pdf'
+    copy.write_bytes((library / 'Dupont 2015 Géométrie symplectique.pdf').read_bytes())
+    LocalFilesManager().scan()
+    searcher = ReferenceSearch()
+    with monkeypatch.context() as patch:
+        patch.setattr(searcher, 'deduplicate', lambda: pytest.fail("empreintes calculées pendant la recherche"))
+        assert len(searcher.search('local', keyword='symplectique')) == 2
+
+    # Les groupes calculés par update_duplicates servent aux recherches suivantes
+    assert len(searcher.update_duplicates()) == 1
+    results = searcher.search('local', keyword='symplectique')
+    assert len(results) == 1 and len(results[0]['locations']) == 2
+
+    # Une copie supprimée quitte son groupe sans nouveau calcul
+    copy.unlink()
+    searcher.local_manager.scan()
+    results = searcher.search('local', keyword='symplectique')
+    assert len(results) == 1 and 'locations' not in results[0]
+    assert searcher.index.duplicates == []
+
+
+def test_search_serves_last_published_state(library, monkeypatch):
+    searcher = ReferenceSearch()
+    monkeypatch.setenv('CACHE_TTL_LOCAL', '0')  # Source toujours expirée
+    monkeypatch.setattr(searcher.local_manager, 'scan', lambda **kwargs: pytest.fail("scan pendant la recherche"))
+    assert len(searcher.search('local', keyword='geometrie')) == 2
+
+    # Un autre processus scanne: la même instance voit la nouvelle génération
+    (library / 'Leroy 2019 Geometrie torique.pdf').write_bytes(b'torique')
+    LocalFilesManager().scan()
+    assert len(searcher.search('local', keyword='geometrie')) == 3
+
+
+def test_background_refresh_of_expired_source(library, monkeypatch):
+    searcher = ReferenceSearch(background_refresh=True)
+    assert len(searcher.search('local', keyword='geometrie')) == 2
+
+    (library / 'Leroy 2019 Geometrie torique.pdf').write_bytes(b'torique')
+    monkeypatch.setenv('CACHE_TTL_LOCAL', '0')
+    # L'ancien état est servi sans attendre, le scan tourne dans un thread
+    assert len(searcher.search('local', keyword='geometrie')) in (2, 3)
+    searcher.refresh_in_background('local').join()
+    assert len(searcher.search('local', keyword='geometrie')) == 3
+
+
+def test_type_year_and_facets_in_search_page(library):
+    searcher = ReferenceSearch()
+    page = searcher.search_page('local', doc_type='epub', facets=True)
+    assert titles(page['results']) == ['Smith Quiver varieties'] and page['total'] == 1
+    assert page['facets']['type'] == {'epub': 1}
+
+    page = searcher.search_page('local', keyword='geometrie', year='2016-', facets=True)
+    assert titles(page['results']) == ['Martin Geometrie algebrique']
+    assert page['facets']['year'] == {'2018': 1} and page['facets']['source'] == {'local': 1}
@@ -0,0 +1,144 @@
+"""
+Tests de l'index inversé (SearchIndex.lookup) et des facettes bitmap
+"""
+
+from collections import Counter
+
+import pytest
+
+from facet_index import parse_year_range
+from search_index import SearchIndex
+
+REFERENCES = [
+    {'id': '1', 'title': 'Hyperkähler quotients', 'author': 'Mayrand, Maxence', 'year': 2019,
+     'path': '/refs/Mayrand_2019_Hyperkahler.pdf', 'type': 'pdf'},
+    {'id': '2', 'title': 'Moment map of quivers', 'author': 'Doe, Jane', 'year': 2015,
+     'path': '/refs/Doe_2015_Moment.pdf', 'type': 'pdf'},
+]
+
+
+def make_index(cache_dir):
+    index = SearchIndex(cache_dir)
+    index.update_source('local', REFERENCES)
+    return index
+
+
+def ids(index, doc_ids):
+    return sorted(index.get(doc_id)['id'] for doc_id in doc_ids)
+
+
+def test_prefix_and_accent_folding(cache_dir):
+    index = make_index(cache_dir)
+    assert ids(index, index.lookup(['local'], 'hyperkahl')) == ['1']
+    assert ids(index, index.lookup(['local'], 'HYPERKÄHLER')) == ['1']
+
+
+def test_tokens_combined_in_any_order(cache_dir):
+    index = make_index(cache_dir)
+    assert ids(index, index.lookup(['local'], 'map moment')) == ['2']
+    assert index.lookup(['local'], 'moment quotients') == set()
+
+
+def test_infix_fallback(cache_dir):
+    index = make_index(cache_dir)
+    assert ids(index, index.lookup(['local'], 'ayrand')) == ['1']
+    assert ids(index, index.lookup(['local'], author='ayrand')) == ['1']
+    assert index.lookup(['local'], 'ay') == set()  # Trop court pour le repli
+
+
+def test_vocabulary_kept_sorted(cache_dir):
+    index = make_index(cache_dir)
+    assert index.prefix_terms('t', 'quot') == ['t:quotients']
+    index.update_source('local', REFERENCES[:1] + [{'id': '3', 'title': 'Quotient stacks', 'author': 'Roe'}])
+    assert index._sorted_vocabulary() == sorted(index.postings)
+    assert index.prefix_terms('t', 'quot') == ['t:quotient', 't:quotients']
+    assert index.prefix_terms('t', 'moment') == []
+
+
+# Bibliothèque sur deux sources: années 2010 à 2021 (et inconnue), trois types
+LIBRARY = {
+    'local': [{'id': str(i), 'title': f"Symplectic geometry {i}", 'author': f"Author{i % 3}",
+               'year': 2010 + i if i % 5 else None, 'type': ('pdf', 'epub', 'article')[i % 3],
+               'path': f"/refs/{i}.pdf"} for i in range(12)],
+    'bibtex': [{'id': f"refs.bib#k{i}", 'title': f"Quiver varieties {i}", 'author': 'Nakajima',
+                'year': 2015 + i, 'type': 'Article'} for i in range(4)],
+}
+
+
+@pytest.fixture
+def library_index(cache_dir):
+    index = SearchIndex(cache_dir)
+    for source, references in LIBRARY.items():
+        index.update_source(source, references)
+    return index
+
+
+def brute_force(sources, year=None, doc_type=None):
+    """Identifiants attendus, par parcours de toutes les références"""
+    bounds = parse_year_range(year) if year else None
+    return sorted(reference['id'] for source in sources for reference in LIBRARY[source]
+                  if (not bounds or (reference['year'] and bounds[0] <= reference['year'] <= bounds[1]))
+                  and (not doc_type or reference['type'].lower() == doc_type.strip().lower()))
+
+
+def test_parse_year_range():
+    assert parse_year_range(2015) == (2015, 2015)
+    assert parse_year_range('2015') == (2015, 2015)
+    assert parse_year_range('2015-2020') == (2015, 2020)
+    assert parse_year_range('2020 .. 2015') == (2015, 2020)
+    assert parse_year_range('2015-') == (2015, 9999)
+    assert parse_year_range('-2012') == (1, 2012)
+    assert parse_year_range('années 90') is None
+    assert parse_year_range('-') is None
+
+
+@pytest.mark.parametrize('year', ['2015', '2012-2016', '2018-', '-2012', '2030-2040', 'inconnue'])
+@pytest.mark.parametrize('sources', [['local'], ['bibtex'], ['local', 'bibtex']])
+def test_year_range_matches_brute_force(library_index, sources, year):
+    assert ids(library_index, library_index.lookup(sources, year=year)) == brute_force(sources, year)
+
+
+@pytest.mark.parametrize('doc_type', ['pdf', 'EPUB', ' article ', 'djvu'])
+def test_type_filter_matches_brute_force(library_index, doc_type):
+    sources = ['local', 'bibtex']
+    assert ids(library_index, library_index.lookup(sources, doc_type=doc_type)) == brute_force(sources, doc_type=doc_type)
+    assert ids(library_index, library_index.lookup(sources, year='2012-2017', doc_type=doc_type)) == \
+        brute_force(sources, '2012-2017', doc_type)
+
+
+def test_filters_combined_with_keyword(library_index):
+    found = library_index.lookup(['local', 'bibtex'], keyword='geometry', year='2013-2020', doc_type='pdf')
+    assert ids(library_index, found) == ['3', '6', '9']
+
+
+def expected_counts(references):
+    return {
+        'source': Counter(source for source, _ in references),
+        'type': Counter(reference['type'].lower() for _, reference in references),
+        'year': Counter(str(reference['year']) if reference['year'] else 'Inconnue' for _, reference in references),
+    }
+
+
+def test_facet_counts_match_lookup_results(library_index):
+    for sources, keyword, year in ((['local', 'bibtex'], None, None), (['local', 'bibtex'], None, '2015-2019'),
+                                   (['local'], 'geometry', None), (['bibtex'], 'quiver', '2016-')):
+        found = library_index.lookup(sources, keyword, year=year)
+        counts = library_index.facets.counts(found, library_index.store)
+        references = [(source, reference) for source in sources for reference in LIBRARY[source]
+                      if reference['id'] in ids(library_index, found)]
+        for facet, expected in expected_counts(references).items():
+            assert counts[facet] == dict(expected), (facet, sources, keyword, year)
+        assert sum(counts['author'].values()) == len(found)
+
+
+def test_facet_counts_follow_updates_and_reload(library_index, cache_dir):
+    library_index.update_source('local', LIBRARY['local'][:6])
+    found = library_index.lookup(['local', 'bibtex'])
+    assert library_index.facets.counts(found)['type'] == {'article': 6, 'epub': 2, 'pdf': 2}
+    assert library_index.lookup(['local'], year='2016-') == set()
+
+    library_index.save()
+    reloaded = SearchIndex(cache_dir)
+    reloaded.load()
+    assert reloaded.facets.counts(reloaded.lookup(['local', 'bibtex'])) == library_index.facets.counts(found)
+    assert ids(reloaded, reloaded.lookup(['local', 'bibtex'], year='2011-2016', doc_type='epub')) == ['1', '4']
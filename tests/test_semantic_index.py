@@ -0,0 +1,35 @@
+"""
+Tests de la recherche par similarité (plongements en memmap)
+"""
+
+import numpy as np
+
+from semantic_index import DIMENSIONS, SemanticIndex, _normalize
+
+
+def make_index(cache_dir, vectors):
+    semantic = SemanticIndex(cache_dir)
+    semantic.semantic_dir.mkdir(parents=True)
+    semantic.meta['dimensions'] = DIMENSIONS
+    semantic._reserve(len(vectors))
+    semantic.vectors[:len(vectors)] = _normalize(np.array(vectors, dtype=np.float32))
+    semantic.meta['rows'] = {f"doc:{row}": [row, ''] for row in range(len(vectors))}
+    return semantic
+
+
+def axis(*weights):
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    vector[:len(weights)] = weights
+    return vector
+
+
+def test_nearest_drops_noise_level_scores(tmp_path):
+    # doc:2 n'a qu'un résidu numérique en commun avec la requête
+    semantic = make_index(tmp_path, [axis(0, 1), axis(0, 1, 1), axis(1, 1e-4), axis(1)])
+
+    found = semantic.nearest(axis(0, 1), limit=10)
+    assert [key for key, _ in found] == ['doc:0', 'doc:1']
+    assert found[0][1] > found[1][1] > 0.5
+
+    assert [key for key, _ in semantic.nearest(axis(0, 1), limit=10, min_score=1e-6)] == ['doc:0', 'doc:1', 'doc:2']
+    assert [key for key, _ in semantic.nearest(axis(0, 1), limit=10, exclude={'doc:0'})] == ['doc:1']
@@ -0,0 +1,25 @@
+"""
+Tests du cache partagé des sources (visibilité des publications entre processus)
+"""
+
+from bibtex_manager import BibTeXManager
+
+
+def test_loaded_manifest_sees_other_process_sync(tmp_path, cache_dir):
+    bib = tmp_path / 'refs.bib'
+    bib.write_text("@article{a2015,\n  title = {Premier},\n  year = {2015}\n}\n", encoding='utf-8')
+    reader = BibTeXManager(bib_paths=[str(bib)])
+    reader.sync()
+    assert reader.count() == 1 and reader.find(key='a2015')
+
+    # Un autre processus ajoute une entrée et publie une nouvelle génération
+    with open(bib, 'a', encoding='utf-8') as f:
+        f.write("@article{b2016,\n  title = {Second},\n  year = {2016}\n}\n")
+    writer = BibTeXManager(bib_paths=[str(bib)])
+    writer.sync()
+
+    assert reader.generation() == writer.generation()
+    assert reader.count() == 2
+    assert [entry['title'] for entry in reader.find(key='b2016')] == ['Second']
+    upserts, removed = reader.get_changes(writer.generation() - 1)
+    assert [entry['key'] for entry in upserts] == ['b2016'] and removed == []
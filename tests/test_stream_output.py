@@ -0,0 +1,97 @@
+"""
+Tests de la recherche en flux: iter_search et search --format jsonl|csv
+"""
+
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from local_files_manager import LocalFilesManager
+from reference_search import ReferenceSearch
+
+MAIN = Path(__file__).resolve().parent.parent / 'src' / 'main.py'
+
+
+@pytest.fixture
+def library(tmp_path, cache_dir, monkeypatch):
+    """Bibliothèque locale de 1000 PDF (plus qu'un tampon de pipe en jsonl)"""
+    refs = tmp_path / 'refs'
+    refs.mkdir()
+    for number in range(1000):
+        (refs / f"Auteur{number % 7} {1990 + number % 30} Geometrie {number}.pdf").write_bytes(b'%d' % number)
+    for variable in ('GOOGLE_DRIVE_FOLDER_ID', 'GITHUB_REPO', 'BIBTEX_PATHS'):
+        monkeypatch.delenv(variable, raising=False)
+    monkeypatch.setenv('LOCAL_REFS_PATH', str(refs))
+    monkeypatch.setenv('QUERY_CACHE_SIZE', '0')
+    LocalFilesManager().scan()
+    return refs
+
+
+def run_search(tmp_path, *args, **kwargs):
+    """Lancer `main.py search --no-server` dans un processus séparé (vraie sortie standard)"""
+    return subprocess.Popen([sys.executable, str(MAIN), 'search', '--no-server', '--source', 'local'] + list(args),
+                            cwd=tmp_path, env=dict(os.environ), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            **kwargs)
+
+
+def test_iter_search_materializes_lazily(library, monkeypatch):
+    searcher = ReferenceSearch()
+    materialized = []
+    materialize = searcher.materialize
+    monkeypatch.setattr(searcher, 'materialize', lambda *args: materialized.append(args) or materialize(*args))
+
+    for ordered in (False, True):
+        materialized.clear()
+        results = searcher.iter_search('local', keyword='geometrie', ordered=ordered)
+        first = next(results)
+        assert 'Geometrie' in first['title'] and len(materialized) == 1
+        results.close()
+
+
+def test_iter_search_matches_search_order(library):
+    searcher = ReferenceSearch()
+    expected = [result['id'] for result in searcher.search('local', keyword='geometrie', author='auteur3', limit=1000)]
+    assert expected
+    assert [result['id'] for result in searcher.iter_search('local', keyword='geometrie', author='auteur3')] == expected
+
+
+def test_jsonl_output(library, tmp_path):
+    process = run_search(tmp_path, '--keyword', 'geometrie', '--author', 'auteur3', '--format', 'jsonl')
+    stdout, stderr = process.communicate(timeout=60)
+    assert process.returncode == 0, stderr
+    lines = stdout.decode('utf-8').splitlines()
+    results = [json.loads(line) for line in lines]  # Aucune autre sortie dans le flux
+    assert len(results) == 143 and all(result['author'] == 'Auteur3' for result in results)
+
+
+def test_csv_output_with_limit_and_offset(library, tmp_path):
+    process = run_search(tmp_path, '--keyword', 'geometrie', '--format', 'csv', '--limit', '5', '--offset', '2')
+    stdout, stderr = process.communicate(timeout=60)
+    assert process.returncode == 0, stderr
+    rows = list(csv.reader(io.StringIO(stdout.decode('utf-8'))))
+    assert rows[0] == ['source', 'title', 'author', 'year', 'type', 'path', 'size', 'modified', 'id', 'score',
+                       'copies']
+    assert len(rows) == 1 + 5
+
+    searcher = ReferenceSearch()
+    expected = [result['id'] for result in searcher.search('local', keyword='geometrie')][2:7]
+    assert [row[8] for row in rows[1:]] == expected
+
+
+def test_closed_reader_ends_quietly(library, tmp_path):
+    # Équivalent de `search --format jsonl | head -1`
+    process = run_search(tmp_path, '--keyword', 'geometrie', '--format', 'jsonl')
+    first = process.stdout.readline()
+    process.stdout.close()
+    stderr = process.stderr.read().decode('utf-8')
+    process.wait(timeout=60)
+
+    assert json.loads(first)['source']
+    assert process.returncode == 0
+    assert 'Traceback' not in stderr and 'BrokenPipeError' not in stderr